@@ -0,0 +1,142 @@
+"""
+Drain the backlog of pending updates at startup
+
+After a restart, telegram hands out every update that queued
+up while the bot was down. Most of them are not worth answering
+anymore: commands older than the reply timeout, inline queries
+the user kept typing over, buttons that were pressed repeatedly.
+
+drain() fetches the pending updates in batches of the maximum
+size, decides on the raw JSON whether an update is stale (no
+Update objects, reply contexts or log lines for those), and
+returns the remaining updates in order, decoded for dispatch.
+Fetching with an offset past the last update confirms all of
+them, so the updater continues right after the backlog.
+
+Only works in polling mode, telegram does not hand out
+updates via getUpdates while a webhook is set.
+"""
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from telegram import Bot, Update
+
+__all__ = ['BacklogRules', 'BacklogReport', 'drain', 'stale_reasons']
+
+BATCH_SIZE = 100
+_MESSAGE_KINDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post')
+
+
+@dataclass
+class BacklogRules:
+    """
+    message_age: messages older than this are dropped
+        (the same as decorators.reply_timeout by default)
+    latest_inline_only: only the newest inline query of each user
+        is answered, the older ones were typed over
+    latest_callback_only: of several presses of the same button
+        by the same user, only the last one is handled
+    """
+    message_age: timedelta = timedelta(seconds=120)
+    latest_inline_only: bool = True
+    latest_callback_only: bool = True
+
+
+@dataclass
+class BacklogReport:
+    """ outcome of a drain """
+    fetched: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    skipped: Counter = field(default_factory=Counter)
+
+    @property
+    def dispatched(self) -> int:
+        """ number of updates that were kept """
+        return self.fetched - sum(self.skipped.values())
+
+    def summary(self) -> str:
+        """ one-line human readable description """
+        skipped = ', '.join(f'{count} {reason}' for reason, count in self.skipped.most_common()) or 'none'
+        return (f'{self.fetched} pending updates in {self.batches} batches, '
+                f'{self.dispatched} dispatched, skipped: {skipped} ({self.seconds * 1000:.0f}ms)')
+
+
+def _supersede_key(raw: dict, rules: BacklogRules) -> Optional[Tuple[str, Tuple[Hashable, ...]]]:
+    """
+    (kind, key), updates of the same kind with the same
+    key replace each other, only the last one is kept
+    """
+    if rules.latest_inline_only and 'inline_query' in raw:
+        return 'inline', (raw['inline_query']['from']['id'],)
+
+    if rules.latest_callback_only and 'callback_query' in raw:
+        query = raw['callback_query']
+        message = query.get('message', {}).get('message_id', query.get('inline_message_id'))
+        return 'callback', (query['from']['id'], message, query.get('data'))
+
+    return None
+
+
+def stale_reasons(updates: List[dict], rules: BacklogRules, now: float) -> Dict[int, str]:
+    """ decide which raw updates to skip, return the reason by update_id """
+    reasons = dict()
+    oldest = now - rules.message_age.total_seconds()
+    latest: Dict[Tuple[str, Tuple[Hashable, ...]], int] = dict()
+
+    for raw in updates:
+        for kind in _MESSAGE_KINDS:
+            if kind in raw:
+                message = raw[kind]
+                if message.get('edit_date', message.get('date', now)) < oldest:
+                    reasons[raw['update_id']] = 'stale ' + kind.replace('_', ' ')
+                break
+
+        key = _supersede_key(raw, rules)
+        if key is not None:
+            if key in latest:
+                reasons[latest[key]] = 'superseded ' + key[0]
+            latest[key] = raw['update_id']
+
+    return reasons
+
+
+def _fetch(bot: Bot, offset: Optional[int], timeout: float) -> List[dict]:
+    data = {'limit': BATCH_SIZE, 'timeout': 0}
+    if offset is not None:
+        data['offset'] = offset
+    return bot.request.post(f'{bot.base_url}/getUpdates', data=data, timeout=timeout)  # type: ignore
+
+
+def drain(bot: Bot, rules: Optional[BacklogRules] = None, timeout: float = 10.0) -> Tuple[List[Update], BacklogReport]:
+    """
+    fetch and confirm all pending updates,
+    return the ones worth dispatching and a report
+    """
+    rules = rules or BacklogRules()
+    report = BacklogReport()
+    started = time.monotonic()
+
+    pending: List[dict] = []
+    offset = None
+    while True:
+        batch = _fetch(bot, offset, timeout)
+        if not batch:
+            break
+
+        report.batches += 1
+        pending.extend(batch)
+        offset = batch[-1]['update_id'] + 1
+
+    report.fetched = len(pending)
+    reasons = stale_reasons(pending, rules, time.time())
+    report.skipped.update(reasons.values())
+    kept = [Update.de_json(raw, bot) for raw in pending if raw['update_id'] not in reasons]
+    report.seconds = time.monotonic() - started
+
+    logging.getLogger('herbert.SETUP').info('Drained backlog: %s', report.summary())
+    return [update for update in kept if update is not None], report
@@ -10,15 +10,23 @@ self.reply_text() without needing extra
 information about the invocation context
 and whether the call was via a chat command
 or an inline handler
+
+The context is stored per invocation (in a ContextVar),
+so a single bert instance can handle several updates
+at the same time
 """
 
+import asyncio
+import contextvars
 import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
 from io import BytesIO
-from typing import Callable, Any, Optional, TypeVar, Iterable, Tuple
+from typing import Callable, Any, Optional, TypeVar, Iterable, Iterator, List, Tuple
 
 from telegram import Message
 
-from common import chatformat
+from common import chatformat, metrics
 from common.reply import send_message as default_send
 from common.reply_data import (
     File, Gif, Photo, PhotoUrl, Sticker, Text, ReplyData,
@@ -26,12 +34,43 @@ from common.reply_data import (
 )
 
 
-__all__ = ['BaseBert', 'ImageBaseBert']
+__all__ = ['BaseBert', 'ImageBaseBert', 'invocation_context', 'collect_replies']
 CommandType = Callable[..., Any]
 BackendRet = TypeVar('BackendRet')
 Tp = TypeVar('Tp')
 SendRet = Optional[BackendRet]
 
+_current_context: ContextVar[Optional[Context]] = ContextVar('herbert_reply_context', default=None)
+_reply_sink: ContextVar[Optional[List[ReplyData]]] = ContextVar('herbert_reply_sink', default=None)
+
+
+@contextmanager
+def invocation_context(ctx: Optional[Context]) -> Iterator[None]:
+    """
+    Install ctx as the reply context for everything
+    running inside the with-block (in this thread or task)
+    """
+    token = _current_context.set(ctx)
+    try:
+        yield
+    finally:
+        _current_context.reset(token)
+
+
+@contextmanager
+def collect_replies() -> Iterator[List[ReplyData]]:
+    """
+    Capture everything sent inside the with-block
+    in a list instead of delivering it, e.g. to
+    deliver it later from a different process
+    """
+    replies: List[ReplyData] = []
+    token = _reply_sink.set(replies)
+    try:
+        yield replies
+    finally:
+        _reply_sink.reset(token)
+
 
 class BaseBert:
     """
@@ -43,9 +82,17 @@ class BaseBert:
     command invocations
     """
     def __init__(self, backend: Callable[[ReplyData, Context], BackendRet] = default_send):
-        self.context: Optional[Context] = None
         self._backend = backend
 
+    @property
+    def context(self) -> Optional[Context]:
+        """
+        the reply context of the invocation that is
+        currently being handled by the calling thread/task
+        (see invocation_context)
+        """
+        return _current_context.get()
+
     def enumerate_cmds(self) -> Iterable[CommandType]:
         """
         Return an iterable collection of all command handlers part of
@@ -106,10 +153,30 @@ class BaseBert:
         """
         Forward data to backend
         """
+        sink = _reply_sink.get()
+        if sink is not None:
+            sink.append(obj)
+            return None
+
         if self.context is not None:
-            return self._backend(obj, self.context)
+            with metrics.measure_send():
+                return self._backend(obj, self.context)
         return None
 
+    async def asend(self, obj: ReplyData) -> SendRet:
+        """
+        Forward data to backend from a coroutine handler.
+        The backend blocks, so it is run on the default executor
+        of the running event loop, within the current reply context
+        """
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(None, ctx.run, self.send, obj)
+
+    async def asend_message(self, msg: str, parse_mode=chatformat.get_parse_mode(),
+                            disable_web_page_preview=False) -> SendRet:
+        """ coroutine version of send_message """
+        return await self.asend(self._prepare_text(msg, parse_mode, disable_web_page_preview))
+
     def send_message(self, msg: str, parse_mode=chatformat.get_parse_mode(),
                      disable_web_page_preview=False) -> SendRet:
         """
@@ -184,3 +251,10 @@ class ImageBaseBert(BaseBert):
         return self.send(
             File(caption, file_like, 'image.png') if full else
             Photo(caption, file_like))
+
+    def send_png(self, data: bytes, full=False, caption=None):
+        """ send already encoded png data, as a photo or (if full) as a file """
+        file_like = BytesIO(data)
+        return self.send(
+            File(caption, file_like, 'image.png') if full else
+            Photo(caption, file_like))
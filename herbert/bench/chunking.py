@@ -0,0 +1,78 @@
+"""
+Benchmark
+
+Measure splitting multi-megabyte texts (like the output
+of /gettext on a large page) with thousands of entities
+into telegram sized chunks, compared to the former
+implementation, which rescanned every entity per chunk.
+
+run `PYTHONPATH=. python3 bench/chunking.py`
+"""
+from copy import copy
+from random import Random
+from timeit import timeit
+
+from telegram import MessageEntity
+
+from common.chunking import chunk_text
+from common.telegram_limits import MSG_CHUNK
+
+SIZES = (1 << 20, 4 << 20)
+# one entity per this many characters
+ENTITY_EVERY = 400
+ROUNDS = 3
+
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'grüße', '💬', 'ünïcödé', '\n')
+
+
+def _document(size: int):
+    """ a text of about size characters, with an entity (some crossing chunks) every ENTITY_EVERY of them """
+    rand = Random(size)
+    words = []
+    length = 0
+    while length < size:
+        word = rand.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    msg = ' '.join(words)
+
+    utf16 = len(msg.encode('utf-16le')) // 2
+    entities = [MessageEntity(MessageEntity.ITALIC, offset, rand.randint(1, 2 * MSG_CHUNK if offset % 7 == 0 else 80))
+                for offset in range(0, utf16 - 2 * MSG_CHUNK, ENTITY_EVERY)]
+    return msg, entities
+
+
+def _former(msg, entities):
+    """ the implementation chunk_text replaced, for comparison """
+    res = []
+    pos = 0
+    size = len(msg.encode('utf-16le')) // 2
+    while pos < size:
+        end = min(size, pos + MSG_CHUNK)
+        parts = list()
+        for entity in entities:
+            if (entity.offset in range(pos, end)
+                    or entity.offset + entity.length in range(pos, end)
+                    or (entity.offset < pos and entity.offset + entity.length > end)):
+                part = copy(entity)
+                part.offset = max(0, part.offset - pos)
+                part.length = min(part.length, end - part.offset)
+                parts.append(part)
+        res.append((msg[pos:end], parts))
+        pos = end
+    return res
+
+
+def bench():
+    """ print the time to chunk each document """
+    print(f'{"chars":>10} {"entities":>10} {"chunks":>8} {"former":>10} {"chunk_text":>12}   (ms per text)')
+    for size in SIZES:
+        msg, entities = _document(size)
+        chunks = sum(1 for _ in chunk_text(msg, entities))
+        former = timeit(lambda m=msg, e=entities: _former(m, e), number=ROUNDS) / ROUNDS
+        current = timeit(lambda m=msg, e=entities: list(chunk_text(m, e)), number=ROUNDS) / ROUNDS
+        print(f'{len(msg):>10} {len(entities):>10} {chunks:>8} {former * 1e3:>10.1f} {current * 1e3:>12.1f}')
+
+
+if __name__ == '__main__':
+    bench()
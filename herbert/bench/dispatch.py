@@ -0,0 +1,72 @@
+"""
+Benchmark
+
+Measure the cost of routing a single command update
+through the ptb dispatcher, once with one
+HerbotPrefixHandler per command alias and once with
+the HerbotCommandRouter, for a growing number of
+registered commands.
+
+run `PYTHONPATH=. python3 bench/dispatch.py`
+"""
+from datetime import datetime
+from queue import Queue
+from timeit import timeit
+
+from telegram import Bot, Update
+from telegram.ext import Dispatcher
+
+from common.prefixhandler import HerbotPrefixHandler, HerbotCommandRouter
+
+SIZES = (10, 80, 320, 1280)
+ROUNDS = 2000
+
+
+def _noop(_update, _context):
+    pass
+
+
+def _make_update(text: str) -> Update:
+    return Update.de_json({
+        'update_id': 1,
+        'message': {
+            'message_id': 1,
+            'date': int(datetime.now().timestamp()),
+            'chat': {'id': 42, 'type': 'private'},
+            'text': text
+        }
+    }, None)
+
+
+def _dispatcher(size: int, routed: bool) -> Dispatcher:
+    dispatcher = Dispatcher(Bot('123:bench'), Queue(), workers=1)
+    names = [f'cmd{i}' for i in range(size)]
+
+    if routed:
+        router = HerbotCommandRouter()
+        for name in names:
+            router.add(name, _noop)
+        dispatcher.add_handler(router)
+    else:
+        for name in names:
+            dispatcher.add_handler(HerbotPrefixHandler(name, _noop))
+
+    return dispatcher
+
+
+def bench():
+    """ print the dispatch time per update for each configuration """
+    print(f'{"commands":>10} {"handler/alias":>16} {"router":>10}   (µs per update, worst case lookup)')
+    for size in SIZES:
+        update = _make_update(f'/cmd{size - 1} some arguments here')
+        results = []
+        for routed in (False, True):
+            dispatcher = _dispatcher(size, routed)
+            seconds = timeit(lambda d=dispatcher: d.process_update(update), number=ROUNDS)
+            results.append(seconds / ROUNDS * 1e6)
+
+        print(f'{size:>10} {results[0]:>16.1f} {results[1]:>10.1f}')
+
+
+if __name__ == '__main__':
+    bench()
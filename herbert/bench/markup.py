@@ -0,0 +1,80 @@
+"""
+Benchmark
+
+Measure the throughput of rendering markup to html and of
+turning it into message entities, for each markup style,
+compared to the former implementation: successive
+str.replace passes or uncompiled regexes per style, and
+entities parsed from the rendered html.
+
+run `PYTHONPATH=. python3 bench/markup.py`
+"""
+import re
+from timeit import timeit
+
+from common.chatformat import STYLE_BACKEND, STYLE_HTML, STYLE_MD, STYLE_PARA, _EntityParser, \
+    bold, escape_string, italic, link_to, mono, parse_entities, render
+
+SIZE = 1 << 18
+ROUNDS = 5
+
+
+def _former_backend(string):
+    string = escape_string(string, style=STYLE_HTML)
+    for key, val in (('!§![i', '<i>'), ('!§!]i', '</i>'), ('!§![c', '<code>'), ('!§!]c', '</code>'),
+                     ('!§![b', '<b>'), ('!§!]b', '</b>'), ('!§![a', '<a href="'), ('!§!|A', '">'), ('!§!]a', '</a>')):
+        string = string.replace(key, val)
+    return string
+
+
+def _former_para(string):
+    def replace(match):
+        text = match.group(1)
+        return dict(m=mono, i=italic, b=bold).get(text[0])(text[2:], style=STYLE_HTML)
+    return re.sub(r'([mbi]§[^§]*)§', replace, string)
+
+
+def _former_markdown(string):
+    string = re.sub(r'`([^`]*)`', lambda m: mono(m.group(1), style=STYLE_HTML), string)
+    string = re.sub(r'_([^_]*)_', lambda m: italic(m.group(1), style=STYLE_HTML), string)
+    return re.sub(r'\*([^*]*)\*', lambda m: bold(m.group(1), style=STYLE_HTML), string)
+
+
+FORMER = {STYLE_BACKEND: _former_backend, STYLE_PARA: _former_para, STYLE_MD: _former_markdown}
+
+
+def _former_parse(string, style):
+    parser = _EntityParser()
+    parser.feed(FORMER[style](string))
+    parser.close()
+    return parser.output, parser.entities
+
+
+def _document(style: str) -> str:
+    line = f'{bold("/command", style=style)} {italic("[args]", style=style)} — do something ' \
+        f'{mono("useful", style=style)} with it 🙂\n'
+    if style == STYLE_BACKEND:
+        line += f'see {link_to("https://example.org/help", "the help", style=style)}\n'
+    return line * (SIZE // len(line))
+
+
+def _throughput(func) -> float:
+    """ MB/s """
+    return SIZE / (timeit(func, number=ROUNDS) / ROUNDS) / 1e6
+
+
+def bench():
+    """ print the throughput of both implementations per style """
+    print(f'{"style":>10} {"render":>8} {"former":>8} {"entities":>9} {"former":>8}   (MB/s of markup)')
+    for style in (STYLE_BACKEND, STYLE_PARA, STYLE_MD):
+        text = _document(style)
+        assert render(text, style)[0] == FORMER[style](text)
+        print(f'{style:>10}'
+              f' {_throughput(lambda t=text, s=style: render(t, s)):>8.1f}'
+              f' {_throughput(lambda t=text, s=style: FORMER[s](t)):>8.1f}'
+              f' {_throughput(lambda t=text, s=style: parse_entities(t, s)):>9.1f}'
+              f' {_throughput(lambda t=text, s=style: _former_parse(t, s)):>8.1f}')
+
+
+if __name__ == '__main__':
+    bench()
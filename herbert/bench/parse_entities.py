@@ -0,0 +1,89 @@
+"""
+Benchmark
+
+Measure chatformat.parse_entities on the html rendering
+of a long help text (a bold command name and a description
+per line) and of a web-page dump (long runs of text with a
+few links), for doubling sizes. The time per character
+should stay flat; the former parser, which re-encoded all
+output on every tag, is shown for comparison.
+
+run `PYTHONPATH=. python3 bench/parse_entities.py`
+"""
+from timeit import timeit
+
+from common.basic_utils import utf16len
+from common.chatformat import parse_entities, render, bold, italic, link_to, mono, STYLE_BACKEND, STYLE_HTML, _EntityParser
+import common.chatformat
+
+SIZES = (1 << 14, 1 << 16, 1 << 18, 1 << 20)
+# the former parser is too slow beyond this
+FORMER_MAX = 1 << 18
+
+
+class _FormerParser(_EntityParser):
+    """ accumulates the output with += and measures it on every tag """
+    def __init__(self):
+        super().__init__()
+        self.text = ''
+
+    @property
+    def output(self):
+        return self.text
+
+    @property
+    def output_pos(self):
+        return utf16len(self.text)
+
+    @output_pos.setter
+    def output_pos(self, _value):
+        pass
+
+    def handle_data(self, data):
+        self.text += data
+
+
+def _help_text(size: int) -> str:
+    lines = []
+    length = 0
+    while length < size:
+        line = f'{bold(f"/command{len(lines)}")} {italic("[args]")} — Do something {mono("useful")} 🙂 with it\n'
+        lines.append(line)
+        length += len(line)
+    return ''.join(lines)
+
+
+def _page_dump(size: int) -> str:
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraph = 'Lorem ipsum dolor sit amet, grüße aus dem Internet. ' * 20 \
+            + link_to(f'https://example.org/{len(paragraphs)}', 'more') + '\n\n'
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return ''.join(paragraphs)
+
+
+def _seconds(text: str, parser: type) -> float:
+    common.chatformat._EntityParser = parser  # pylint: disable=protected-access
+    try:
+        rounds = max(1, (1 << 20) // len(text))
+        return timeit(lambda: parse_entities(text, STYLE_HTML), number=rounds) / rounds
+    finally:
+        common.chatformat._EntityParser = _EntityParser  # pylint: disable=protected-access
+
+
+def bench():
+    """ print the parse time per character for each document and size """
+    print(f'{"document":>10} {"chars":>9} {"entities":>9} {"former":>10} {"current":>10}   (µs per 1k chars)')
+    for name, generate in (('help', _help_text), ('page', _page_dump)):
+        for size in SIZES:
+            text, _ = render(generate(size), STYLE_BACKEND)
+            entities = len(parse_entities(text, STYLE_HTML)[1])
+            current = _seconds(text, _EntityParser) / len(text) * 1e9
+            former = f'{_seconds(text, _FormerParser) / len(text) * 1e9:.1f}' if size <= FORMER_MAX else '-'
+            print(f'{name:>10} {len(text):>9} {entities:>9} {former:>10} {current:>10.1f}')
+
+
+if __name__ == '__main__':
+    bench()
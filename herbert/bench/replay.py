@@ -0,0 +1,179 @@
+"""
+Benchmark
+
+Replay a corpus of recorded updates (commands, inline queries
+and callback queries) through the bot built by create_bot(),
+with a fake bot backend answering every API call locally.
+Everything between the dispatcher and the API call is real:
+routing, decorators, scheduling, reply contexts and chat formatting.
+
+Reports the throughput, the per-command handler and send
+latencies (from common.metrics) and, with --allocations,
+the peak memory allocated per command and the allocation
+sites that grew the most over the replay.
+
+run `PYTHONPATH=. python3 bench/replay.py [--repeat N] [--allocations] [corpus.jsonl]`,
+where every line of the corpus is a recorded update (as sent
+by telegram). The default corpus is bench/replay_corpus.jsonl
+"""
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime
+from os import path
+from threading import Lock
+from typing import Dict, List
+
+from telegram import Bot, Update
+
+import scheduler
+from common import metrics
+from herbert import create_bot
+
+CORPUS = path.join(path.dirname(path.abspath(__file__)), 'replay_corpus.jsonl')
+BOT_USER = {'id': 123, 'is_bot': True, 'first_name': 'herbert', 'username': 'herbert_bot'}
+
+
+class ReplayBot(Bot):
+    """ a bot whose API calls never leave the process """
+
+    def __init__(self, token: str = '123:replay'):
+        super().__init__(token)
+        self.calls: Counter = Counter()
+        self._message_id = 0
+        self._lock = Lock()
+
+    def _post(self, endpoint, data=None, timeout=None, api_kwargs=None):
+        data = {**(data or {}), **(api_kwargs or {})}
+        with self._lock:
+            self.calls[endpoint] += 1
+            self._message_id += 1
+            message_id = self._message_id
+
+        if endpoint == 'getMe':
+            return BOT_USER
+
+        if endpoint.startswith('send') or endpoint.startswith('edit'):
+            chat_id = int(data.get('chat_id', 0) or 0)
+            return {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+                'from': BOT_USER,
+                'text': str(data.get('text', data.get('caption', ''))),
+            }
+
+        return True
+
+
+def read_corpus(fname: str) -> List[dict]:
+    """ read recorded updates, one json object per line """
+    with open(fname, 'r') as fobj:
+        return [json.loads(line) for line in fobj if line.strip()]
+
+
+def update_key(raw: dict) -> str:
+    """ a name for the kind of update, used to group allocations """
+    if 'inline_query' in raw:
+        return 'inline:' + (raw['inline_query']['query'].split() or [''])[0]
+    if 'callback_query' in raw:
+        return 'callback'
+
+    text = raw.get('message', {}).get('text', '')
+    return text.split()[0] if text.startswith('/') else 'text'
+
+
+def fresh_updates(corpus: List[dict], bot: Bot, first_id: int) -> List[Update]:
+    """ decode the corpus with current dates (old messages may be dropped) and distinct update ids """
+    now = int(datetime.now().timestamp())
+    updates = []
+    for offset, raw in enumerate(corpus):
+        raw = json.loads(json.dumps(raw))
+        raw['update_id'] = first_id + offset
+        for message in (raw.get('message'), raw.get('callback_query', {}).get('message')):
+            if message is not None:
+                message['date'] = now
+        updates.append(Update.de_json(raw, bot))
+    return updates
+
+
+def replay(dispatcher, updates: List[Update]) -> float:
+    """ dispatch all updates and wait until they were handled, return the seconds it took """
+    started = time.perf_counter()
+    for update in updates:
+        dispatcher.process_update(update)
+    scheduler.join()
+    return time.perf_counter() - started
+
+
+def allocations(dispatcher, corpus: List[dict], bot: Bot, first_id: int, top: int) -> None:
+    """ print the peak allocations per update kind and the sites that retained the most memory """
+    peaks: Dict[str, List[int]] = defaultdict(list)
+    updates = fresh_updates(corpus, bot, first_id)
+
+    tracemalloc.start(16)
+    before = tracemalloc.take_snapshot()
+    for raw, update in zip(corpus, updates):
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        dispatcher.process_update(update)
+        scheduler.join()
+        peaks[update_key(raw)].append(tracemalloc.get_traced_memory()[1] - baseline)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    print(f'\n{"update":<20} {"n":>5} {"mean peak":>12} {"max peak":>12}')
+    for key, values in sorted(peaks.items(), key=lambda item: -max(item[1])):
+        print(f'{key:<20} {len(values):>5} {sum(values) / len(values) / 1024:>10.1f}kB {max(values) / 1024:>10.1f}kB')
+
+    print(f'\ntop {top} retained allocation sites')
+    for stat in after.compare_to(before, 'lineno')[:top]:
+        print(stat)
+
+
+def bench():
+    """ replay the corpus and print throughput, latencies and (optionally) allocations """
+    parser = argparse.ArgumentParser(description='Replay recorded updates through herbert')
+    parser.add_argument('corpus', nargs='?', default=CORPUS)
+    parser.add_argument('--repeat', type=int, default=50, help='replay the corpus this often')
+    parser.add_argument('--allocations', action='store_true', help='trace allocations per update')
+    parser.add_argument('--top', type=int, default=15, help='number of allocation sites shown')
+    args = parser.parse_args()
+    corpus = read_corpus(path.abspath(args.corpus))
+
+    # handler errors of the corpus (e.g. broken berts) must not flood the output
+    logging.disable(logging.CRITICAL)
+
+    bot = ReplayBot()
+    # queries held back by the debouncer would not be waited for by scheduler.join()
+    herbert = create_bot(bot=bot, rate_limited=False, metrics_file=None, inline_debounce=0, file_id_file=None)
+    dispatcher = herbert.updater.dispatcher
+    scheduler.start()
+
+    # warm up: import lazy berts, fill caches
+    warmup = replay(dispatcher, fresh_updates(corpus, bot, 1))
+    print(f'{len(corpus)} updates, first replay {warmup * 1000:.0f}ms (includes loading berts)')
+    metrics.commands.clear()
+    bot.calls.clear()
+
+    updates = [fresh_updates(corpus, bot, (i + 2) * len(corpus)) for i in range(args.repeat)]
+    seconds = sum(replay(dispatcher, batch) for batch in updates)
+    total = len(corpus) * args.repeat
+    print(f'{total} updates in {seconds:.2f}s: {total / seconds:.0f} updates/s')
+    print(f'api calls: {dict(bot.calls.most_common())}')
+
+    print(f'\n{"command":<16} {"n":>5} {"err":>4} {"fail":>4}   handler / send')
+    for name, command in sorted(metrics.commands.items()):
+        print(f'{name:<16} {command.invocations:>5} {command.herberrors:>4} {command.failures:>4}   '
+              f'{command.handler_time.summary()}')
+        print(f'{"":<33}{command.send_time.summary()}')
+
+    if args.allocations:
+        allocations(dispatcher, corpus, bot, (args.repeat + 2) * len(corpus), args.top)
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,66 @@
+"""
+Benchmark
+
+Measure the latency of rendering small formulas through
+ext/texit.zsh on each pre-level, once compiling the full
+preamble every time and once with the preamble precompiled
+into a format (built before measuring). Needs pdflatex,
+pdftoppm and zsh.
+
+run `PYTHONPATH=. python3 bench/tex_format.py [--rounds N]`
+"""
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+
+import path
+from berts import texbert
+from berts.texbert import pre_levels, texit_command
+from common.deadline import run_process
+
+SOURCES = {
+    3: 'Hello World!',
+    4: '\\sum_{n=1}^\\infty \\frac{1}{n^2} = \\frac{\\pi^2}{6}',
+    5: 'a &= b \\\\ &= c',
+    6: '\\draw (0,0) -- (1,1);',
+}
+
+
+def _render(level: int, use_format: bool) -> float:
+    args, document = texit_command(level, SOURCES[level], 1000, use_format=use_format)
+    started = time.perf_counter()
+    result = run_process(args, input=document.encode('utf8'))
+    seconds = time.perf_counter() - started
+    if result.returncode not in (0, 2):
+        raise RuntimeError(f'pre={level} failed: {result.stdout.decode("utf8", "replace")}')
+    return seconds
+
+
+def bench():
+    """ print the median render latency per pre-level, with and without formats """
+    parser = argparse.ArgumentParser(description='Compare tex renders with and without precompiled preambles')
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    missing = [tool for tool in ('pdflatex', 'pdftoppm', 'zsh') if shutil.which(tool) is None]
+    if missing:
+        print(f'{", ".join(missing)} not found, nothing to measure')
+        return
+
+    path.change_path()
+    with tempfile.TemporaryDirectory() as directory:
+        texbert.TEX_FORMAT_DIR = directory
+        print(f'{"pre":>4} {"preamble":>10} {"format":>10} {"speedup":>8}   (median ms per render)')
+        for level in sorted(SOURCES):
+            assert level < len(pre_levels)
+            # the first render builds the format
+            _render(level, True)
+            full = statistics.median(_render(level, False) for _ in range(args.rounds))
+            fmt = statistics.median(_render(level, True) for _ in range(args.rounds))
+            print(f'{level:>4} {full * 1e3:>10.0f} {fmt * 1e3:>10.0f} {full / fmt:>7.1f}x')
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,64 @@
+"""
+Benchmark
+
+Measure how many formulas per second the tex pool renders with
+1, 4 and 16 renders submitted at once, once running texit.zsh
+for every render and once with warm pdflatex engines (see
+berts.warmtex). The pool has executors.TEX_WORKERS workers,
+more concurrent renders only wait longer. Needs pdflatex,
+pdftoppm and zsh.
+
+run `PYTHONPATH=. python3 bench/tex_throughput.py [--renders N]`
+"""
+import argparse
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import path
+from berts.texbert import render
+from executors import pools, run_in_process
+
+LEVEL = 4
+
+
+def _throughput(concurrency: int, renders: int, warm: bool) -> float:
+    """ renders per second, each with a source of its own """
+    def job(i: int):
+        _compiled, png = run_in_process(render, LEVEL, f'\\sum_{{n=1}}^{{{i}}} n^2', 1000, False, warm=warm, pool='tex')
+        assert png is not None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as threads:
+        list(threads.map(job, range(renders)))
+    return renders / (time.perf_counter() - started)
+
+
+def bench():
+    """ print the throughput per concurrency, with and without warm engines """
+    parser = argparse.ArgumentParser(description='Compare tex render throughput with and without warm engines')
+    parser.add_argument('--renders', type=int, default=32)
+    args = parser.parse_args()
+
+    missing = [tool for tool in ('pdflatex', 'pdftoppm', 'zsh') if shutil.which(tool) is None]
+    if missing:
+        print(f'{", ".join(missing)} not found, nothing to measure')
+        return
+
+    path.change_path()
+    try:
+        # builds the format and starts the workers and their engines
+        for warm in (False, True, True):
+            _throughput(pools['tex'].max_workers, pools['tex'].max_workers, warm)
+
+        print(f'{"concurrent":>10} {"texit":>8} {"warm":>8} {"speedup":>8}   (renders per second)')
+        for concurrency in (1, 4, 16):
+            cold = _throughput(concurrency, args.renders, False)
+            warm = _throughput(concurrency, args.renders, True)
+            print(f'{concurrency:>10} {cold:>8.1f} {warm:>8.1f} {warm / cold:>7.1f}x')
+    finally:
+        pools['tex'].shutdown()
+
+
+if __name__ == '__main__':
+    bench()
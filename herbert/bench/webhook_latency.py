@@ -0,0 +1,154 @@
+"""
+Benchmark
+
+Measure the end-to-end latency of the webhook mode:
+a local stub POSTs recorded updates to the WebhookServer,
+and the time until the update reaches the dispatcher's handlers
+is recorded per update.
+
+run `PYTHONPATH=. python3 bench/webhook_latency.py [updates.jsonl]`,
+where every line of updates.jsonl is a recorded update
+(as sent by telegram). Without a file, command updates
+are generated.
+"""
+import http.client
+import json
+import sys
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from queue import Queue
+from threading import Condition, Thread
+from typing import Dict, List
+
+from telegram import Bot, Update
+from telegram.ext import Dispatcher, TypeHandler
+
+from common.metrics import Histogram
+from webhook import WebhookConfig, WebhookServer
+
+UPDATES = 5000
+CONCURRENCY = (1, 4, 16)
+
+
+def make_updates(count: int) -> List[dict]:
+    """ generate command updates with distinct ids """
+    now = int(datetime.now().timestamp())
+    return [{
+        'update_id': i,
+        'message': {
+            'message_id': i,
+            'date': now,
+            'chat': {'id': 42 + i % 7, 'type': 'private'},
+            'text': f'/ping {i}'
+        }
+    } for i in range(count)]
+
+
+def read_updates(fname: str) -> List[dict]:
+    """ read recorded updates, one json object per line """
+    with open(fname, 'r') as fobj:
+        return [json.loads(line) for line in fobj if line.strip()]
+
+
+class UpdateStub:
+    """
+    Plays the part of telegram: POSTs updates to a
+    webhook listener, each connection sending its share
+    of the updates one after another (with keep-alive)
+    """
+
+    def __init__(self, port: int, path: str, secret_token=None):
+        self.port = port
+        self.path = path
+        self.headers = {'Content-Type': 'application/json'}
+        if secret_token is not None:
+            self.headers['X-Telegram-Bot-Api-Secret-Token'] = secret_token
+
+        self.sent: Dict[int, float] = dict()
+
+    def post(self, connection: http.client.HTTPConnection, body: bytes) -> int:
+        """ POST a single raw body, return the response status """
+        connection.request('POST', self.path, body, self.headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+
+    def _send_all(self, updates: List[dict]) -> None:
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            for update in updates:
+                self.sent[update['update_id']] = time.monotonic()
+                status = self.post(connection, json.dumps(update).encode('utf-8'))
+                assert status == 200, status
+        finally:
+            connection.close()
+
+    def send(self, updates: List[dict], connections: int = 1) -> None:
+        """ POST all updates, spread over some parallel connections """
+        shares = [updates[i::connections] for i in range(connections)]
+        with ThreadPoolExecutor(connections) as pool:
+            list(pool.map(self._send_all, shares))
+
+
+class UpdateRecorder:
+    """ remembers when each update reached the dispatcher's handlers """
+
+    def __init__(self):
+        self.handled: Dict[int, float] = dict()
+        self.condition = Condition()
+
+    def record(self, update: Update, _context) -> None:
+        """ ptb callback """
+        with self.condition:
+            self.handled[update.update_id] = time.monotonic()
+            self.condition.notify_all()
+
+    def wait_for(self, count: int, timeout: float = 30) -> bool:
+        """ block until count updates were handled """
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.handled) >= count, timeout)
+
+
+def start_pipeline(config: WebhookConfig):
+    """ start a dispatcher fed by a webhook server, return (server, dispatcher, recorder) """
+    # no async workers, starting them would ask telegram for the bot's id
+    warnings.filterwarnings('ignore', 'Asynchronous callbacks', UserWarning)
+    dispatcher = Dispatcher(Bot('123:bench'), Queue(), workers=0)
+    recorder = UpdateRecorder()
+    dispatcher.add_handler(TypeHandler(Update, recorder.record))
+    Thread(target=dispatcher.start, daemon=True).start()
+
+    server = WebhookServer(config, dispatcher.bot, dispatcher.update_queue)
+    server.start()
+    return server, dispatcher, recorder
+
+
+def bench():
+    """ print the end-to-end latency for a growing number of parallel connections """
+    updates = read_updates(sys.argv[1]) if len(sys.argv) > 1 else make_updates(UPDATES)
+
+    print(f'{len(updates)} updates')
+    print(f'{"connections":>12} {"updates/s":>10}   end-to-end latency')
+    for connections in CONCURRENCY:
+        server, dispatcher, recorder = start_pipeline(WebhookConfig(port=0, listeners=connections))
+        stub = UpdateStub(server.server_port, server.config.path)
+
+        started = time.monotonic()
+        stub.send(updates, connections)
+        recorder.wait_for(len(updates))
+        seconds = time.monotonic() - started
+
+        latency = Histogram()
+        for update_id, handled in recorder.handled.items():
+            latency.observe(handled - stub.sent[update_id])
+
+        print(f'{connections:>12} {len(updates) / seconds:>10.0f}   {latency.summary()}')
+
+        server.stop()
+        dispatcher.stop()
+
+
+if __name__ == '__main__':
+    bench()
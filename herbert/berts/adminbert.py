@@ -0,0 +1,138 @@
+"""
+Bert
+
+Commands to look into a running herbert instance.
+Only available to the users listed in the admin file.
+
+provided commands:
+    - lanes
+    - imports
+    - stats
+    - profile
+"""
+from io import BytesIO
+
+from basebert import BaseBert, invocation_context
+from common import metrics, profiling
+from common.file_ids import file_ids
+from common.inline_cache import inline_results
+from common.singleflight import flights
+from common.argparser import Args
+from common.chatformat import mono, bold
+from decorators import command, admin_only
+from herberror import Herberror
+import core
+import executors
+import scheduler
+
+__all__ = ['AdminBert']
+
+
+def _format_stats(title: str, stats: dict) -> str:
+    lines = '\n'.join(f'{key:>11}: {val}' for key, val in stats.items())
+    return f'{bold(title)}\n{mono(lines)}\n'
+
+
+def _percentiles(hist: metrics.Histogram) -> str:
+    return '/'.join(f'{hist.percentile(q) * 1000:.0f}' for q in (.5, .95, .99))
+
+
+def _format_command(cmd: metrics.CommandMetrics) -> str:
+    return (f'/{cmd.name}: {cmd.invocations}x, {cmd.herberrors} herberrors, {cmd.failures} failed, '
+            f'{cmd.deadline_exceeded} timed out\n'
+            f'  handler {_percentiles(cmd.handler_time)} ms\n'
+            f'  send    {_percentiles(cmd.send_time)} ms')
+
+
+class AdminBert(BaseBert):
+    """
+    Runtime information for admins
+    """
+
+    @command(pass_args=False, register_help=False, cost='cheap')
+    @admin_only
+    def lanes(self):
+        """ Show the scheduler lanes, process pools, send queue, coalescing and inline query handling """
+        msg = ''.join(_format_stats(f'lane {name}', lane.stats()) for name, lane in scheduler.lanes.items())
+        if scheduler.async_lane.enabled:
+            msg += _format_stats(f'lane {scheduler.async_lane.name}', scheduler.async_lane.stats())
+        msg += ''.join(_format_stats(f'pool {name}', pool.stats()) for name, pool in executors.pools.items())
+        msg += _format_stats('send queue', core.send_queue.stats())
+        msg += _format_stats('coalescing', flights.stats())
+        msg += _format_stats('inline queries', core.inline_debouncer.stats())
+        msg += _format_stats('inline cache', inline_results.stats())
+        msg += _format_stats('uploads', file_ids.stats())
+        self.send_message(msg)
+
+    @command(pass_args=False, register_help=False, cost='cheap')
+    @admin_only
+    def imports(self):
+        """ Show how long importing each bert took, and which ones were not needed yet """
+        costs = {name: f'{seconds * 1000:.0f}ms (startup)' for name, seconds in core.import_costs.items()}
+        for lazy in core.lazy_berts:
+            costs[lazy.entry.cls] = ('not loaded' if lazy.import_seconds is None
+                                     else f'{lazy.import_seconds * 1000:.0f}ms (first use)')
+
+        self.send_message(_format_stats('bert imports', dict(sorted(costs.items()))))
+
+    @command(pass_args=False, register_help=False, cost='cheap')
+    @admin_only
+    def stats(self):
+        """ Show invocation counts, errors and p50/p95/p99 latencies of all commands used so far """
+        used = sorted(metrics.commands.values(), key=lambda cmd: -cmd.invocations)
+        if not used:
+            self.send_message('No commands were used yet.')
+            return
+
+        self.send_message(f"{bold('command stats')} (p50/p95/p99)\n" +
+                          mono('\n'.join(_format_command(cmd) for cmd in used)))
+
+    @command(pass_string=True, register_help=False, cost='cheap')
+    @admin_only
+    def profile(self, string):
+        """
+        Profile the next invocations of a command
+
+        /profile [send=text|pstats|both] <cmd> <N> runs the next N invocations of <cmd> under cProfile,
+        and sends the top functions as a text file or the aggregated .pstats file, once all of them are done.
+        N=0 cancels the profile, without arguments the pending profiles are listed.
+        """
+        argvals, string = Args.parse(string, {
+            'send': Args.T.one_of('text', 'pstats', 'both'),
+        })
+        send = argvals.get('send') or 'text'
+
+        name, *count = string.split()[:2] or [None]
+        if name is None:
+            pending = [f'/{req.command}: {req.recorded}/{req.count}' for req in profiling.active_profiles()]
+            self.send_message(mono('\n'.join(pending)) if pending else 'Nothing is being profiled.')
+            return
+
+        name = name.lstrip('/')
+        method = next((cmd for entry in core.bert_docs for cmd in entry.commands if name in cmd.aliases), None)
+        if method is None:
+            raise Herberror(f'There is no command /{name}.')
+        if method.coroutine:
+            raise Herberror(f'/{name} is a coroutine, those can not be profiled.')
+
+        if count and not count[0].isdigit():
+            raise Herberror('The number of invocations has to be a number.')
+        count = int(count[0]) if count else 10
+
+        if count == 0:
+            cancelled = profiling.cancel_profile(method.method)
+            self.send_message(f'Cancelled the profile of /{name}.' if cancelled else f'/{name} was not being profiled.')
+            return
+
+        context = self.context
+
+        def on_done(request: profiling.ProfileRequest):
+            caption = f'/{name}, {request.recorded} invocations'
+            with invocation_context(context):
+                if send in ('text', 'both'):
+                    self.send_text_file(request.top_functions(), fname=f'profile-{name}.txt', caption=caption)
+                if send in ('pstats', 'both'):
+                    self.send_file(f'profile-{name}.pstats', BytesIO(request.pstats_data()), caption=caption)
+
+        profiling.request_profile(method.method, count, on_done)
+        self.send_message(f'Profiling the next {count} invocations of /{name}.')
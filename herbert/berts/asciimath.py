@@ -58,7 +58,7 @@ class AsciiBert(TexBert):
     """
 
     @aliases('am')
-    @command(pass_string=True)
+    @command(pass_string=True, executor='process', cost='cpu')
     @doc(
         """
         Turn your plaintext equations into images
@@ -30,6 +30,9 @@ TRANSPOSE = 't'
 INVERT = 'i'
 COPY = 'c'
 
+# seconds a single image may take to render
+RENDER_DEADLINE = 20
+
 do_things_to_img = {
     ROTATE_LEFT: Image.ROTATE_90,
     ROTATE_RIGHT: Image.ROTATE_270,
@@ -45,7 +48,7 @@ def atom_colors(entry):
 
 
 class DiaMaltBert(ImageBaseBert):
-    @command
+    @command(executor='process', cost='cpu', deadline=RENDER_DEADLINE)
     @doc(
         """
         Draws a time diagram of a 1D cellular Automaton
@@ -167,7 +170,7 @@ class DiaMaltBert(ImageBaseBert):
             pow_of_2 *= 2
         return subrules[output]
 
-    @command
+    @command(executor='process', cost='cpu', deadline=RENDER_DEADLINE)
     @doc(
         """
         Generate a self-similar fractal carpet based on the given parameters
@@ -24,7 +24,7 @@ class GameBert(ImageBaseBert):
         self.shown_board_message = None
         self.naming_message = None
 
-    @command(pass_args=False)
+    @command(pass_args=False, cost='cpu')
     @doc("""doesnt work, kamal pls fix""")
     def show(self):
         if not self.game_running:
@@ -39,7 +39,7 @@ class GameBert(ImageBaseBert):
                 InlineKeyboardMarkup, InlineKeyboardButton)
         )
 
-    @command(pass_args=False)
+    @command(pass_args=False, cost='cpu')
     @doc("""doesnt work, kamal pls fix""")
     def start(self):
         if self.game_running:
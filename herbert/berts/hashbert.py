@@ -27,35 +27,35 @@ class HashBert(BaseBert):
     a letter shift obfuscator
     """
 
-    @command(pass_string=True, allow_inline=True, register_help=ONLY_BASIC_HELP)
+    @command(pass_string=True, allow_inline=True, register_help=ONLY_BASIC_HELP, cost='cheap')
     @doc(""" Return the md5-hash of the given string """)
     def md5(self, string):
         self.reply_text(mono(hl.md5(str_to_bytes(string)).hexdigest()))
 
     @aliases('sha512', 'hash', 'sha')
-    @command(pass_string=True, allow_inline=True)
+    @command(pass_string=True, allow_inline=True, cost='cheap')
     @doc(""" Return the sha512-hash of the given string """)
     def sha512(self, string):
         self.reply_text(mono(hl.sha512(str_to_bytes(string)).hexdigest()))
 
-    @command(pass_string=True, allow_inline=True)
+    @command(pass_string=True, allow_inline=True, cost='cheap')
     @doc(""" Base64-encode the given string """)
     def b64enc(self, string):
         self.reply_text(mono(b64e(string)))
 
-    @command(pass_string=True, allow_inline=True)
+    @command(pass_string=True, allow_inline=True, cost='cheap')
     @doc(""" Base64-decode the given string """)
     def b64dec(self, string):
         self.reply_text(mono(b64d(string)))
 
-    @command(pass_string=True)
+    @command(pass_string=True, cost='cheap')
     @doc(""" Run a string through all available hash-functions """)
     def hashit(self, string):
         self.send_message(hash_all(str_to_bytes(string)),
                           parse_mode=STYLE_MD)
 
     @aliases('rotate', 'shift', 'ceasar')
-    @command(allow_inline=True)
+    @command(allow_inline=True, cost='cheap')
     @doc("""
         Shift every letter of the string by n positions
 
@@ -8,15 +8,17 @@ provided commands:
     - help
 """
 import re
-from functools import lru_cache
-from typing import Dict, List
+from threading import Lock
+from typing import Dict, List, Tuple
 
 from basebert import BaseBert
 from herberror import Herberror
 from common.chatformat import mono, italic, bold, link_to, ensure_markup_clean
 from common.constants import GITHUB_REF, SEP_LINE, HERBERT_TITLE
-from common.herbert_utils import getmethods, is_own_method, is_cmd_decorated
+from common.prerendered import prerendered, prerender
+from common.reply_data import Text
 from decorators import command, aliases, doc
+from manifest import BertEntry
 import core
 # import inspect
 
@@ -24,6 +26,8 @@ import core
 __all__ = ['HelpBert']
 
 detailed_help: Dict[str, str] = dict()
+# make_help_str fills detailed_help
+_help_lock = Lock()
 
 
 class HelpBert(BaseBert):
@@ -33,7 +37,7 @@ class HelpBert(BaseBert):
     """
 
     @aliases('h')
-    @command(pass_string=True)
+    @command(pass_string=True, cost='cheap')
     @doc("""
         Return a formatted list of all available commands, their arguments and their descriptions.
 
@@ -46,38 +50,47 @@ class HelpBert(BaseBert):
         """)
     def help(self, string: str):
         string = string.strip()
+        overview, details = help_texts()
         if string == '':
-            self.send_message(make_help_str(), disable_web_page_preview=True)
+            self.send(overview)
 
+        elif string in details:
+            self.send(details[string])
         else:
-            # ensure detailed help has been generated
-            make_help_str()
+            raise Herberror(f'No further help available for \'{string}\'.')
 
-            if string in detailed_help:
-                self.send_message(detailed_help[string])
-            else:
-                raise Herberror(f'No further help available for \'{string}\'.')
-
-    @command(pass_args=False)
+    @command(pass_args=False, cost='cheap')
     @doc(""" Print some meta-information """)
     def about(self):
-        self.send_message(helpify_docstring(f"""
-        I am a server running an instance of Herbert.
-        Herbert is, much to your surprise, a telegram bot.
+        self.send(prerendered.text(ABOUT))
+
+
+def help_texts() -> Tuple[Text, Dict[str, Text]]:
+    """
+    the rendered help overview, and the detailed help by command name
+    and alias, built once for the registered berts
+    """
+    return prerendered.get('help', _render_help)
+
 
-        It is written in Python and C++, using a custom command dispatcher built on top of the \
-        {link_to("http://www.python-telegram-bot.org", name="python-telegram-bot")} framework.
+def _render_help() -> Tuple[Text, Dict[str, Text]]:
+    with _help_lock:
+        detailed_help.clear()
+        overview = prerender(make_help_str(), disable_web_page_preview=True)
 
-        To find out what it can do, use /help
-        To find out how it works, check out the code on {GITHUB_REF}
-        """))
+        # aliases share their command's help
+        rendered: Dict[str, Text] = dict()
+        for string in detailed_help.values():
+            if string not in rendered:
+                rendered[string] = prerender(string)
+
+        return overview, {name: rendered[string] for name, string in detailed_help.items()}
 
 
-@lru_cache(maxsize=1)
 def make_help_str():
     res = HELP_HEADER
-    for bert in core.berts:
-        res += make_bert_str(bert)
+    for entry in core.bert_docs:
+        res += make_bert_str(entry)
     res += HELP_FOOTER
 
     return res
@@ -112,28 +125,21 @@ def helpify_docstring(string: str):
 
 
 # this is bodgy, please fix (but without destroying it).
-def make_bert_str(bert: BaseBert):
+def make_bert_str(entry: BertEntry):
     """
-    Generate the formatted message part for help on the given bert
+    Generate the formatted message part for help on the given bert,
+    using its manifest entry (which only lists its own commands,
+    so inherited ones are not listed again for this class)
     """
-    _check_for_(bert.__class__.__name__)
+    _check_for_(entry.cls)
 
-    def provides_help(member):
-        """ returns true if the given member function is a command with a nonempty help string """
-        _, method = member  # first arg is member name, not needed here
-        return is_cmd_decorated(method) and method.cmdinfo.properties.register_help
-    help_fns = [*filter(provides_help, getmethods(bert))]
+    help_cmds = [cmd for cmd in entry.commands if cmd.register_help]
 
-    if len(help_fns) == 0:
+    if len(help_cmds) == 0:
         return ''
 
-    res = f"{bold(bert.__class__.__name__)}:\n"
-    for _, method in help_fns:
-        # if we just inherited this method, dont list it again for this class
-        if not is_own_method(method, bert):
-            continue
-
-        inf = method.cmdinfo.properties
+    res = f"{bold(entry.cls)}:\n"
+    for inf in help_cmds:
 
         name, *cmd_aliases = inf.aliases
         ensure_markup_clean(''.join(inf.aliases))
@@ -176,3 +182,14 @@ You just have to ask them by their name:
 
 HELP_FOOTER = f"""{SEP_LINE}
 report bugs and view source on {GITHUB_REF}"""
+
+ABOUT = helpify_docstring(f"""
+I am a server running an instance of Herbert.
+Herbert is, much to your surprise, a telegram bot.
+
+It is written in Python and C++, using a custom command dispatcher built on top of the \
+{link_to("http://www.python-telegram-bot.org", name="python-telegram-bot")} framework.
+
+To find out what it can do, use /help
+To find out how it works, check out the code on {GITHUB_REF}
+""")
@@ -20,13 +20,15 @@ from common.hercurles_utils import search_for
 from common.chat import make_keyboard, \
     make_callback, get_photo, make_tx_callback
 
-from common.reply_data import Text, File
+from common.reply_data import Text, File, InlineContext
 
 # EXPOSE MEMBERS
 __all__ = ['Hercurles']
 
 
 ARG_COUNT_ERR = "This takes exactly 1 argument. Please try again."
+# seconds fetching a page may take, over all redirects
+FETCH_DEADLINE = 10
 
 
 def _t_get_text(url: str):
@@ -73,22 +75,28 @@ def _t_search_for_first(query):
 
 class Hercurles(BaseBert):
     @aliases('gt')
-    @command(pass_string=True)
+    @command(pass_string=True, deadline=FETCH_DEADLINE)
     @doc(""" Retrieve the contents of the given url as text or a text file """)
     def gettext(self, string):
         # _t_get_text(self.bot, self.update, string.strip())
         self.send(_t_get_text(string.strip()))
 
     @aliases('g', 'getme', 'curl')
-    @command(pass_string=True)
+    @command(pass_string=True, deadline=FETCH_DEADLINE)
     @doc(""" Retrieve the contents of the given url """)
     def get(self, string):
         # _t_get(self.bot, self.update, string.strip())
         self.send(_t_get(string.strip()))
 
-    @command(pass_string=True)
+    @command(pass_string=True, allow_inline=True, inline_cache_time=3600)
     @doc(""" List the first few links the given string hits when searched for on DuckDuckGo """)
     def searchfor(self, string):
+        if isinstance(self.context, InlineContext):
+            # one result per link, telegram pages through them
+            for link in search_for(string.strip()):
+                self.send(Text(link, []))
+            return
+
         # _t_search_for(self.bot, self.update, string)
         self.send(_t_search_for(string.strip()))
 
@@ -24,7 +24,7 @@ except Exception:
 
 class InterpRert(BaseBert):
     @aliases('bf')
-    @command(pass_args=False, pass_string=True, allow_inline=True)
+    @command(pass_args=False, pass_string=True, allow_inline=True, cost='cpu')
     @doc(
         f"""
         Interpret the message as brainfuck-code
@@ -12,7 +12,7 @@ from ext.sly import Lexer, Parser
 from decorators import aliases, command, doc
 from basebert import ImageBaseBert
 from herberror import Herberror, BadHerberror
-from common.network import load_content, load_str, get_url_safe_string
+from common.network import load_content, load_str_async, get_url_safe_string
 from common.argparser import Args
 from common import chatformat
 from common.reply_data import Gif
@@ -518,7 +518,7 @@ class MathParser(Parser):
 
 class KalcBert(ImageBaseBert):
     @aliases('wttr')
-    @command(allow_inline=True, pass_string=True)
+    @command(allow_inline=True, pass_string=True, coalesce=True)
     @doc(
         """
         Take a look at the weather all over the world (asciistyle)
@@ -533,7 +533,7 @@ class KalcBert(ImageBaseBert):
         e.g: m§/wttr [info=1] New York§
         """
     )
-    def weather(self, string):
+    async def weather(self, string):
         argvals, string = Args.parse(string, {
             'info': Args.T.INT,
         })
@@ -542,12 +542,12 @@ class KalcBert(ImageBaseBert):
         info = ('x' if info > 1 else 'q') if info > 0 else 'Q'
 
         string = string or 'Greifswald'
-        wttr_string = load_str(
+        wttr_string = await load_str_async(
             f'wttr.in/{get_url_safe_string(string)}?T&M&0&{info}', fake_ua=False)
         if '=======' in wttr_string:  # good enough
             raise Herberror('No place with that name was found')
 
-        self.reply_text(chatformat.mono(wttr_string))
+        await self.asend_message(chatformat.mono(wttr_string))
 
     @aliases('wa', 'wolframalpha')
     @command(pass_string=True)
@@ -584,7 +584,7 @@ class KalcBert(ImageBaseBert):
             self.send(Gif(url=url, caption=string))
 
     # new part
-    @command(pass_string=True, allow_inline=True)
+    @command(pass_string=True, allow_inline=True, executor='process', cost='cpu', deadline=5)
     @doc(
         """
         Evaluate a simple mathematical expression and return the result
@@ -627,7 +627,7 @@ class KalcBert(ImageBaseBert):
             self.reply_text(chatformat.mono(res_str))
 
     @aliases('polit', 'pltc')
-    @command(pass_string=True)
+    @command(pass_string=True, coalesce=True)
     @doc(
         f"""
         Take a quick look at german polls
@@ -705,7 +705,7 @@ class KalcBert(ImageBaseBert):
             output = chatformat.mono(output)
             self.reply_text(output)
 
-    @command(pass_args=False, register_help=False, allow_inline=True)
+    @command(pass_args=False, register_help=False, allow_inline=True, cost='cheap')
     def rng(self):
         """
         chosen by fair dice roll
@@ -15,22 +15,22 @@ from basebert import BaseBert
 class PingBert(BaseBert):
     """ bert - allow pinging """
 
-    @command(pass_args=False)
+    @command(pass_args=False, cost='cheap')
     @doc(""" Pong. """)
     def ping(self):
         self.send_message('pong')
 
-    @command(pass_string=True, allow_inline=True)
+    @command(pass_string=True, allow_inline=True, cost='cheap')
     @doc(""" Whatever you say. """)
     def echo(self, string):
         self.reply_text(string)
 
-    @command(pass_args=False, register_help=False)
+    @command(pass_args=False, register_help=False, cost='cheap')
     @doc(""" Easter Egg """)
     def pong(self):
         self.send_message('So you think you\'re clever, huh?')
 
-    @command(pass_args=False)
+    @command(pass_args=False, cost='cheap')
     @doc(""" prints the current time and date """)
     def time(self):
         self.send_message(str(datetime.datetime.now()))
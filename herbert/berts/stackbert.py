@@ -9,7 +9,7 @@ class StackBert(BaseBert):
         super().__init__()
         self._stack = []
 
-    @command(pass_string=True)
+    @command(pass_string=True, cost='cheap')
     @doc(""" Pushes given topic on conversation stack """)
     def push(self, topic):
         if not topic:
@@ -21,7 +21,7 @@ class StackBert(BaseBert):
         self._stack.append(topic)
         self.send_message(f'Pushed `{topic:.15}` on the stack.', parse_mode=STYLE_MD)
 
-    @command(pass_args=False)
+    @command(pass_args=False, cost='cheap')
     @doc(""" Displays current conversation stack """)
     def stack(self):
         if not self._stack:
@@ -34,7 +34,7 @@ class StackBert(BaseBert):
 
         self.send_message(msg, parse_mode=STYLE_MD)
 
-    @command(pass_args=False)
+    @command(pass_args=False, cost='cheap')
     @doc(""" Removes top element of the stack, and displays the next topic below """)
     def pop(self):
         if not self._stack:
@@ -37,42 +37,42 @@ class TestBert(BaseBert):
     """
 
     @aliases('dbg_e')
-    @command(register_help=False, pass_string=True)
+    @command(register_help=False, pass_string=True, cost='cheap')
     def debug_error(self, string):
         """ create a herberror with the given message """
         require(self)
         raise Herberror(string)
 
     @aliases('dbg_be')
-    @command(register_help=False, pass_string=True)
+    @command(register_help=False, pass_string=True, cost='cheap')
     def debug_bad_error(self, string: str):
         """ create a fatal herberror with the given message """
         require(self)
         raise BadHerberror(string)
 
     @aliases('dbg_ue')
-    @command(register_help=False, pass_string=True)
+    @command(register_help=False, pass_string=True, cost='cheap')
     def debug_unexpected_error(self, string: str):
         """ create a non-herberror exception """
         require(self)
         raise ValueError(string)
 
     @aliases('dbg_md')
-    @command(register_help=False, pass_string=True)
+    @command(register_help=False, pass_string=True, cost='cheap')
     def dbg_print_formatted(self, string: str):
         """ output all markdown variants """
         self.reply_text(chatformat.bold(string) + chatformat.italic(string) + chatformat.mono(string) + string,
                         parse_mode=chatformat.get_parse_mode())
 
     @aliases('dbg_r')
-    @command(register_help=False, pass_string=True)
+    @command(register_help=False, pass_string=True, cost='cheap')
     def dbg_render_md(self, string: str):
         """ parse backend format escapes """
         self.reply_text(render_style_para(string), caption='abc',
                         parse_mode=chatformat.STYLE_BACKEND)
 
     @aliases('dbg_mdx')
-    @command(register_help=False, pass_args=True)
+    @command(register_help=False, pass_args=True, cost='cheap')
     def dbg_markdown_xcode(self, args):
         """
         parse the given string with a parse mode specified in
@@ -82,7 +82,7 @@ class TestBert(BaseBert):
             return
         self.reply_text("".join(args[1:]), parse_mode=args[0])
 
-    @command(register_help=False, pass_string=True)
+    @command(register_help=False, pass_string=True, cost='cheap')
     def dbg_parse(self, string: str):
         """
         Parse markup tags in the input and return both
@@ -158,8 +158,7 @@ def test():
         run the command handler, return the result
         """
         fake_bot = FakeBot()
-        handler, *_ = cmd.cmdinfo.handlers(cmd)
-        real_fn = handler.callback
+        real_fn = cmd.cmdinfo.invoke(cmd)
         fake_update = FakeUpdate(' '.join(['.', *args]))
         ctx = FakeContext(bot=fake_bot, args=args)
 
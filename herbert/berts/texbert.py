@@ -12,18 +12,47 @@ provided commands:
     - idtex
     - iatex
 """
+import hashlib
 import logging
-from subprocess import run
+import os
+import re
+import subprocess
+from functools import lru_cache
+from io import BytesIO
+from typing import Optional, Tuple
 
 from PIL import Image, ImageOps
 
 from basebert import ImageBaseBert
+from berts.warmtex import TEXIT, warm_tex
 from herberror import Herberror, BadHerberror
 from common import chatformat
 from common.argparser import Args
 from common.constants import SEP_LINE
+from common.deadline import run_process
+from common.disk_cache import DiskCache
 from common.telegram_limits import IMG_MAX_ASPECT
 from decorators import command, aliases, doc
+from executors import run_in_process
+
+# seconds a single rendering may take, including the postprocessing
+TEX_DEADLINE = 30
+
+# rendered images and compile results, shared by all processes rendering tex
+TEX_CACHE_DIR = 'cache/tex'
+TEX_CACHE_BYTES = 256 * 1024 * 1024
+TEX_CACHE_TTL = 30 * 24 * 3600
+tex_cache = DiskCache(TEX_CACHE_DIR, TEX_CACHE_BYTES, TEX_CACHE_TTL)
+# marks a cached compile result as failed, followed by latex' complaint
+COMPILE_FAILED = b'!'
+
+# the preambles of pre_levels are precompiled into formats here
+TEX_FORMAT_DIR = 'cache/texfmt'
+USE_TEX_FORMATS = True
+# keep pdflatex started with those formats loaded, see berts.warmtex
+WARM_TEX = True
+# stands in for the source when taking a template apart
+_SOURCE = '\0'
 
 # format breaks here because e.g. {{amsfonts}} gets transformed to {amsfonts} and then the
 # real substiture will throw a KeyError
@@ -86,13 +115,158 @@ def validate(string):
         raise Herberror('Empty Inputs are bad.')
 
 
+def split_template(pre_level: int) -> Tuple[str, str, str]:
+    """
+    The template of pre_level as (preamble, text before the source, text after it),
+    where the preamble is everything up to \\begin{document} (if it has a documentclass)
+    """
+    head, tail = pre_levels[pre_level].format(_SOURCE).split(_SOURCE)
+    if '\\documentclass' not in head:
+        return '', head, tail
+
+    begin = head.find('\\begin{document}')
+    split = len(head) if begin < 0 else begin
+    return head[:split], head[split:], tail
+
+
+@lru_cache(maxsize=1)
+def tex_version() -> str:
+    """ formats only work with the tex that built them """
+    try:
+        return subprocess.run(('pdflatex', '--version'), capture_output=True, encoding='utf8', check=False).stdout
+    except FileNotFoundError:
+        return ''
+
+
+@lru_cache(maxsize=None)
+def template_key(pre_level: int) -> str:
+    """
+    Identifies what pre_level renders with in the tex cache: its template
+    and the tex version, so that editing pre_levels or updating tex
+    does not serve renders of the old ones
+    """
+    return hashlib.sha1('\0'.join((tex_version(),) + split_template(pre_level)).encode('utf8')).hexdigest()
+
+
+def tex_format(preamble: str) -> Optional[Tuple[str, str]]:
+    """
+    (directory, name) of the format precompiled from preamble, for ext/texit.zsh,
+    which builds it when it is first used. The name depends on the preamble and
+    the tex version, so changing either means building a new one.
+    """
+    preamble = preamble.strip()
+    if not preamble:
+        return None
+
+    name = 'herbert-' + hashlib.sha1((tex_version() + preamble).encode('utf8')).hexdigest()[:16]
+    directory = os.path.abspath(TEX_FORMAT_DIR)
+    path = os.path.join(directory, f'{name}.tex')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        with open(f'{path}.{os.getpid()}', 'w') as fobj:
+            fobj.write(f'{preamble}\n\\dump\n')
+        os.replace(f'{path}.{os.getpid()}', path)
+
+    return directory, name
+
+
+def texit_command(pre_level: int, source: str, target_pixel_width: int,
+                  use_format: bool = USE_TEX_FORMATS) -> Tuple[Tuple[str, ...], str]:
+    """ the arguments of ext/texit.zsh and its input, to render source on pre_level """
+    preamble, head, tail = split_template(pre_level)
+    args = (TEXIT, f'{target_pixel_width:d}')
+
+    tex_fmt = tex_format(preamble) if use_format else None
+    if tex_fmt is None:
+        return args, preamble + head + source + tail
+
+    return args + tex_fmt, head + source + tail
+
+
+def normalize(string):
+    """
+    Drop whitespace tex ignores anyway (at the end of lines and of
+    the input), so that it does not make otherwise equal sources differ
+    """
+    return re.sub(r'[ \t]+$', '', string.replace('\r\n', '\n'), flags=re.MULTILINE).strip()
+
+
+def postprocess(png: bytes, invert: bool) -> bytes:
+    """
+    Pad the rendered image to an aspect ratio telegram
+    accepts, optionally invert it, and return it as png data
+    """
+    img: Image.Image = Image.open(BytesIO(png))
+    too_wide = img.width / img.height > IMG_MAX_ASPECT
+    if not too_wide and not invert:
+        # already fine, no need to encode it again
+        return png
+
+    if too_wide:
+        buf = Image.new(mode='RGB', size=(img.width, int(img.width / IMG_MAX_ASPECT + 1)),
+                        color=(255, 255, 255))
+        buf.paste(img)
+        img = buf
+
+    if invert:
+        img = ImageOps.invert(img.convert(mode='RGB'))
+
+    return ImageBaseBert.pil_image_to_fp(img, 'PNG').getvalue()
+
+
+def render(pre_level: int, source: str, target_pixel_width: int, invert: bool,
+           warm: bool = WARM_TEX) -> Tuple[bytes, Optional[bytes]]:
+    """
+    Compile source in a worker of the tex pool and return the
+    compile result (b'' or COMPILE_FAILED and the log) and
+    the image as png data, if it compiled. Failing without
+    a log raises, so that the failure is not cached.
+
+    texit.zsh renders in a directory of its own and writes the
+    png to stdout, so concurrent renders never see each others files.
+    With warm, a pdflatex waiting with the format loaded stands in
+    for texit.zsh once the format was built
+    """
+    try:
+        args, document = texit_command(pre_level, source, target_pixel_width)
+        result = warm_tex.run(args, document.encode('utf8')) if warm else None
+        if result is None:
+            result = run_process(args, input=document.encode('utf8'))
+    except FileNotFoundError as err:
+        raise BadHerberror('`texit.zsh` is broken 😢') from err
+    exit_val = result.returncode
+
+    if exit_val == 2:
+        logging.getLogger('herbert.RUNTIME').warning('Couldn\'t cleanup working directory.')
+    elif exit_val == 3:
+        raise Herberror('Your \'tex produces output I literally can\'t comprehend.')
+    elif exit_val == 4:
+        if not result.stdout.strip():
+            # no complaint in the log, latex was killed (e.g. out of memory) and may well compile it next time
+            raise Herberror('LaTeX gave up without saying why, try again later.')
+        return COMPILE_FAILED + result.stdout, None
+    elif exit_val != 0:
+        raise BadHerberror('Error. That was unexpected.')
+
+    # exit_val is 0 or 2, stdout _should_ be the png at this point
+    return b'', postprocess(result.stdout, invert)
+
+
+def _raise_compile_error(compiled: bytes):
+    """ report the compile result of the cache, if it is a failure """
+    if compiled.startswith(COMPILE_FAILED):
+        log = compiled[len(COMPILE_FAILED):].decode('utf8')
+        raise Herberror(f'Lern ma LaTeX 🙄\n{SEP_LINE}\n'
+                        f'[{chatformat.bold("LATEX")}] {chatformat.mono(log)}')
+
+
 class TexBert(ImageBaseBert):
     """
     Bert for rendering latex code
     See `TexBert.texraw`
     """
 
-    @command(pass_string=True)
+    @command(pass_string=True, cost='cpu', deadline=TEX_DEADLINE)
     @doc(
         f"""
         Render LaTeX
@@ -138,57 +312,44 @@ class TexBert(ImageBaseBert):
         validate(string)
 
         pre_level = pre_level or argvals.get('pre') or 0
-        template = pre_levels[pre_level]
-
-        string = template.format(string)
+        source = normalize(string)
 
         target_pixel_width = argvals.get('res') or 1000
         if target_pixel_width > 5000:
             raise Herberror('Dude wtf are you doing?')
 
-        try:
-            result = run(
-                ('./ext/texit.zsh', f'{target_pixel_width:d}'),
-                input=string,
-                encoding='utf8',
-                capture_output=True,
-                check=False
-            )
-            exit_val = result.returncode
-
-            if exit_val == 2:
-                logging.getLogger('herbert.RUNTIME').warning('Couldn\'t cleanup working directory.')
-            elif exit_val == 3:
-                raise Herberror('Your \'tex produces output I literally can\'t comprehend.')
-            elif exit_val == 4:
-                raise Herberror(f'Lern ma LaTeX 🙄\n{SEP_LINE}\n'
-                                f'[{chatformat.bold("LATEX")}] {chatformat.mono(result.stdout)}')
-            elif exit_val != 0:
-                raise BadHerberror('Error. That was unexpected.')
-
-            # exit_val is 0 or 2, main.png _should_ exist at this point
-            image_path = result.stdout.strip()
-            img = Image.open(image_path)
-
-            if img.width / img.height > IMG_MAX_ASPECT:
-                buf = Image.new(mode='RGB', size=(img.width, int(img.width / IMG_MAX_ASPECT + 1)),
-                                color=(255, 255, 255))
-                buf.paste(img)
-                img = buf
-
-            if invert or argvals.get('inv'):
-                img = ImageOps.invert(img.convert(mode='RGB'))
-
-            arg_send = argvals.get('send') or 'img'
-            if arg_send in ('file', 'both'):
-                self.send_pil_image(img, full=True)
-            if arg_send in ('img', 'both'):
-                self.send_pil_image(img)
-
-        except FileNotFoundError as err:
-            raise BadHerberror('`texit.zsh` is broken 😢') from err
-
-    @command(pass_string=True)
+        invert = bool(invert or argvals.get('inv'))
+        arg_send = argvals.get('send') or 'img'
+
+        compile_key = ('compile', template_key(pre_level), source)
+        png_key = ('png', template_key(pre_level), source, target_pixel_width, invert)
+
+        png = tex_cache.get(png_key)
+        if png is None:
+            # known not to compile, or compiling is all that is asked for
+            compiled = tex_cache.get(compile_key)
+            if compiled is not None:
+                _raise_compile_error(compiled)
+                if arg_send == 'validate':
+                    return
+
+            png = self._render(pre_level, source, target_pixel_width, invert, compile_key)
+            tex_cache.put(png_key, png)
+
+        if arg_send in ('file', 'both'):
+            self.send_png(png, full=True)
+        if arg_send in ('img', 'both'):
+            self.send_png(png)
+
+    @staticmethod
+    def _render(pre_level, source, target_pixel_width, invert, compile_key):
+        """ compile source and return the image as png data, remembering whether it compiled """
+        compiled, png = run_in_process(render, pre_level, source, target_pixel_width, invert, pool='tex')
+        tex_cache.put(compile_key, compiled)
+        _raise_compile_error(compiled)
+        return png
+
+    @command(pass_string=True, cost='cpu', deadline=TEX_DEADLINE)
     @doc(
         """
         Render LaTeX. Implies a minimal preamble.
@@ -202,7 +363,7 @@ class TexBert(ImageBaseBert):
         self.texraw(string, invert=invert, pre_level=3)
 
     @aliases('dtex')
-    @command(pass_string=True)
+    @command(pass_string=True, cost='cpu', deadline=TEX_DEADLINE)
     @doc(
         """
         Render LaTeX in math-mode. Implies an environment for typesetting math.
@@ -217,7 +378,7 @@ class TexBert(ImageBaseBert):
         self.texraw(string, invert=invert, pre_level=4)
 
     @aliases('atex')
-    @command(pass_string=True)
+    @command(pass_string=True, cost='cpu', deadline=TEX_DEADLINE)
     @doc(
         """
         Render LaTeX in aligned math-mode. Implies an environment for typesetting math.
@@ -231,7 +392,7 @@ class TexBert(ImageBaseBert):
         self.texraw(string, invert=invert, pre_level=5)
 
     @aliases('itex')
-    @command(pass_string=True)
+    @command(pass_string=True, cost='cpu', deadline=TEX_DEADLINE)
     @doc(
         """
         Render LaTeX like /tex, but invert the colors.
@@ -245,7 +406,7 @@ class TexBert(ImageBaseBert):
         self.tex(string, invert=True)
 
     @aliases('idtex')
-    @command(pass_string=True)
+    @command(pass_string=True, cost='cpu', deadline=TEX_DEADLINE)
     @doc(
         """
         Render LaTeX like /displaytex, but invert the colors.
@@ -259,7 +420,7 @@ class TexBert(ImageBaseBert):
         self.displaytex(string, invert=True)
 
     @aliases('iatex')
-    @command(pass_string=True)
+    @command(pass_string=True, cost='cpu', deadline=TEX_DEADLINE)
     @doc(
         """
         Render LaTeX like /aligntex, but invert the colors
@@ -1,4 +1,5 @@
 from pathlib import Path
+from threading import Lock
 
 from common import chatformat
 from common.chatformat import STYLE_MD
@@ -8,6 +9,8 @@ from herberror import Herberror, BadHerberror
 
 todo_file = Path('todo.txt')
 todo_file.touch(exist_ok=True)
+# the cheap lane runs several commands at once, edits read and rewrite the whole file
+todo_lock = Lock()
 
 MARKDOWNEXTRA = 2
 MAXLENGTHKEY = 6
@@ -16,7 +19,7 @@ COLON = ': '
 
 class TodoBert(BaseBert):
     @aliases('td')
-    @command(pass_args=False)
+    @command(pass_args=False, cost='cheap')
     @doc(
         """
         Return a list of open requests
@@ -31,7 +34,7 @@ class TodoBert(BaseBert):
     )
     def todo(self):
         try:
-            with todo_file.open() as fobj:
+            with todo_lock, todo_file.open() as fobj:
                 self.send_message('`        Stuff to do:`\n' +
                                   fobj.read(), parse_mode=STYLE_MD)
         except Exception as err:
@@ -39,7 +42,7 @@ class TodoBert(BaseBert):
             raise BadHerberror('todo.txt not found') from err
 
     @aliases('+todo', 'td+')
-    @command
+    @command(cost='cheap')
     @doc(
         """
         Add an request to the list
@@ -55,7 +58,7 @@ class TodoBert(BaseBert):
     def addtodo(self, args):
         try:
             todo_file.open('r+')  # to catch not found
-            with todo_file.open('a') as fobj:
+            with todo_lock, todo_file.open('a') as fobj:
                 key = f'{args[0]:>{MAXLENGTHKEY}.{MAXLENGTHKEY}}'
                 door = ' '.join(args[1:])  # wohoo format strings
                 if '_' in key or '_' in door or '*' in key or '*' in door:
@@ -69,7 +72,7 @@ class TodoBert(BaseBert):
             raise BadHerberror('todo.txt not found') from err
 
     @aliases('-todo', 'td-')
-    @command
+    @command(cost='cheap')
     @doc(
         """
         Remove a request from the list
@@ -83,7 +86,7 @@ class TodoBert(BaseBert):
     )
     def removetodo(self, args):
         try:
-            with todo_file.open('r+') as fobj:
+            with todo_lock, todo_file.open('r+') as fobj:
                 lines = fobj.readlines()
                 fobj.seek(0)
                 edited = False
@@ -103,7 +106,7 @@ class TodoBert(BaseBert):
             raise BadHerberror('todo.txt not found') from err
 
     @aliases('%todo', 'td%')
-    @command
+    @command(cost='cheap')
     @doc(
         """
         Edit a request in the list
@@ -117,7 +120,7 @@ class TodoBert(BaseBert):
     )
     def edittodo(self, args):
         try:
-            with todo_file.open('r+') as fobj:
+            with todo_lock, todo_file.open('r+') as fobj:
                 lines = fobj.readlines()
                 fobj.seek(0)
                 edited = False
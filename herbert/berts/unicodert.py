@@ -21,7 +21,7 @@ def _retranslate_char(c: str):
 class UniCoDert(BaseBert):
 
     @aliases('flag', 'flg')
-    @command(pass_string=True, allow_inline=True)
+    @command(pass_string=True, allow_inline=True, cost='cheap')
     @doc(
         """
         Make unicode flags from country names
@@ -44,7 +44,7 @@ class UniCoDert(BaseBert):
 
         self.reply_text(res)
 
-    @command(pass_string=True, register_help=False)
+    @command(pass_string=True, register_help=False, cost='cheap')
     def reverseflg(self, string: str):
         string = string.strip()
         res = ''
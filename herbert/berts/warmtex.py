@@ -0,0 +1,249 @@
+"""
+Keep pdflatex warm between tex renders
+
+Starting zsh and pdflatex and loading a format takes most of the
+time of rendering a small formula. WarmTex keeps one pdflatex per
+format started ahead of time, each in a working directory of its
+own, with the format loaded and blocked on opening a named pipe as
+its input. A render writes the document into the pipe, waits for
+the pdf and converts it with pdftoppm. Every engine renders a
+single document, the next one is started once it is done.
+
+Every worker of the tex process pool has its own WarmTex, which is
+how the engines stay bounded by the pool. An engine is checked
+before it is used and replaced if it died or is about to time out,
+crashed workers are replaced by the pool. The working directories
+of a worker are in one directory named after its pid, which the
+next WarmTex removes if the worker was killed before cleaning up.
+"""
+import errno
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+from contextlib import suppress
+from multiprocessing.util import Finalize
+from threading import Lock
+from typing import Dict, Optional, Sequence, Tuple
+
+from common import deadline
+
+__all__ = ['TEXIT', 'WarmTex', 'compile_error', 'warm_tex']
+
+TEXIT = './ext/texit.zsh'
+# an engine exits on its own after this many seconds, so that
+# engines of crashed workers do not wait for a document forever
+ENGINE_LIFETIME = 600
+# engines this close to their end are not used anymore
+ENGINE_RESERVE = 60
+# the working directories of each process are in ENGINE_ROOT/ENGINE_PREFIX<pid>
+ENGINE_ROOT = tempfile.gettempdir()
+ENGINE_PREFIX = 'herbert-tex-'
+
+
+def engine_command(format_name: str) -> Tuple[str, ...]:
+    """ pdflatex with format_name loaded, compiling job.tex to main.pdf """
+    return ('timeout', str(ENGINE_LIFETIME), 'pdflatex', f'-fmt={format_name}', '-interaction=nonstopmode',
+            '-halt-on-error', '-jobname=main', '\\input{job.tex}')
+
+
+def pdftoppm_command(target_pixel_width: str) -> Tuple[str, ...]:
+    """ convert main.pdf to main.png, like texit.zsh does """
+    return ('pdftoppm', '-scale-to-x', target_pixel_width, '-scale-to-y', '-1', '-singlefile', '-q', '-png',
+            'main.pdf', 'main')
+
+
+def compile_error(log: str) -> str:
+    """
+    latex' complaint in main.log, as texit.zsh extracts it: the
+    paragraph of the first error, from its last '! ' on
+    """
+    paragraph: list = []
+    for line in log.splitlines() + ['']:
+        if line.strip() and 'Here is how much' not in line:
+            paragraph.append(line)
+            continue
+
+        text = '\n'.join(paragraph)
+        if '\n! ' in f'\n{text}':
+            return text.rsplit('! ', 1)[1] + '\n'
+        paragraph = [line]
+    return ''
+
+
+def _remove_stale_directories() -> None:
+    """ remove the working directories of processes that are gone """
+    with suppress(FileNotFoundError), os.scandir(ENGINE_ROOT) as entries:
+        for entry in entries:
+            pid = entry.name[len(ENGINE_PREFIX):]
+            if not entry.name.startswith(ENGINE_PREFIX) or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            except PermissionError:
+                # alive, but not ours
+                pass
+
+
+class _Engine:
+    """ a pdflatex waiting for its document in a directory of its own """
+
+    def __init__(self, parent: str, format_dir: str, format_name: str):
+        self.directory = tempfile.mkdtemp(dir=parent)
+        self.fifo = os.path.join(self.directory, 'job.tex')
+        os.mkfifo(self.fifo)
+        self.started = time.monotonic()
+        self.proc = subprocess.Popen(engine_command(format_name), cwd=self.directory,
+                                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                     env=dict(os.environ, TEXFORMATS=f'{format_dir}:'), start_new_session=True)
+
+    def healthy(self) -> bool:
+        """ still waiting for a document, with enough time left to compile it """
+        return self.proc.poll() is None and time.monotonic() - self.started < ENGINE_LIFETIME - ENGINE_RESERVE
+
+    def _open_input(self) -> Optional[int]:
+        """ the writing end of the pipe, None if pdflatex exited before opening it """
+        while True:
+            try:
+                return os.open(self.fifo, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as err:
+                # nobody is reading yet, pdflatex is still loading the format
+                if err.errno != errno.ENXIO:
+                    raise
+            if self.proc.poll() is not None:
+                return None
+            deadline.check()
+            time.sleep(0.005)
+
+    def render(self, args: Sequence[str], document: bytes, target_pixel_width: str
+               ) -> Optional[subprocess.CompletedProcess]:
+        """
+        compile document and return the result texit.zsh would have,
+        None if pdflatex died before reading the document
+        """
+        handle = self._open_input()
+        if handle is None:
+            return None
+        os.set_blocking(handle, True)
+        # pdflatex gives up reading on errors, its exit status tells
+        with suppress(BrokenPipeError), os.fdopen(handle, 'wb') as pipe:
+            pipe.write(document)
+
+        try:
+            self.proc.wait(deadline.remaining())
+        except subprocess.TimeoutExpired as err:
+            raise deadline.exceeded() from err
+
+        if self.proc.returncode != 0:
+            try:
+                with open(os.path.join(self.directory, 'main.log'), encoding='utf8', errors='replace') as fobj:
+                    log = compile_error(fobj.read())
+            except FileNotFoundError:
+                log = ''
+            return subprocess.CompletedProcess(args, 4, log.encode('utf8'), b'')
+
+        converted = deadline.run_process(pdftoppm_command(target_pixel_width), cwd=self.directory)
+        if converted.returncode != 0:
+            return subprocess.CompletedProcess(args, 3, b'', b'')
+        with open(os.path.join(self.directory, 'main.png'), 'rb') as fobj:
+            return subprocess.CompletedProcess(args, 0, fobj.read(), b'')
+
+    def close(self) -> None:
+        """ stop pdflatex, if it still runs, and remove the working directory """
+        if self.proc.poll() is None:
+            with suppress(ProcessLookupError):
+                os.killpg(self.proc.pid, signal.SIGKILL)
+        self.proc.wait()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class WarmTex:
+    """ one warm engine per format, replacing texit.zsh where the format was built already """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._engines: Dict[Tuple[str, str], _Engine] = dict()
+        self._directory: Optional[str] = None
+        self._finalizer: Optional[Finalize] = None
+
+        self.renders = 0
+        self.restarts = 0
+
+    def _parent(self) -> str:
+        """ the directory of this process' engines, created on first use """
+        with self._lock:
+            if self._directory is None:
+                _remove_stale_directories()
+                self._directory = os.path.join(ENGINE_ROOT, f'{ENGINE_PREFIX}{os.getpid()}')
+                os.makedirs(self._directory, exist_ok=True)
+            if self._finalizer is None:
+                # worker processes exit without running atexit
+                self._finalizer = Finalize(self, self.close, exitpriority=10)
+            return self._directory
+
+    def _take(self, key: Tuple[str, str]) -> _Engine:
+        """ the waiting engine for key, if it is healthy, a new one otherwise """
+        parent = self._parent()
+        with self._lock:
+            engine = self._engines.pop(key, None)
+        if engine is not None and not engine.healthy():
+            logging.getLogger('herbert.RUNTIME').info('Warm pdflatex for %s exited, restarting', key[1])
+            engine.close()
+            self.restarts += 1
+            engine = None
+        return engine or _Engine(parent, *key)
+
+    def _warm_up(self, key: Tuple[str, str]) -> None:
+        """ start the engine for the next render with key """
+        engine = _Engine(self._parent(), *key)
+        with self._lock:
+            old, self._engines[key] = self._engines.get(key), engine
+        if old is not None:
+            old.close()
+
+    def run(self, args: Sequence[str], document: bytes) -> Optional[subprocess.CompletedProcess]:
+        """
+        Run the ext/texit.zsh command args on document with a warm engine.
+        Returns None if args do not use a format or it was not built
+        yet, texit.zsh needs to run then (and builds the format).
+        """
+        if len(args) != 4 or args[0] != TEXIT:
+            return None
+        _, target_pixel_width, format_dir, format_name = args
+        if not os.path.exists(os.path.join(format_dir, f'{format_name}.fmt')):
+            return None
+
+        key = (format_dir, format_name)
+        result = None
+        # an engine may still die between the check and the render, once
+        for _ in range(2):
+            engine = self._take(key)
+            try:
+                result = engine.render(args, document, target_pixel_width)
+            finally:
+                engine.close()
+            if result is not None:
+                break
+            self.restarts += 1
+
+        self._warm_up(key)
+        self.renders += 1
+        return result
+
+    def close(self) -> None:
+        """ stop all waiting engines and remove their directories """
+        with self._lock:
+            engines, self._engines = list(self._engines.values()), dict()
+            directory, self._directory = self._directory, None
+        for engine in engines:
+            engine.close()
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+warm_tex = WarmTex()
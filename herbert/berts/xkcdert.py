@@ -12,6 +12,7 @@ import json.decoder
 from basebert import BaseBert
 from herberror import Herberror
 from common import hercurles_utils
+from common.reply_data import PhotoUrl
 from decorators import command, doc
 import common.chatformat as cf
 
@@ -21,7 +22,7 @@ class XKCDert(BaseBert):
     Wraps the xkcd command
     """
 
-    @command(pass_string=True, allow_inline=True)
+    @command(pass_string=True, allow_inline=True, coalesce=True, inline_cache_time=3600)
     @doc(
         f"""
         Retrieve a comic from www.xkcd.com, referenced by number or search query
@@ -31,11 +32,11 @@ class XKCDert(BaseBert):
         {cf.link_to('http://www.duckduckgo.com/', name='DuckDuckGo')}, the first viable result will be returned.
         """
     )
-    def xkcd(self, string):
+    async def xkcd(self, string):
         num = None
 
-        def search():
-            results = hercurles_utils.search_for('xkcd ' + string)
+        async def search():
+            results = await hercurles_utils.search_for_async('xkcd ' + string)
             for res in results:
                 match = re.match(r'.*xkcd\.com/(\d+)', res)
                 if match:
@@ -46,15 +47,15 @@ class XKCDert(BaseBert):
         try:
             num = int(float(string))
         except ValueError as err:
-            num = search()
+            num = await search()
 
         url = f'www.xkcd.com/{num}/info.0.json'
         try:
-            info_json = hercurles_utils.load_json(url)
-            self.reply_photo_url(
-                info_json.get('img'),
-                caption=f"{num}: {info_json.get('title')}\n\n{info_json.get('alt')}"
-            )
+            info_json = await hercurles_utils.load_json_async(url)
+            await self.asend(PhotoUrl(
+                f"{num}: {info_json.get('title')}\n\n{info_json.get('alt')}",
+                info_json.get('img')
+            ))
 
         except json.decoder.JSONDecodeError as err:
             raise Herberror("That didn't work out, sorry.") from err
@@ -40,27 +40,36 @@ def get_output_mode(style=STYLE):
     return style
 
 
+# STYLE_BACKEND -> STYLE_HTML, after escaping. the tokens can not overlap, and
+# a few str.replace passes outrun a single regex scan calling back per token
+_BACKEND_HTML = (
+    ('!§![i', '<i>'),
+    ('!§!]i', '</i>'),
+    ('!§![c', '<code>'),
+    ('!§!]c', '</code>'),
+    ('!§![b', '<b>'),
+    ('!§!]b', '</b>'),
+    ('!§![a', '<a href="'),
+    ('!§!|A', '">'),
+    ('!§!]a', '</a>')
+)
+# STYLE_BACKEND markup as entities: opening (with the url of links) or closing tags
+_BACKEND_TOKEN = re.compile(r'!§!(?:\[([icb])|\[a(.*?)!§!\|A|\]([icba]))', re.DOTALL)
+_BACKEND_TAGS = {'i': 'i', 'c': 'code', 'b': 'b', 'a': 'a'}
+# STYLE_PARA and STYLE_MD can not nest, each match is a complete span
+_PARA_SPAN = re.compile(r'([mbi])§([^§]*)§')
+_MARKDOWN_SPAN = re.compile(r'`([^`]*)`|_([^_]*)_|\*([^*]*)\*')
+
+
 def render_style_backend(string, target_style=STYLE_HTML):
     """ transform STYLE_BACKEND to target_style """
     if target_style == STYLE_BACKEND:
         return string
 
     assert target_style == STYLE_HTML, "Markdown rendering is not supported yet"
-    substitutions = {
-        '!§![i': '<i>',
-        '!§!]i': '</i>',
-        '!§![c': '<code>',
-        '!§!]c': '</code>',
-        '!§![b': '<b>',
-        '!§!]b': '</b>',
-        '!§![a': '<a href="',
-        '!§!|A': '">',
-        '!§!]a': '</a>'
-    }
-
     string = escape_string(string, style=target_style)
 
-    for key, val in substitutions.items():
+    for key, val in _BACKEND_HTML:
         string = string.replace(key, val)
 
     return string
@@ -68,24 +77,15 @@ def render_style_backend(string, target_style=STYLE_HTML):
 
 def render_style_para(string, target_style=STYLE_HTML):
     """ transform STYLE_PARA to target_style """
-    def replace(match):
-        text = match.group(1)
-        match_type = text[0]
-        match_content = text[2:]
-        return dict(m=mono, i=italic, b=bold).get(match_type)(match_content, style=target_style)
-
-    string = re.sub(r'([mbi]§[^§]*)§', replace, string)
-
-    return string
+    spans = dict(m=mono, i=italic, b=bold)
+    return _PARA_SPAN.sub(lambda match: spans[match.group(1)](match.group(2), style=target_style), string)
 
 
 def render_style_markdown(string, target_style=STYLE_HTML):
     """ transform STYLE_MD to target_style """
-    string = re.sub(r'`([^`]*)`', lambda m: mono(m.group(1), style=target_style), string)
-    string = re.sub(r'_([^_]*)_', lambda m: italic(m.group(1), style=target_style), string)
-    string = re.sub(r'\*([^*]*)\*', lambda m: bold(m.group(1), style=target_style), string)
-
-    return string
+    spans = (mono, italic, bold)
+    return _MARKDOWN_SPAN.sub(lambda match: spans[match.lastindex - 1](match.group(match.lastindex), style=target_style),
+                              string)
 
 
 def render_style_html(string, target_style=STYLE_HTML):
@@ -134,79 +134,143 @@ def escape_string(string, style=STYLE):
     return string
 
 
-def parse_entities(string, style=STYLE) -> Tuple[str, List[MessageEntity]]:
-    """ convert in-string markup into message entities """
-    if style is None:
-        return string, []
-    text, output_mode = render(string, style)
-
-    if output_mode != STYLE_HTML:
-        raise BadHerberror(f"Invalid output format {output_mode}, cannot parse entities")
+_ENTITY_TYPES = {
+    'a': MessageEntity.URL,
+    'i': MessageEntity.ITALIC,
+    'b': MessageEntity.BOLD,
+    'code': MessageEntity.CODE
+}
 
-    type_map = {
-        'a': MessageEntity.URL,
-        'i': MessageEntity.ITALIC,
-        'b': MessageEntity.BOLD,
-        'code': MessageEntity.CODE
-    }
 
-    class Parser(HTMLParser):
-        """ handles the html tags in a message """
-        def __init__(self):
-            super().__init__()
-            self.output = ''
-            self.entities = []
-            self.entity_stacks = dict()
-
-        @property
-        def output_pos(self):
-            """
-            return number of processed utf-16 code units
-            """
-            return utf16len(self.output)
-
-        def handle_starttag(self, tag, attrs):
-            if tag not in self.entity_stacks:
-                self.entity_stacks[tag] = list()
-
-            self.entity_stacks[tag].append(
-                {
-                    'start': self.output_pos,
-                    'type': tag,
-                    'attrs': dict(attrs)
-                }
-            )
-
-        def handle_endtag(self, tag):
-            if (tag not in self.entity_stacks or
-                    len(self.entity_stacks[tag]) == 0):
-                raise BadHerberror("Invalid markup generated: Illegal closing tag.")
-
-            data = self.entity_stacks[tag].pop()
-
-            if data['type'] not in type_map:
-                raise BadHerberror("Invalid markup generated: Illegal tag type.")
-
-            entity_type = type_map[data['type']]
-            start = data['start']
+class _EntityBuilder:
+    """
+    collects the text and entities of a message
 
-            entity = MessageEntity(entity_type, start, self.output_pos - start)
+    the output is collected in chunks, and its length in
+    utf-16 code units is counted along, so every tag costs
+    the same no matter how much text came before it
+    """
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.output_pos = 0
+        self.entities = []
+        self.entity_stacks = dict()
+
+    @property
+    def output(self):
+        """ the text without markup """
+        return ''.join(self.chunks)
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in self.entity_stacks:
+            self.entity_stacks[tag] = list()
+
+        self.entity_stacks[tag].append(
+            {
+                'start': self.output_pos,
+                'type': tag,
+                'attrs': dict(attrs)
+            }
+        )
+
+    def handle_endtag(self, tag):
+        if (tag not in self.entity_stacks or
+                len(self.entity_stacks[tag]) == 0):
+            raise BadHerberror("Invalid markup generated: Illegal closing tag.")
+
+        data = self.entity_stacks[tag].pop()
+
+        if data['type'] not in _ENTITY_TYPES:
+            raise BadHerberror("Invalid markup generated: Illegal tag type.")
+
+        entity_type = _ENTITY_TYPES[data['type']]
+        start = data['start']
+
+        entity = MessageEntity(entity_type, start, self.output_pos - start)
+
+        if entity_type == MessageEntity.URL:
+            if 'href' in data['attrs']:
+                entity.url = data['attrs']['href']
+
+        self.entities.append(entity)
+
+    def handle_data(self, data):
+        if data:
+            self.chunks.append(data)
+            self.output_pos += utf16len(data)
+
+
+class _EntityParser(_EntityBuilder, HTMLParser):
+    """ handles the html tags in a message """
+
+    def error(self, message):
+        raise BadHerberror("Invalid markup generated")
+
+
+def _scan_html(string):
+    parser = _EntityParser()
+    parser.feed(string)
+    parser.close()
+    return parser
+
+
+def _scan_backend(string):
+    builder = _EntityBuilder()
+    pos = 0
+    for match in _BACKEND_TOKEN.finditer(string):
+        builder.handle_data(string[pos:match.start()])
+        opening, url, closing = match.groups()
+        if closing:
+            builder.handle_endtag(_BACKEND_TAGS[closing])
+        elif opening:
+            builder.handle_starttag(_BACKEND_TAGS[opening], [])
+        else:
+            builder.handle_starttag('a', [('href', url)])
+        pos = match.end()
+    builder.handle_data(string[pos:])
+    return builder
+
+
+def _scan_spans(pattern, tags):
+    def scan(string):
+        builder = _EntityBuilder()
+        pos = 0
+        for match in pattern.finditer(string):
+            builder.handle_data(string[pos:match.start()])
+            tag, content = tags(match)
+            builder.handle_starttag(tag, [])
+            builder.handle_data(content)
+            builder.handle_endtag(tag)
+            pos = match.end()
+        builder.handle_data(string[pos:])
+        return builder
+    return scan
+
+
+_ENTITY_SCANNERS = {
+    STYLE_HTML: _scan_html,
+    STYLE_BACKEND: _scan_backend,
+    STYLE_PARA: _scan_spans(_PARA_SPAN, lambda match: (dict(m='code', i='i', b='b')[match.group(1)], match.group(2))),
+    STYLE_MD: _scan_spans(_MARKDOWN_SPAN, lambda match: (('code', 'i', 'b')[match.lastindex - 1], match.group(match.lastindex))),
+}
 
-            if entity_type == MessageEntity.URL:
-                if 'href' in data['attrs']:
-                    entity.url = data['attrs']['href']
 
-            self.entities.append(entity)
+def parse_entities(string, style=STYLE) -> Tuple[str, List[MessageEntity]]:
+    """
+    convert in-string markup into message entities
 
-        def handle_data(self, data):
-            self.output += data
+    markup other than html is turned into entities in
+    a single scan, without rendering it to html first
+    """
+    if style is None:
+        return string, []
 
-        def error(self, message):
-            raise BadHerberror("Invalid markup generated")
+    if style not in _ENTITY_SCANNERS:
+        raise BadHerberror(f"Invalid style {style}, cannot parse entities")
 
-    parser = Parser()
-    parser.feed(text)
-    return parser.output, parser.entities
+    builder = _ENTITY_SCANNERS[style](string)
+    return builder.output, builder.entities
 
 
 def link_to(url, name=None, style=STYLE):
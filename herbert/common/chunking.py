@@ -0,0 +1,87 @@
+"""
+Split long texts into telegram sized chunks
+
+Telegram measures messages and entity offsets in utf-16
+code units, so the text is encoded once and walked in those
+units. Each chunk ends at the last newline (or else space)
+in the second half of the window, and never between the
+two halves of a surrogate pair. Entities are visited in
+order of their offset, those crossing a boundary are split
+into one part per chunk.
+"""
+from copy import copy
+from operator import attrgetter
+from typing import Iterator, List, Tuple
+
+from telegram import MessageEntity
+
+from common.telegram_limits import MSG_CHUNK
+
+__all__ = ['chunk_text']
+
+_SEPARATORS = ('\n'.encode('utf-16le'), ' '.encode('utf-16le'))
+
+
+def _rfind_unit(data: bytes, unit: bytes, start: int, end: int) -> int:
+    """ index of the last code unit in [start, end) equal to unit, -1 if there is none """
+    found = data.rfind(unit, 2 * start, 2 * end)
+    while found > 0 and found % 2:
+        # matched across two code units
+        found = data.rfind(unit, 2 * start, found + 1)
+    return found // 2 if found >= 0 else -1
+
+
+def _is_high_surrogate(data: bytes, index: int) -> bool:
+    return 0xD8 <= data[2 * index + 1] <= 0xDB
+
+
+def _chunk_end(data: bytes, pos: int, size: int, limit: int) -> int:
+    end = pos + limit
+    if end >= size:
+        return size
+
+    for separator in _SEPARATORS:
+        found = _rfind_unit(data, separator, pos + limit // 2, end)
+        if found >= 0:
+            return found + 1
+
+    if _is_high_surrogate(data, end - 1):
+        end -= 1
+    return end
+
+
+def chunk_text(msg: str, entities: List[MessageEntity],
+               limit: int = MSG_CHUNK) -> Iterator[Tuple[str, List[MessageEntity]]]:
+    """
+    Yield (text, entities) of at most limit utf-16 code units each,
+    with the entity offsets relative to the chunk
+    """
+    data = msg.encode('utf-16le')
+    size = len(data) // 2
+
+    pending = sorted(entities, key=attrgetter('offset'))
+    index = 0
+    active: List[MessageEntity] = []
+    pos = 0
+
+    while pos < size:
+        end = _chunk_end(data, pos, size, limit)
+
+        while index < len(pending) and (pending[index].offset < end or end == size):
+            active.append(pending[index])
+            index += 1
+
+        parts = []
+        for entity in active:
+            start = max(entity.offset, pos)
+            stop = min(entity.offset + entity.length, end)
+            if stop > start or (stop == start and entity.length == 0):
+                part = copy(entity)
+                part.offset = start - pos
+                part.length = stop - start
+                parts.append(part)
+
+        yield data[2 * pos:2 * end].decode('utf-16le'), parts
+
+        active = [entity for entity in active if entity.offset + entity.length > end]
+        pos = end
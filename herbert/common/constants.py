@@ -8,6 +8,8 @@ GITHUB_REF = chatformat.link_to(GITHUB_URL, name="GitHub")
 SEP_LINE = '———————————'
 
 ERROR_FAILED = 'Oops, something went wrong! 😱'
+ERROR_BUSY = 'Too much going on right now, please try again in a bit. 😵'
+ERROR_DEADLINE = 'That took too long (more than {:.3g}s), I gave up. ⏱'
 ERROR_PREFIX = '💥'
 BAD_ERROR_SUFFIX = f"""
 {SEP_LINE}
@@ -0,0 +1,98 @@
+"""
+Time bounds for command invocations
+
+A command declared with @command(deadline=seconds) runs
+inside deadline_scope(seconds). Everything below it that
+may block for long asks how much time is left:
+- run_process kills the whole process group of a subprocess
+- ProcessPool.run stops waiting, drops the job if it did not
+  start yet and interrupts the worker otherwise
+- network requests shorten their timeouts
+Plain python code on a lane thread can not be interrupted,
+long loops should call check() every now and then.
+
+Exceeding the deadline raises DeadlineExceeded, a Herberror,
+so the user gets the same timeout message for every command.
+"""
+import os
+import signal
+import subprocess
+import time
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from typing import Iterator, Optional, Tuple
+
+from common.constants import ERROR_DEADLINE
+from herberror import Herberror
+
+__all__ = ['DeadlineExceeded', 'deadline_scope', 'remaining', 'timeout', 'check', 'exceeded', 'run_process']
+
+# (expires at (time.monotonic), seconds the scope was given)
+_deadline: ContextVar[Optional[Tuple[float, float]]] = ContextVar('herbert_deadline', default=None)
+
+
+class DeadlineExceeded(Herberror):
+    """ the invocation ran out of time """
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """ bound the with-block to `seconds`, an enclosing scope that ends earlier still applies """
+    if seconds is None:
+        yield
+        return
+
+    expires = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(outer if outer is not None and outer[0] < expires else (expires, seconds))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """ seconds left in the current scope (at least 0), None without a deadline """
+    current = _deadline.get()
+    return None if current is None else max(0.0, current[0] - time.monotonic())
+
+
+def timeout(default: Optional[float]) -> Optional[float]:
+    """ the smaller of default and the time left """
+    left = remaining()
+    if left is None or default is None:
+        return default if left is None else left
+    return min(default, left)
+
+
+def exceeded() -> DeadlineExceeded:
+    """ the error to raise when the current deadline passed """
+    current = _deadline.get()
+    return DeadlineExceeded(ERROR_DEADLINE.format(current[1] if current is not None else 0))
+
+
+def check() -> None:
+    """ raise DeadlineExceeded if the current deadline passed """
+    if remaining() == 0:
+        raise exceeded()
+
+
+def run_process(args, input=None, **kwargs) -> subprocess.CompletedProcess:  # pylint: disable = redefined-builtin
+    """
+    subprocess.run, bounded by the current deadline.
+    The process gets its own process group, so everything
+    it spawned is killed along with it
+    """
+    check()
+    with subprocess.Popen(args, stdin=subprocess.PIPE if input is not None else None,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          start_new_session=True, **kwargs) as proc:
+        try:
+            stdout, stderr = proc.communicate(input, timeout=remaining())
+        except subprocess.TimeoutExpired as err:
+            with suppress(ProcessLookupError):
+                os.killpg(proc.pid, signal.SIGKILL)
+            proc.communicate()
+            raise exceeded() from err
+
+    return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
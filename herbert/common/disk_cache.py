@@ -0,0 +1,145 @@
+"""
+A size capped cache of byte strings in a directory
+
+Entries are files named by the hash of their key, sharded
+into subdirectories by its first two hex digits. They are
+written to a temporary file and renamed into place, so
+readers (in any process) see either nothing or a complete
+entry. The modification time of a file is when it was
+written (for the ttl), its access time is set on every
+hit (for evicting the least recently used entries once
+the directory grows beyond max_bytes).
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from contextlib import suppress
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+__all__ = ['DiskCache']
+
+# evict down to this fraction of max_bytes, so that not every write triggers a scan
+LOW_WATER = 0.9
+
+
+class DiskCache:
+    """ bytes by key in directory, at most max_bytes of them, each for at most ttl seconds """
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = Lock()
+        # bytes written since the directory was last scanned, None if never scanned
+        self._written: Optional[int] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: Hashable) -> str:
+        digest = hashlib.sha256(repr(key).encode('utf8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """ the bytes stored for key, unless they are missing or expired """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fobj:
+                written = os.fstat(fobj.fileno()).st_mtime
+                data = fobj.read() if written + self.ttl >= time.time() else None
+            if data is not None:
+                os.utime(path, (time.time(), written))
+        except FileNotFoundError:
+            data = None
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def put(self, key: Hashable, data: bytes) -> None:
+        """ store data for key, evicting old entries if the directory is full """
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handle, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        except OSError as err:
+            logging.getLogger('herbert.CACHE').warning('Could not write to %s: %s', self.directory, err)
+            return
+
+        stored = False
+        try:
+            with os.fdopen(handle, 'wb') as fobj:
+                fobj.write(data)
+            os.replace(temp, path)
+            stored = True
+        except OSError as err:
+            logging.getLogger('herbert.CACHE').warning('Could not write to %s: %s', self.directory, err)
+        finally:
+            if not stored:
+                with suppress(OSError):
+                    os.remove(temp)
+
+        if not stored:
+            return
+
+        with self._lock:
+            written = self._written
+            scan = written is None or written + len(data) > self.max_bytes * (1 - LOW_WATER)
+            self._written = 0 if written is None or scan else written + len(data)
+        if scan:
+            self.evict()
+
+    def _entries(self) -> List[Tuple[float, float, int, str]]:
+        """ (last used, written, size, path) of all entries """
+        entries = []
+        with suppress(FileNotFoundError), os.scandir(self.directory) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.name.startswith('.tmp'):
+                            continue
+                        with suppress(FileNotFoundError):
+                            stat = entry.stat()
+                            entries.append((stat.st_atime, stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> None:
+        """ remove expired entries, then the least recently used ones while above max_bytes """
+        now = time.time()
+        entries = []
+        for entry in self._entries():
+            if entry[1] + self.ttl < now:
+                with suppress(FileNotFoundError):
+                    os.remove(entry[3])
+            else:
+                entries.append(entry)
+
+        total = sum(size for _, _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, _, size, path in entries:
+            if total <= self.max_bytes * LOW_WATER:
+                break
+            # another process may have removed it already
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """ hits and misses of this process """
+        return {
+            'directory': self.directory,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
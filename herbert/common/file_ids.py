@@ -0,0 +1,171 @@
+"""
+Remember the file_id of uploaded media by content
+
+Rendering the same formula or rule again produces the same
+png, which would be uploaded in full every time. Telegram
+returns a file_id for every uploaded photo and document,
+which can be sent instead of the data. The file_ids are
+kept by a hash of the content (and the kind of upload, as
+photo file_ids can not be sent as documents and vice versa)
+in a bounded LRU, which is persisted as json a few seconds
+after it changed (and on exit), batching the uploads until then.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from io import BytesIO
+from threading import Lock, Timer
+from typing import Any, Dict, Optional, Tuple
+
+__all__ = ['FileIdCache', 'file_ids', 'content_key']
+
+MAX_ENTRIES = 4096
+# seconds between a change and saving it
+SAVE_DELAY = 10.0
+
+
+def _content(data: Any) -> Optional[bytes]:
+    """ the bytes that would be uploaded for data, None if unknown """
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+
+    if isinstance(data, BytesIO):
+        return data.getvalue()
+
+    if hasattr(data, 'read') and hasattr(data, 'seek'):
+        start = data.tell()
+        content = data.read()
+        data.seek(start)
+        return content if isinstance(content, bytes) else None
+
+    if isinstance(data, str) and os.path.isfile(data):
+        with open(data, 'rb') as fobj:
+            return fobj.read()
+
+    return None
+
+
+def content_key(kind: str, data: Any, name: Optional[str] = None) -> Optional[Tuple[str, int]]:
+    """ (key, size) of an upload of data as kind ('photo', 'document'), None if it can not be cached """
+    content = _content(data)
+    if content is None:
+        return None
+
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    return f'{kind}:{name or ""}:{digest}', len(content)
+
+
+class FileIdCache:
+    """ LRU of file_id by content key, saved to path (if any) SAVE_DELAY seconds after it changed """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = Lock()
+        self._save_lock = Lock()
+        self._save_timer: Optional[Timer] = None
+        self._dirty = False
+        self._exit_hook = False
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def load(self, path: Optional[str]) -> None:
+        """ persist to path from now on, starting with what it contains """
+        with self._lock:
+            self.path = path
+            if path is not None and not self._exit_hook:
+                atexit.register(self.save)
+                self._exit_hook = True
+            if path is None or not os.path.exists(path):
+                return
+
+            try:
+                with open(path, 'r') as fobj:
+                    entries = json.load(fobj)
+            except (OSError, ValueError) as err:
+                logging.getLogger('herbert.FILE_IDS').warning('Could not read %s: %s', path, err)
+                return
+
+            # least recently used first
+            self._entries = OrderedDict((key, file_id) for key, file_id in entries[-self.max_entries:])
+
+    def get(self, key: str) -> Optional[str]:
+        """ the file_id of the content, if it was uploaded before """
+        with self._lock:
+            file_id = self._entries.get(key)
+            if file_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return file_id
+
+    def reused(self, size: int) -> None:
+        """ a file_id was sent instead of size bytes """
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += size
+
+    def put(self, key: str, file_id: str) -> None:
+        """ remember the file_id telegram returned for an upload """
+        with self._lock:
+            self._entries[key] = file_id
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._changed()
+
+    def forget(self, key: str) -> None:
+        """ drop a file_id telegram did not accept anymore """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._changed()
+
+    def _changed(self) -> None:
+        """ schedule saving, unless it already is (called with _lock held) """
+        self._dirty = True
+        if self.path is None or self._save_timer is not None:
+            return
+        self._save_timer = Timer(SAVE_DELAY, self.save)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def save(self) -> None:
+        """ write the changes to path now, e.g. before exiting """
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if self.path is None or not self._dirty:
+                return
+            path, entries, self._dirty = self.path, list(self._entries.items()), False
+
+        # writing happens outside of _lock, so that sending does not wait for the disk
+        with self._save_lock:
+            temp = f'{path}.tmp'
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                with open(temp, 'w') as fobj:
+                    json.dump(entries, fobj)
+                os.replace(temp, path)
+            except OSError as err:
+                logging.getLogger('herbert.FILE_IDS').warning('Could not write %s: %s', path, err)
+
+    def stats(self) -> Dict[str, Any]:
+        """ current state """
+        return {
+            'entries': len(self._entries),
+            'limit': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'bytes saved': self.bytes_saved,
+        }
+
+
+file_ids = FileIdCache()
@@ -17,7 +17,7 @@ from herberror import Herberror
 
 PARSER = etree.XMLParser(recover=True)
 
-__all__ = ['load_json', 'load_xml', 'search_for']
+__all__ = ['load_json', 'load_xml', 'search_for', 'load_json_async', 'load_xml_async', 'search_for_async']
 
 
 def parse_xml(xml_string: str):
@@ -41,6 +41,12 @@ def load_json(url: str, **kwargs):
     return json.loads(res)
 
 
+async def load_json_async(url: str, **kwargs):
+    """ coroutine version of load_json """
+    res = (await network.load_async(url, **kwargs)).data
+    return json.loads(res)
+
+
 def load_xml(url: str, **kwargs):
     """
     Load the content of the given url and try to
@@ -49,34 +55,53 @@ def load_xml(url: str, **kwargs):
     return parse_xml(network.load_str(url, **kwargs))
 
 
+async def load_xml_async(url: str, **kwargs):
+    """ coroutine version of load_xml """
+    return parse_xml(await network.load_str_async(url, **kwargs))
+
+
 SPACES = r"\s+"
 PLUS = r"+"
 AD = r"^https://duckduckgo\.com/y\.js\?ad_provider.*$"
 
 
+def _search_url(query: str) -> str:
+    return f"https://duckduckgo.com/html/?q={quote(re.sub(SPACES, PLUS, query))}"
+
+
+def _search_results(root):
+    find_urls = etree.XPath(
+        ".//div[re:test(@class, 'web-result', 'i')]//a[@class='result__a']",
+        namespaces=dict(re='http://exslt.org/regular-expressions')
+    )
+
+    elements = find_urls(root)
+
+    urls = (elem.attrib["href"] for elem in elements)
+
+    # remove ads from url list
+    return list(filter(lambda url: re.match(AD, url), urls))
+
+
 def search_for(query: str):
     """
     Look up the given search term on duckduckgo and return
     a list of the results from the first page
     """
-    url = f"https://duckduckgo.com/html/?q={quote(re.sub(SPACES, PLUS, query))}"
-
     try:
-        root = load_xml(url)
+        return _search_results(load_xml(_search_url(query)))
 
-        elements = root.findall(".//a[@class='result__snippet']")
-
-        find_urls = etree.XPath(
-            ".//div[re:test(@class, 'web-result', 'i')]//a[@class='result__a']",
-            namespaces=dict(re='http://exslt.org/regular-expressions')
-        )
+    except etree.ParseError as err:
+        raise Herberror("Searching failed. Unexpected result structure.") from err
 
-        elements = find_urls(root)
+    except NetworkError as err:
+        raise Herberror("Searching failed because of network problems.") from err
 
-        urls = (elem.attrib["href"] for elem in elements)
 
-        # remove ads from url list
-        return list(filter(lambda url: re.match(AD, url), urls))
+async def search_for_async(query: str):
+    """ coroutine version of search_for """
+    try:
+        return _search_results(await load_xml_async(_search_url(query)))
 
     except etree.ParseError as err:
         raise Herberror("Searching failed. Unexpected result structure.") from err
@@ -0,0 +1,66 @@
+"""
+Remember the replies to inline queries
+
+The same popular inline query (@herbert xkcd 927) is typed
+by many users; the replies of an inline command are kept in
+a bounded LRU, keyed by command and normalized query, for
+as long as the command allows telegram to cache them.
+Later pages of long result lists (next_offset) are served
+from here as well, instead of running the command again.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from common.reply_data import ReplyData
+
+__all__ = ['InlineResultCache', 'inline_results', 'PAGE_TTL']
+
+MAX_ENTRIES = 1024
+# how long the pages of a result list stay available, even if it may not be cached
+PAGE_TTL = 120
+
+
+class InlineResultCache:
+    """ LRU of (expiry, replies) by key """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Tuple[float, List[ReplyData]]]' = OrderedDict()
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[List[ReplyData]]:
+        """ the replies stored for key, if they did not expire yet """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, replies: List[ReplyData], seconds: float) -> None:
+        """ store the replies for key, evicting the least recently used entry if full """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + seconds, replies)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """ current state """
+        return {
+            'entries': len(self._entries),
+            'limit': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+inline_results = InlineResultCache()
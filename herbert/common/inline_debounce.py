@@ -0,0 +1,155 @@
+"""
+Debounce inline queries per user
+
+telegram sends an inline query on almost every keystroke,
+and only the answer to the newest one is ever shown. Each
+query is held back for `delay` seconds; if the same user
+typed on in the meantime, it is dropped without running.
+A query that was already started is cancelled once a newer
+one arrives, if its handler is a coroutine; plain functions
+can not be interrupted and run to completion.
+"""
+import asyncio
+import heapq
+import inspect
+import time
+from functools import wraps
+from threading import Condition, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+__all__ = ['InlineDebouncer']
+
+
+class InlineDebouncer:
+    """
+    submit(user, start) calls start(ticket) after the delay,
+    unless a newer query of user arrived. start should run
+    the handler wrapped by guard(user, ticket, handler), and
+    return False if it could not be admitted to run at all
+    """
+
+    def __init__(self, delay: float = 0.25):
+        self.delay = delay
+
+        self._cond = Condition()
+        self._thread: Optional[Thread] = None
+        self._seq = 0
+        # newest ticket of each user with a query held back or running
+        self._latest: Dict[int, int] = dict()
+        # running coroutines: user -> (ticket, task, loop)
+        self._running: Dict[int, Tuple[int, asyncio.Task, asyncio.AbstractEventLoop]] = dict()
+        # held back queries: (due, ticket, user, start)
+        self._held: List[Tuple[float, int, int, Callable[[int], Any]]] = []
+
+        self.received = 0
+        self.executed = 0
+        self.dropped = 0
+        self.cancelled = 0
+
+    def submit(self, user: int, start: Callable[[int], Any]) -> None:
+        """ a new query of user, which supersedes all earlier ones """
+        with self._cond:
+            self._seq += 1
+            ticket = self._seq
+            self.received += 1
+            self._latest[user] = ticket
+
+            running = self._running.pop(user, None)
+            if running is not None:
+                _, task, loop = running
+                self.cancelled += 1
+                loop.call_soon_threadsafe(task.cancel)
+
+            if self.delay > 0:
+                if self._thread is None:
+                    self._thread = Thread(target=self._work, name='herbert-inline-debounce', daemon=True)
+                    self._thread.start()
+                heapq.heappush(self._held, (time.monotonic() + self.delay, ticket, user, start))
+                self._cond.notify()
+                return
+
+        self._start(user, ticket, start)
+
+    def is_current(self, user: int, ticket: int) -> bool:
+        """ whether ticket is the newest query of user """
+        with self._cond:
+            return self._latest.get(user) == ticket
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._held or self._held[0][0] > time.monotonic():
+                    self._cond.wait(self._held[0][0] - time.monotonic() if self._held else None)
+
+                _, ticket, user, start = heapq.heappop(self._held)
+                if self._latest.get(user) != ticket:
+                    self.dropped += 1
+                    continue
+
+            self._start(user, ticket, start)
+
+    def _start(self, user: int, ticket: int, start: Callable[[int], Any]) -> None:
+        if start(ticket) is False:
+            # rejected (the lane is full), the guard never runs to clean up
+            self._done(user, ticket)
+
+    def _started(self, user: int, ticket: int) -> bool:
+        with self._cond:
+            if self._latest.get(user) != ticket:
+                # superseded while it waited for a lane
+                self.dropped += 1
+                return False
+            self.executed += 1
+            return True
+
+    def _done(self, user: int, ticket: int) -> None:
+        with self._cond:
+            if self._latest.get(user) == ticket:
+                del self._latest[user]
+            running = self._running.get(user)
+            if running is not None and running[0] == ticket:
+                del self._running[user]
+
+    def guard(self, user: int, ticket: int, handler: Callable) -> Callable:
+        """ wrap a ptb callback, such that it does not run (or is cancelled) once superseded """
+        if inspect.iscoroutinefunction(handler):
+            @wraps(handler)
+            async def run_async(*args, **kwargs):
+                if not self._started(user, ticket):
+                    return None
+
+                with self._cond:
+                    if self._latest.get(user) == ticket:
+                        self._running[user] = (ticket, asyncio.current_task(), asyncio.get_running_loop())
+                try:
+                    return await handler(*args, **kwargs)
+                except asyncio.CancelledError:
+                    if self.is_current(user, ticket):
+                        raise
+                    return None
+                finally:
+                    self._done(user, ticket)
+
+            return run_async
+
+        @wraps(handler)
+        def run(*args, **kwargs):
+            if not self._started(user, ticket):
+                return None
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                self._done(user, ticket)
+
+        return run
+
+    def stats(self) -> Dict[str, Any]:
+        """ current state, dropped and cancelled are the executions saved """
+        return {
+            'delay': self.delay,
+            'received': self.received,
+            'executed': self.executed,
+            'dropped': self.dropped,
+            'cancelled': self.cancelled,
+            'held': len(self._held),
+        }
@@ -0,0 +1,264 @@
+"""
+Small, fixed-memory measurement primitives
+used to observe the runtime behaviour of herbert
+"""
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Event, Lock, Thread
+from typing import Dict, Iterator, List, Optional, Tuple
+
+__all__ = ['Histogram', 'CommandMetrics', 'commands', 'measure_invocation', 'measure_send', 'record_error',
+           'collect_errors', 'prometheus_text', 'PrometheusWriter']
+
+
+class Histogram:
+    """
+    Latency histogram with logarithmically spaced buckets.
+
+    Memory usage does not grow with the number of observations,
+    percentiles are approximated by the upper bound of the
+    bucket they fall into (i.e. with a relative error of at
+    most 2**(1/buckets_per_doubling) - 1)
+    """
+
+    def __init__(self, lowest: float = 1e-4, highest: float = 300.0, buckets_per_doubling: int = 4):
+        self.bounds: List[float] = []
+        bound = lowest
+        while bound < highest:
+            self.bounds.append(bound)
+            bound *= 2 ** (1 / buckets_per_doubling)
+        self.bounds.append(highest)
+
+        self._lock = Lock()
+        # one additional bucket for everything above `highest`
+        self._counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, value: float) -> None:
+        """ record a single measurement """
+        idx = bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self.count += 1
+            self.total += value
+            self.maximum = max(self.maximum, value)
+
+    def percentile(self, fraction: float) -> float:
+        """ return an upper bound for the given percentile (0 < fraction <= 1) """
+        with self._lock:
+            counts = list(self._counts)
+            count, maximum = self.count, self.maximum
+
+        if count == 0:
+            return 0.0
+
+        rank = fraction * count
+        seen = 0
+        for idx, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.bounds[idx], maximum) if idx < len(self.bounds) else maximum
+
+        return maximum
+
+    def mean(self) -> float:
+        """ arithmetic mean of all observations """
+        return self.total / self.count if self.count else 0.0
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """ return (upper bound, number of observations <= bound) pairs """
+        with self._lock:
+            counts = list(self._counts)
+
+        res = []
+        seen = 0
+        for bound, bucket_count in zip(self.bounds, counts):
+            seen += bucket_count
+            res.append((bound, seen))
+
+        return res
+
+    def summary(self) -> str:
+        """ one-line human readable description """
+        return (f'n={self.count} p50={self.percentile(.5) * 1000:.1f}ms '
+                f'p95={self.percentile(.95) * 1000:.1f}ms p99={self.percentile(.99) * 1000:.1f}ms '
+                f'max={self.maximum * 1000:.1f}ms')
+
+
+class CommandMetrics:
+    """ counters and latencies of a single command """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = Lock()
+        self.invocations = 0
+        self.herberrors = 0
+        self.failures = 0
+        self.deadline_exceeded = 0
+        self.handler_time = Histogram()
+        self.send_time = Histogram()
+
+    def record(self, invocation: '_Invocation', total: float) -> None:
+        """ add a finished invocation """
+        with self._lock:
+            self.invocations += 1
+            self.herberrors += invocation.herberror
+            self.failures += invocation.failure
+            self.deadline_exceeded += invocation.deadline_exceeded
+
+        self.handler_time.observe(max(0.0, total - invocation.send_time))
+        self.send_time.observe(invocation.send_time)
+
+
+class _Invocation:
+    __slots__ = ('send_time', 'herberror', 'failure', 'deadline_exceeded')
+
+    def __init__(self):
+        self.send_time = 0.0
+        self.herberror = False
+        self.failure = False
+        self.deadline_exceeded = False
+
+
+commands: Dict[str, CommandMetrics] = dict()
+_commands_lock = Lock()
+_invocation: ContextVar[Optional[_Invocation]] = ContextVar('herbert_invocation', default=None)
+# see collect_errors
+_errors: ContextVar[Optional[List[Tuple[bool, bool]]]] = ContextVar('herbert_errors', default=None)
+
+
+def _metrics_of(name: str) -> CommandMetrics:
+    metrics = commands.get(name)
+    if metrics is None:
+        with _commands_lock:
+            metrics = commands.setdefault(name, CommandMetrics(name))
+    return metrics
+
+
+@contextmanager
+def measure_invocation(name: str) -> Iterator[None]:
+    """ record the invocation of command `name` running inside the with-block """
+    invocation = _Invocation()
+    token = _invocation.set(invocation)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        invocation.failure = True
+        raise
+    finally:
+        _invocation.reset(token)
+        _metrics_of(name).record(invocation, time.perf_counter() - started)
+
+
+@contextmanager
+def measure_send() -> Iterator[None]:
+    """ count the with-block as send time of the current invocation """
+    invocation = _invocation.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if invocation is not None:
+            invocation.send_time += time.perf_counter() - started
+
+
+def record_error(expected: bool, deadline_exceeded: bool = False) -> None:
+    """ mark the current invocation as failed with a Herberror (expected) or something else """
+    invocation = _invocation.get()
+    if invocation is not None:
+        invocation.deadline_exceeded |= deadline_exceeded
+        if expected:
+            invocation.herberror = True
+        else:
+            invocation.failure = True
+
+    errors = _errors.get()
+    if errors is not None:
+        errors.append((expected, deadline_exceeded))
+
+
+@contextmanager
+def collect_errors() -> Iterator[List[Tuple[bool, bool]]]:
+    """
+    collect what record_error is called with inside the with-block
+    as (expected, deadline_exceeded), in addition to marking the
+    current invocation. For worker processes, whose invocation is
+    in the parent, and for results that must not be reused if failed
+    """
+    errors: List[Tuple[bool, bool]] = []
+    token = _errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _errors.reset(token)
+
+
+_PROMETHEUS_QUANTILES = (.5, .95, .99)
+
+
+def prometheus_text() -> str:
+    """ all command metrics in the prometheus text exposition format """
+    snapshot = sorted(commands.values(), key=lambda metrics: metrics.name)
+    lines = []
+
+    for metric, attr, description in (
+            ('herbert_command_invocations_total', 'invocations', 'Number of invocations'),
+            ('herbert_command_herberrors_total', 'herberrors', 'Invocations answered with a Herberror'),
+            ('herbert_command_failures_total', 'failures', 'Invocations failing with an unexpected exception'),
+            ('herbert_command_deadline_exceeded_total', 'deadline_exceeded', 'Invocations that ran out of time')):
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} counter']
+        lines += [f'{metric}{{command="{metrics.name}"}} {getattr(metrics, attr)}' for metrics in snapshot]
+
+    for metric, attr, description in (
+            ('herbert_command_handler_seconds', 'handler_time', 'Time spent in the handler, excluding sends'),
+            ('herbert_command_send_seconds', 'send_time', 'Time spent sending replies')):
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} summary']
+        for metrics in snapshot:
+            hist: Histogram = getattr(metrics, attr)
+            label = f'command="{metrics.name}"'
+            lines += [f'{metric}{{{label},quantile="{q}"}} {hist.percentile(q):.6f}' for q in _PROMETHEUS_QUANTILES]
+            lines += [f'{metric}_sum{{{label}}} {hist.total:.6f}', f'{metric}_count{{{label}}} {hist.count}']
+
+    return '\n'.join(lines) + '\n'
+
+
+class PrometheusWriter:
+    """
+    Periodically rewrite a file with prometheus_text(),
+    e.g. for the textfile collector of the node exporter.
+    The file is replaced atomically.
+    """
+
+    def __init__(self, fname: str, interval: float = 15.0):
+        self.fname = fname
+        self.interval = interval
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    def write(self) -> None:
+        """ rewrite the file once """
+        tmp = f'{self.fname}.tmp'
+        with open(tmp, 'w') as fobj:
+            fobj.write(prometheus_text())
+        os.replace(tmp, self.fname)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def start(self) -> None:
+        """ start rewriting the file in the background """
+        self.write()
+        self._thread = Thread(target=self._run, name='herbert-metrics', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ stop the background thread, after writing the file a last time """
+        self._stopped.set()
+        self.write()
@@ -1,6 +1,12 @@
 """
 General network utility
+
+load*_async are coroutine versions of the load* helpers for
+handlers running on the event loop. They run the blocking
+requests on the loop's executor instead of the loop itself.
 """
+import asyncio
+import contextvars
 import re
 from urllib.parse import quote
 import urllib3
@@ -10,9 +16,10 @@ from herberror import Herberror
 
 # fake it 'til you make it
 from common.herbert_utils import tx_assert
+from common import deadline
 
-__all__ = ['load', 'load_str', 'load_content', 'gen_filename_from_url', 'is_image_content_type',
-           'NetworkError']
+__all__ = ['load', 'load_str', 'load_content', 'load_async', 'load_str_async', 'load_content_async',
+           'gen_filename_from_url', 'is_image_content_type', 'NetworkError']
 
 USER_AGENT = {'user-agent': 'Mozilla/5.0 (X11; Linux i686; rv:64.0) Gecko/20100101 Firefox/64.0'}
 USER_AGENT_CURL = {'user-agent': 'curl/7.58.0'}
@@ -24,6 +31,8 @@ NOT_TEXT_ERR = "The requested web page couldn't be converted to text."
 
 HTTP_STAT_OK = 200
 REQUEST_TYPE_GET = "GET"
+MAX_REDIRECTS = 2
+TIMEOUT = 2.0
 
 # GLOBAL
 urllib3.disable_warnings()
@@ -46,17 +55,58 @@ def load(url, fake_ua=True):
              was successful
     @throws a NetworkError containing a description, if the
             lookup failed
+    @throws DeadlineExceeded, if the deadline of the command passed
     """
+    deadline.check()
+    left = deadline.remaining()
+    timeout = TIMEOUT if left is None else urllib3.Timeout(connect=TIMEOUT, read=TIMEOUT, total=left)
+
     try:
         if fake_ua:
-            return HTTP_POOL.request(REQUEST_TYPE_GET, url, timeout=2.0, retries=urllib3.Retry(redirect=2))
+            return HTTP_POOL.request(REQUEST_TYPE_GET, url, timeout=timeout,
+                                     retries=urllib3.Retry(redirect=MAX_REDIRECTS))
 
-        return HTTP_PLAIN_POOL.request(REQUEST_TYPE_GET, url, timeout=2.0, retries=urllib3.Retry(redirect=2))
+        return HTTP_PLAIN_POOL.request(REQUEST_TYPE_GET, url, timeout=timeout,
+                                       retries=urllib3.Retry(redirect=MAX_REDIRECTS))
 
     except urllib3.exceptions.HTTPError as err:
+        deadline.check()
         raise NetworkError(NO_RESPONSE_ERR) from err
 
 
+async def load_async(url, fake_ua=True):
+    """
+    coroutine version of load(). urllib3 blocks, so load() is run
+    on the default executor of the running event loop, within the
+    current context (and thereby deadline)
+    """
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, ctx.run, load, url, fake_ua)
+
+
+def _decode_str(res):
+    tx_assert(res.status == HTTP_STAT_OK,
+              f"{RESPONSE_STAT_ERR}: {res.status}\nResponse Header: `{res.headers}`",
+              err_class=NetworkError)
+
+    charset = response_extract_charset(res.headers)
+
+    try:
+        return res.data.decode(charset or 'utf-8')
+
+    except UnicodeDecodeError as err:
+        raise Herberror(NOT_TEXT_ERR) from err
+
+
+def _split_content(res):
+    tx_assert(res.status == HTTP_STAT_OK, f"{RESPONSE_STAT_ERR}: {res.status}", err_class=NetworkError)
+
+    content_type = res.headers.get("Content-Type")
+    content_type = re.split(";", content_type)[0]
+
+    return content_type, res.data
+
+
 def load_str(url, **kwargs):
     """"
     loads a web page and tries to convert it to text
@@ -69,19 +119,12 @@ def load_str(url, **kwargs):
             lookup failed
 
     """
-    res = load(url, **kwargs)
+    return _decode_str(load(url, **kwargs))
 
-    tx_assert(res.status == HTTP_STAT_OK,
-              f"{RESPONSE_STAT_ERR}: {res.status}\nResponse Header: `{res.headers}`",
-              err_class=NetworkError)
 
-    charset = response_extract_charset(res.headers)
-
-    try:
-        return res.data.decode(charset or 'utf-8')
-
-    except UnicodeDecodeError as err:
-        raise Herberror(NOT_TEXT_ERR) from err
+async def load_str_async(url, **kwargs):
+    """ coroutine version of load_str() """
+    return _decode_str(await load_async(url, **kwargs))
 
 
 def load_content(url, **kwargs):
@@ -93,14 +136,12 @@ def load_content(url, **kwargs):
     @param url the url to look up
     @returns a tuple of a content_type string and a binary data string
     """
-    res = load(url, **kwargs)
+    return _split_content(load(url, **kwargs))
 
-    tx_assert(res.status == HTTP_STAT_OK, f"{RESPONSE_STAT_ERR}: {res.status}", err_class=NetworkError)
 
-    content_type = res.headers.get("Content-Type")
-    content_type = re.split(";", content_type)[0]
-
-    return content_type, res.data
+async def load_content_async(url, **kwargs):
+    """ coroutine version of load_content() """
+    return _split_content(await load_async(url, **kwargs))
 
 
 def is_image_content_type(content_type):
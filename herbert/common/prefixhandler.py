@@ -1,9 +1,52 @@
 """
 Module that contains the Herbot Prefix Handler
+and the command router built on the same parsing
 """
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
 
 from telegram import Update
-from telegram.ext import CommandHandler
+from telegram.ext import CommandHandler, Handler
+from telegram.utils.helpers import DEFAULT_FALSE
+
+__all__ = ['split_command', 'HerbotPrefixHandler', 'HerbotCommandRouter']
+
+
+def split_command(text: str, bot_name: Optional[str] = None) -> Optional[Tuple[str, List[str]]]:
+    """
+    Split a message of the form /command@botname arg1 arg2
+    into the command name and the argument list.
+    Returns None if the text is not a command addressed
+    to this bot
+    """
+    words = text.split()
+    if not words:
+        return None
+
+    command, *args = words
+    if command[0] != '/':
+        return None
+
+    parts = command[1:].split('@')
+
+    if len(parts) > 2:
+        return None
+
+    if bot_name and len(parts) > 1 and parts[1] != bot_name:
+        return None
+
+    return parts[0], args
+
+
+def _command_of(update) -> Optional[Tuple[str, List[str]]]:
+    if isinstance(update, Update) and update.effective_message is not None:
+        message = update.effective_message
+
+        if message.text:
+            bot_name = message.bot.username if message.bot else None
+            return split_command(message.text, bot_name)
+
+    return None
 
 
 class HerbotPrefixHandler(CommandHandler):
@@ -22,36 +65,71 @@ class HerbotPrefixHandler(CommandHandler):
         )
 
     def check_update(self, update):
-        if isinstance(update, Update) and update.effective_message is not None:
-            message = update.effective_message
+        parsed = _command_of(update)
+        if parsed is None:
+            return None
 
-            bot_name = message.bot.username if message.bot else None
+        name, args = parsed
+        if name not in self._command_list:
+            return False
 
-            if message.text:
-                command, *args = message.text.split()
-                command_tag = command[0]
-                command_name = command[1:]
+        return args, True
 
-                if command_tag != '/':
-                    return False
+    def collect_additional_context(self, context, update, dispatcher, check_result):
+        if isinstance(check_result, tuple):
+            context.args = check_result[0]
+            if isinstance(check_result[1], dict):
+                context.update(check_result[1])
 
-                parts = command_name.split('@')
 
-                if len(parts) > 2:
-                    return False
+class HerbotCommandRouter(Handler):
+    """
+    A single handler for all commands. The command prefix
+    of every update is parsed exactly once and the callback
+    is looked up by name, instead of asking one
+    HerbotPrefixHandler per alias whether it feels responsible
+    """
 
-                if bot_name and len(parts) > 1 and parts[1] != bot_name:
-                    return False
+    def __init__(self, **kwargs):
+        super().__init__(self._unrouted, **kwargs)
+        self.routes: Dict[str, Callable] = dict()
 
-                if parts[0] not in self._command_list:
-                    return False
+    def add(self, name: str, callback: Callable) -> None:
+        """ make callback the handler of /name """
+        if name in self.routes:
+            logging.getLogger('herbert.SETUP') \
+                   .warning('Command /%s is already registered, ignoring duplicate', name)
+            return
 
-                return args, True
+        self.routes[name] = callback
 
-        return None
+    def check_update(self, update):
+        parsed = _command_of(update)
+        if parsed is None:
+            return None
+
+        name, args = parsed
+        callback = self.routes.get(name)
+        if callback is None:
+            return None
+
+        return callback, args
 
     def collect_additional_context(self, context, update, dispatcher, check_result):
-        if isinstance(check_result, tuple):
-            context.args = check_result[0]
-            if isinstance(check_result[1], dict):
-                context.update(check_result[1])
+        context.args = check_result[1]
+
+    def handle_update(self, update, dispatcher, check_result, context=None):
+        callback, _ = check_result
+        self.collect_additional_context(context, update, dispatcher, check_result)
+
+        run_async = self.run_async
+        if run_async is DEFAULT_FALSE and dispatcher.bot.defaults and dispatcher.bot.defaults.run_async:
+            run_async = True
+
+        if run_async:
+            return dispatcher.run_async(callback, update, context, update=update)
+        return callback(update, context)
+
+    @staticmethod
+    def _unrouted(_update, _context):
+        raise RuntimeError('HerbotCommandRouter callback invoked without a route')
@@ -0,0 +1,78 @@
+"""
+Texts that are rendered once and then sent as they are
+
+The help, /about and the error messages are the same
+every time; their markup is parsed into a Text with
+entities on first use and kept until the berts change
+(core invalidates the registry whenever one is registered).
+Cached Texts are shared, they must not be modified.
+"""
+from copy import copy
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable
+
+from common.basic_utils import utf16len
+from common.chatformat import STYLE, parse_entities
+from common.reply_data import Text
+
+__all__ = ['Prerendered', 'prerendered', 'prerender', 'join_texts']
+
+
+def prerender(msg: str, parse_mode=STYLE, disable_web_page_preview=False) -> Text:
+    """ parse the markup of msg, like BaseBert.send_message would """
+    return Text(*parse_entities(msg, parse_mode), disable_web_page_preview=disable_web_page_preview)
+
+
+def join_texts(first: Text, *rest: Text) -> Text:
+    """ one Text out of several, keeping the options of the first """
+    msg = first.msg
+    entities = list(first.entities)
+    for text in rest:
+        shift = utf16len(msg)
+        for entity in text.entities:
+            entity = copy(entity)
+            entity.offset += shift
+            entities.append(entity)
+        msg += text.msg
+
+    return Text(msg, entities, name=first.name, disable_web_page_preview=first.disable_web_page_preview)
+
+
+class Prerendered:
+    """ values built on first use, by key, until invalidated """
+
+    def __init__(self):
+        self._values: Dict[Hashable, Any] = dict()
+        self._lock = Lock()
+        self.generation = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """ the value stored for key, built if it is missing """
+        with self._lock:
+            generation = self.generation
+            if key in self._values:
+                return self._values[key]
+
+        value = build()
+        with self._lock:
+            # do not keep anything built from berts that changed meanwhile
+            if generation == self.generation:
+                self._values.setdefault(key, value)
+        return value
+
+    def text(self, msg: str, parse_mode=STYLE, disable_web_page_preview=False) -> Text:
+        """ msg rendered to a Text; only meant for constant messages """
+        return self.get((msg, parse_mode, disable_web_page_preview),
+                        lambda: prerender(msg, parse_mode, disable_web_page_preview))
+
+    def invalidate(self) -> None:
+        """ drop everything, it is rebuilt on next use """
+        with self._lock:
+            self.generation += 1
+            self._values.clear()
+
+    def __len__(self):
+        return len(self._values)
+
+
+prerendered = Prerendered()
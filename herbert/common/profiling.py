@@ -0,0 +1,119 @@
+"""
+Profile live command invocations on demand
+
+An admin requests a profile of the next N invocations of a
+command (see berts/adminbert.py: /profile). Those invocations
+run under cProfile in their own thread, every other invocation
+runs as usual. Once N invocations were recorded, the aggregated
+stats are handed to the callback of the request.
+"""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Dict, Iterator, List, Optional
+
+__all__ = ['ProfileRequest', 'request_profile', 'cancel_profile', 'active_profiles', 'profiled']
+
+
+class ProfileRequest:
+    """ profile `count` invocations of `command`, then call on_done(self) """
+
+    def __init__(self, command: str, count: int, on_done: Callable[['ProfileRequest'], None]):
+        self.command = command
+        self.count = count
+        self.on_done = on_done
+
+        self.claimed = 0
+        self.recorded = 0
+        self.stats: Optional[pstats.Stats] = None
+        self._lock = Lock()
+
+    def claim(self) -> bool:
+        """ reserve a slot for one more invocation """
+        with self._lock:
+            if self.claimed >= self.count:
+                return False
+            self.claimed += 1
+            return True
+
+    def add(self, profile: Optional[cProfile.Profile]) -> bool:
+        """ add the stats of a claimed invocation, return whether this was the last one """
+        with self._lock:
+            if profile is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+            self.recorded += 1
+            return self.recorded == self.count
+
+    def top_functions(self, limit: int = 40, sort: str = 'cumulative') -> str:
+        """ the `limit` most expensive functions as text """
+        if self.stats is None:
+            return 'nothing was recorded'
+
+        out = io.StringIO()
+        self.stats.stream = out  # type: ignore
+        self.stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def pstats_data(self) -> bytes:
+        """ the aggregated stats in the format of pstats.Stats.dump_stats """
+        return marshal.dumps(self.stats.stats if self.stats is not None else {})  # type: ignore
+
+
+_requests: Dict[str, ProfileRequest] = dict()
+_requests_lock = Lock()
+
+
+def request_profile(command: str, count: int, on_done: Callable[[ProfileRequest], None]) -> ProfileRequest:
+    """ profile the next `count` invocations of `command`, replacing an earlier request """
+    request = ProfileRequest(command, count, on_done)
+    with _requests_lock:
+        _requests[command] = request
+    return request
+
+
+def cancel_profile(command: str) -> Optional[ProfileRequest]:
+    """ forget the request for `command`, if there is one """
+    with _requests_lock:
+        return _requests.pop(command, None)
+
+
+def active_profiles() -> List[ProfileRequest]:
+    """ all requests that are not done yet """
+    with _requests_lock:
+        return list(_requests.values())
+
+
+@contextmanager
+def profiled(command: str) -> Iterator[None]:
+    """ run the with-block under the profiler, if a profile of `command` was requested """
+    request = _requests.get(command)
+    if request is None or not request.claim():
+        yield
+        return
+
+    profile: Optional[cProfile.Profile] = cProfile.Profile()
+    try:
+        profile.enable()  # type: ignore
+    except ValueError:
+        # another profiler is active in this interpreter
+        logging.getLogger('herbert.RUNTIME').warning('Could not profile /%s, profiler busy', command)
+        profile = None
+
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+
+        if request.add(profile):
+            with _requests_lock:
+                if _requests.get(command) is request:
+                    del _requests[command]
+            request.on_done(request)
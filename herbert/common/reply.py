@@ -2,15 +2,22 @@
 Provide methods for sending Messages to Telegram
 """
 
-from copy import copy
+from dataclasses import replace
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional
 import hashlib
 import logging
 
-from telegram import InlineQueryResultArticle, InputTextMessageContent, InlineQueryResultPhoto
+from telegram import InlineQuery, InlineQueryResult, InlineQueryResultArticle, InputTextMessageContent, \
+    InlineQueryResultPhoto, Message
 from telegram.error import BadRequest
 
-from common.telegram_limits import MSG_CHUNK
-from common.basic_utils import arr_to_bytes, utf16len
+from common.file_ids import content_key, file_ids
+from common.send_queue import SendQueue
+from common.telegram_limits import MSG_CHUNK, INLINE_MAX_RESULTS
+from common.basic_utils import arr_to_bytes
+from common.chunking import chunk_text
 from common.type_dispatch import TypeDispatch
 from common.reply_data import (
     ReplyData,
@@ -33,16 +40,29 @@ from common.reply_data import (
 # decorators are hard for the linter to understand
 # pylint: disable=no-self-use,not-callable
 
-__all__ = ['send_message']
+__all__ = ['send_message', 'use_send_queue', 'answer_inline', 'INLINE_PAGE']
+
+# inline results per answer, further pages are requested via next_offset
+INLINE_PAGE = 20
+assert INLINE_PAGE <= INLINE_MAX_RESULTS
+
+# if set, chat messages are delivered via this queue
+_send_queue: Optional[SendQueue] = None
+
+
+def use_send_queue(queue: Optional[SendQueue]) -> None:
+    """ rate limit all chat messages with the given queue (None to send directly) """
+    global _send_queue  # pylint: disable = global-statement
+    _send_queue = queue
 
 
 def _gen_id(array):
-    return hashlib.md5(arr_to_bytes(array))
+    return hashlib.md5(arr_to_bytes(array)).hexdigest()[:16]
 
 
-def _inl_send(result, inline_query):
+def _inl_send(result, inline_query, **hints):
     try:
-        inline_query.answer(result)
+        inline_query.answer(result, **hints)
     except BadRequest:
         # answer time window passed
         pass
@@ -65,29 +85,30 @@ def _caption_args(c: Captionable):
     }
 
 
-def _inl_send_string_list(strings, query):
-    result = [
-        InlineQueryResultArticle(
-            id=f"inline{i}-{_gen_id(strings)}",
-            title=title,
-            input_message_content=InputTextMessageContent(string)
-        )
-        for i, (string, title) in enumerate(strings)
-    ]
-    _inl_send(result, query)
-
-
-def _inl_send_photo_url_list(photo_list, query):
-    result = [
-        InlineQueryResultPhoto(
-            id=f"photo{i}-{_gen_id(photo_list)}",
-            photo_url=url,
-            title=caption,
-            caption=caption,
-            thumb_url=url
-        ) for i, (url, caption) in enumerate(photo_list)
-    ]
-    _inl_send(result, query)
+def _upload_once(data, kind: str, name: Optional[str], send: Callable[[Any], Optional[Message]],
+                 file_id_of: Callable[[Message], Optional[str]]) -> None:
+    """
+    send(file_id) if the same content was uploaded as kind before,
+    otherwise send(data) and remember the file_id telegram returns
+    """
+    cached = content_key(kind, data, name)
+    if cached is not None:
+        key, size = cached
+        file_id = file_ids.get(key)
+        if file_id is not None:
+            try:
+                send(file_id)
+                file_ids.reused(size)
+                return
+            except BadRequest:
+                # the file_id expired, upload again
+                file_ids.forget(key)
+
+    message = send(data)
+    if cached is not None and isinstance(message, Message):
+        file_id = file_id_of(message)
+        if file_id is not None:
+            file_ids.put(cached[0], file_id)
 
 
 class SendReply(metaclass=TypeDispatch):
@@ -105,7 +126,7 @@ class SendReply(metaclass=TypeDispatch):
         ctx.bot.send_message(ctx.chat_id, text.msg, entities=text.entities, reply_markup=text.reply_markup)
 
     def query_answer_text(self, text: Text, ctx: InlineContext):
-        _inl_send_string_list([(text.msg, text.msg)], ctx.query)
+        answer_inline(ctx.query, [text])
 
     # Sticker
     def send_sticker(self, sticker: Sticker, ctx: ChatContext):
@@ -113,7 +134,10 @@ class SendReply(metaclass=TypeDispatch):
 
     # File
     def send_file(self, file: File, ctx: ChatContext):
-        ctx.bot.send_document(ctx.chat_id, document=file.data, filename=file.name, **_caption_args(file), reply_markup=file.reply_markup)
+        _upload_once(file.data, 'document', file.name,
+                     lambda document: ctx.bot.send_document(ctx.chat_id, document=document, filename=file.name,
+                                                            **_caption_args(file), reply_markup=file.reply_markup),
+                     lambda message: message.document.file_id if message.document else None)
 
     # Gif
     def send_gif(self, gif: Gif, ctx: ChatContext):
@@ -121,14 +145,17 @@ class SendReply(metaclass=TypeDispatch):
 
     # Photo
     def send_photo(self, photo: Photo, ctx: ChatContext):
-        ctx.bot.send_photo(ctx.chat_id, photo.data, parse_mode=None, **_caption_args(photo), reply_markup=photo.reply_markup)
+        _upload_once(photo.data, 'photo', None,
+                     lambda data: ctx.bot.send_photo(ctx.chat_id, data, parse_mode=None, **_caption_args(photo),
+                                                     reply_markup=photo.reply_markup),
+                     lambda message: message.photo[-1].file_id if message.photo else None)
 
     # PhotoUrl
     def send_photo_url(self, photo: PhotoUrl, ctx: ChatContext):
         ctx.bot.send_photo(ctx.chat_id, photo.url, **_caption_args(photo), reply_markup=photo.reply_markup)
 
     def inline_photo_url(self, photo: PhotoUrl, ctx: InlineContext):
-        _inl_send_photo_url_list([(photo.url, photo.caption)], ctx.query)
+        answer_inline(ctx.query, [photo])
 
     def send_poll(self, poll: Poll, ctx: ChatContext):
         ctx.bot.send_poll(
@@ -156,26 +183,10 @@ class TransformReply(metaclass=TypeDispatch):
         send a message in chunks if it is too long
         for a single telegram message
         """
-        res = []
-        pos = 0
-        size = utf16len(text.msg)
-
-        while pos < size:
-            end = min(size, pos + MSG_CHUNK)
-            entities = list()
-            for entity in text.entities:
-                if (entity.offset in range(pos, end)
-                        or entity.offset + entity.length in range(pos, end)
-                        or (entity.offset < pos and entity.offset + entity.length > end)):
-                    chunk_entity = copy(entity)
-                    chunk_entity.offset = max(0, chunk_entity.offset - pos)
-                    chunk_entity.length = min(chunk_entity.length, end - chunk_entity.offset)
-                    entities.append(chunk_entity)
-
-            res.append(Text(text.msg[pos:end], entities))
-            pos = end
-
-        return res
+        if 0 < len(text.msg) * 2 <= MSG_CHUNK:
+            # fits even if every character is a surrogate pair
+            return [text]
+        return [replace(text, msg=msg, entities=entities) for msg, entities in chunk_text(text.msg, text.entities)]
 
     def process_image(self, img: Photo):
         return [img]  # maybe actually do something
@@ -185,6 +196,55 @@ def processed_message_parts(data: ReplyData):
     yield from TransformReply()(data)
 
 
+class InlineResult(metaclass=TypeDispatch):
+    """
+    Turn a message descriptor into an inline query result
+    (without an id), None if it can not be shown inline
+    """
+    _types = [ReplyData]
+
+    def _dispatch_fail(self, _classes, _instances):
+        return None
+
+    def article(self, text: Text):
+        return InlineQueryResultArticle(id='', title=text.msg, input_message_content=InputTextMessageContent(text.msg))
+
+    def photo(self, photo: PhotoUrl):
+        caption = _caption_args(photo)
+        return InlineQueryResultPhoto(id='', photo_url=photo.url, title=caption.get('caption'), thumb_url=photo.url,
+                                      **caption)
+
+
+def _inline_results(replies: Iterable[ReplyData], digest: str) -> Iterator[InlineQueryResult]:
+    """ the inline results for replies, built one at a time """
+    index = 0
+    for data in replies:
+        for part in processed_message_parts(data):
+            result = InlineResult()(part)  # type: ignore[operator]
+            if result is not None:
+                result.id = f'inline{index}-{digest}'
+                index += 1
+                yield result
+
+
+def answer_inline(query: InlineQuery, replies: Iterable[ReplyData],
+                  cache_time: Optional[int] = None, is_personal: bool = False) -> None:
+    """
+    Answer an inline query with the page of results its offset asks for.
+    Only the results up to the end of that page are built.
+    cache_time and is_personal are hints for telegram's cache
+    (None leaves telegram's default)
+    """
+    page = int(query.offset) if query.offset.isdigit() else 0
+    start = page * INLINE_PAGE
+    results = list(islice(_inline_results(replies, _gen_id([query.query])), start, start + INLINE_PAGE + 1))
+
+    hints = {'next_offset': str(page + 1) if len(results) > INLINE_PAGE else '', 'is_personal': is_personal}
+    if cache_time is not None:
+        hints['cache_time'] = cache_time
+    _inl_send(results[:INLINE_PAGE], query, **hints)
+
+
 def send_message(data: ReplyData, ctx: Context):
     """
     Best-effort method for returning some piece of data
@@ -192,7 +252,19 @@ def send_message(data: ReplyData, ctx: Context):
     transformations, if needed, and then dispatch
     to the actual sending methods using the context
     type.
+
+    Chat messages go through the send queue (see use_send_queue),
+    if there is one, and are in order and within telegram's rate limits
     """
+    queue = _send_queue
+    pending = []
     for part in processed_message_parts(data):
         logging.getLogger('herbert.MESSAGES').debug('>>> %s', part)
-        SendReply()(part, ctx)
+        if queue is not None and isinstance(ctx, ChatContext):
+            pending.append(queue.submit(ctx.chat_id, partial(SendReply(), part, ctx)))  # type: ignore[operator, misc, arg-type]
+        else:
+            SendReply()(part, ctx)  # type: ignore[operator]
+
+    # wait for delivery, so errors still reach the handler
+    for future in pending:
+        future.result()
@@ -0,0 +1,245 @@
+"""
+Rate limited delivery of outgoing messages
+
+telegram allows about 30 messages per second in total,
+and about one message per second into a single chat;
+everything beyond that is answered with RetryAfter.
+
+The SendQueue delays sends such that both limits are kept
+(a token bucket per chat and a global one), delivers the
+messages of a chat in the order they were queued, and
+retries a send after the delay requested by RetryAfter.
+"""
+import heapq
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+from typing import Any, Callable, Deque, Dict, Hashable, List, Tuple
+
+from telegram.error import RetryAfter
+
+from common.metrics import Histogram
+
+__all__ = ['TokenBucket', 'SendQueue']
+
+GLOBAL_RATE = 30.0
+GLOBAL_BURST = 30
+CHAT_RATE = 1.0
+CHAT_BURST = 3
+MAX_RETRIES = 3
+MAX_IDLE_CHATS = 4096
+
+
+class TokenBucket:
+    """
+    Allows `rate` events per second on average,
+    with bursts of up to `burst` events
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """ seconds until a token is available (0 if there is one now) """
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """ use a token, which has to be available """
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        """ whether the bucket would not limit a burst right now """
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Job:
+    __slots__ = ('func', 'future', 'enqueued', 'retries')
+
+    def __init__(self, func: Callable[[], Any]):
+        self.func = func
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+        self.retries = 0
+
+
+class _Chat:
+    __slots__ = ('jobs', 'bucket', 'busy', 'paused_until')
+
+    def __init__(self, rate: float, burst: int):
+        self.jobs: Deque[_Job] = deque()
+        self.bucket = TokenBucket(rate, burst)
+        self.busy = False
+        self.paused_until = 0.0
+
+
+class SendQueue:
+    """
+    Delivers sends (zero-argument callables) per chat in order,
+    respecting the per-chat and global rate limits.
+
+    At most one send per chat is in flight, so ordering within
+    a chat is kept even with several worker threads.
+    """
+
+    def __init__(self, workers: int = 8, global_rate: float = GLOBAL_RATE, global_burst: int = GLOBAL_BURST,
+                 chat_rate: float = CHAT_RATE, chat_burst: int = CHAT_BURST, max_retries: int = MAX_RETRIES):
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: Dict[Hashable, _Chat] = dict()
+        # chats with queued jobs and no send in flight: (not before, seq, chat)
+        self._ready: List[Tuple[float, int, Hashable]] = []
+        self._seq = 0
+        self._cond = Condition()
+        self._threads: List[Thread] = []
+
+        self.depth = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.throttle_delay = Histogram()
+        self.send_time = Histogram()
+
+    def start(self) -> None:
+        """ start the worker threads, if they are not running yet """
+        with self._cond:
+            while len(self._threads) < self.workers:
+                thread = Thread(target=self._work, name=f'herbert-send-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def submit(self, chat_id: Hashable, func: Callable[[], Any]) -> Future:
+        """ queue func for delivery into chat_id, return a future for its result """
+        if not self._threads:
+            self.start()
+
+        job = _Job(func)
+        with self._cond:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                if len(self._chats) >= MAX_IDLE_CHATS:
+                    self._prune()
+                chat = self._chats[chat_id] = _Chat(self.chat_rate, self.chat_burst)
+
+            chat.jobs.append(job)
+            self.depth += 1
+            if len(chat.jobs) == 1 and not chat.busy:
+                self._push(chat_id, chat.paused_until)
+
+        return job.future
+
+    def send(self, chat_id: Hashable, func: Callable[[], Any]) -> Any:
+        """ queue func and wait until it was delivered """
+        return self.submit(chat_id, func).result()
+
+    def _prune(self) -> None:
+        """ forget chats that have nothing queued and could burst again """
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, chat in self._chats.items()
+                        if not chat.jobs and not chat.busy and chat.bucket.full(now)]:
+            del self._chats[chat_id]
+
+    def _push(self, chat_id: Hashable, not_before: float) -> None:
+        self._seq += 1
+        heapq.heappush(self._ready, (not_before, self._seq, chat_id))
+        self._cond.notify()
+
+    def _next_job(self) -> Tuple[Hashable, _Chat, _Job]:
+        """ wait until some chat may send, and take its first job """
+        with self._cond:
+            while True:
+                if not self._ready:
+                    self._cond.wait()
+                    continue
+
+                now = time.monotonic()
+                not_before, _, chat_id = self._ready[0]
+                if not_before > now:
+                    self._cond.wait(not_before - now)
+                    continue
+
+                heapq.heappop(self._ready)
+                chat = self._chats[chat_id]
+                delay = max(chat.paused_until - now, chat.bucket.delay(now), self._global.delay(now))
+                if delay > 0:
+                    self._push(chat_id, now + delay)
+                    continue
+
+                chat.bucket.take()
+                self._global.take()
+                chat.busy = True
+                self.depth -= 1
+                return chat_id, chat, chat.jobs.popleft()
+
+    def _work(self) -> None:
+        while True:
+            chat_id, chat, job = self._next_job()
+            started = time.monotonic()
+            if job.retries == 0:
+                self.throttle_delay.observe(started - job.enqueued)
+
+            result, error = None, None
+            try:
+                result = job.func()
+            except Exception as err:  # pylint: disable = broad-except
+                error = err
+            self.send_time.observe(time.monotonic() - started)
+
+            retry_after = error.retry_after if isinstance(error, RetryAfter) else 0.0
+            retry = isinstance(error, RetryAfter) and job.retries < self.max_retries
+
+            with self._cond:
+                chat.busy = False
+
+                if retry:
+                    logging.getLogger('herbert.RUNTIME').info('Flood control for chat %s, retrying in %.1fs',
+                                                              chat_id, retry_after)
+                    job.retries += 1
+                    self.retried += 1
+                    chat.paused_until = time.monotonic() + retry_after
+                    chat.jobs.appendleft(job)
+                    self.depth += 1
+                elif error is not None:
+                    self.failed += 1
+                else:
+                    self.sent += 1
+
+                if chat.jobs:
+                    self._push(chat_id, chat.paused_until)
+                elif chat.bucket.full(time.monotonic()):
+                    del self._chats[chat_id]
+
+            if retry:
+                continue
+
+            if error is None:
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        """ current state of the queue """
+        return {
+            'workers': self.workers,
+            'depth': self.depth,
+            'chats': len(self._chats),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'throttled': self.throttle_delay.summary(),
+            'send': self.send_time.summary(),
+        }
@@ -0,0 +1,83 @@
+"""
+Share one execution between identical concurrent invocations
+
+When a group spams the same /xkcd 927, every invocation
+would fetch and render the same comic. Commands declared
+with @command(coalesce=True) are keyed on (command, reply
+context type, normalized arguments): the first invocation
+of a key runs the handler and collects its replies, every
+identical invocation arriving while it runs waits for those
+replies and sends them into its own chat.
+
+Only invocations that overlap in time are coalesced, the
+results are not cached beyond that.
+"""
+from concurrent.futures import Future
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+__all__ = ['SingleFlight', 'flights', 'flight_key']
+
+
+class SingleFlight:
+    """ tracks the executions in flight by key """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = dict()
+        self._lock = Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def join(self, key: Hashable) -> Tuple[Future, bool]:
+        """
+        return the future of the execution for key, and whether
+        the caller is the leader that has to run it and finish() it
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+
+            future = self._calls[key] = Future()
+            # waiters giving up must not cancel it for everybody
+            future.set_running_or_notify_cancel()
+            self.executions += 1
+            return future, True
+
+    def finish(self, key: Hashable, future: Future, result: Any) -> None:
+        """ hand the result to all waiters, later invocations of key execute again """
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """ current state """
+        return {
+            'in_flight': len(self._calls),
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+        }
+
+
+flights = SingleFlight()
+
+
+def _normalized(arg: Any) -> Optional[Hashable]:
+    if isinstance(arg, str):
+        return ' '.join(arg.split())
+    if isinstance(arg, (list, tuple)) and all(isinstance(item, str) for item in arg):
+        return tuple(arg)
+    return None
+
+
+def flight_key(command: str, context: Any, args: tuple, kwargs: dict) -> Optional[Hashable]:
+    """
+    the key identical invocations share, None if the arguments
+    are not plain strings (updates, queries, ...) and can not be compared
+    """
+    normalized = tuple(_normalized(arg) for arg in args)
+    if kwargs or None in normalized:
+        return None
+    return command, type(context).__name__, normalized
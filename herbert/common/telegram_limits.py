@@ -4,4 +4,5 @@ Specify some constant constraints for telegram messages
 If those aren't satisfied, the message will be rejected without further information
 """
 MSG_CHUNK = 4096
+INLINE_MAX_RESULTS = 50
 IMG_MAX_ASPECT = 20.0
@@ -4,13 +4,35 @@ Herbert and Herbert-
 Submodules
 """
 
+import asyncio
+import inspect
 import logging
+import signal
+from functools import partial, wraps
+from os.path import exists
+from threading import Event, Thread
+from typing import Dict, List, Optional, Set
 
-from telegram.ext import Updater, InlineQueryHandler, CallbackContext
-from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import Updater, Dispatcher, InlineQueryHandler, CallbackContext, CallbackQueryHandler
+from telegram.utils.request import Request
+from telegram import Bot, InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.error import TelegramError
 
+from common.constants import ERROR_BUSY
+from common.file_ids import file_ids
 from common.herbert_utils import is_cmd_decorated
+from common.inline_debounce import InlineDebouncer
+from common.prefixhandler import HerbotCommandRouter
+from common.prerendered import prerendered
+from common.reply import send_message, use_send_queue
+from common.reply_data import ChatContext
+from common.metrics import PrometheusWriter
+from common.send_queue import SendQueue
+from backlog import BacklogReport, drain
+from manifest import BertEntry, LazyBert, describe
+from webhook import WebhookConfig, WebhookServer
 import path
+import scheduler
 
 __all__ = ['Herbert']
 
@@ -25,8 +47,15 @@ logging.getLogger('requests').setLevel(logging.WARNING)
 logging.getLogger('urllib3').setLevel(logging.WARNING)
 
 berts = []
+bert_docs: List[BertEntry] = []
+lazy_berts: List[LazyBert] = []
+import_costs: Dict[str, float] = {}
 inline_methods = {}
 inline_aliases = {}
+inline_costs: Dict[str, str] = {}
+admins: Set[int] = set()
+send_queue = SendQueue()
+inline_debouncer = InlineDebouncer()
 
 
 class Herbert:
@@ -37,50 +66,275 @@ class Herbert:
     for all methods of a BaseBert-subclass
 
     The bot can then run with .idle()
+
+    Unless scheduled is False, all invocations are run on
+    the scheduler lane of their cost class, instead of on
+    the ptb dispatcher thread
+
+    Coroutine handlers are run on the asyncio event loop of the
+    scheduler's async lane, unless use_asyncio is False; then
+    every invocation gets its own short-lived event loop
+
+    If a WebhookConfig is given (or webhook_file exists), updates
+    are received by the built-in webhook listener instead of long polling
+
+    Unless rate_limited is False, chat messages are sent via the
+    send queue, which keeps telegram's flood limits
+
+    If metrics_file is set (e.g. for the textfile collector of the node
+    exporter), the per-command metrics are written to it in the
+    prometheus text format every metrics_interval seconds
+
+    If a bot is given, it is used instead of one created from
+    the token in token_file (e.g. a fake bot for benchmarks)
+
+    Inline queries are held back for inline_debounce seconds, and
+    dropped (or cancelled, if already running) once the same user
+    sent a newer one. 0 runs them right away, still cancelling
+    superseded ones (see common/inline_debounce.py)
+
+    If drain_backlog is set, the updates that queued up while the
+    bot was down are fetched in bulk before polling starts, and
+    stale ones are skipped without dispatching them (see backlog.py)
+
+    The file_ids of uploaded photos and documents are kept in
+    file_id_file (if set), so that sending the same content again
+    does not upload it again (see common/file_ids.py)
     """
 
-    def __init__(self, token_file='token.txt') -> None:
+    def __init__(self, token_file='token.txt', workers=4, run_async=False,
+                 admin_file='admins.txt', scheduled=True, use_asyncio=True,
+                 webhook: Optional[WebhookConfig] = None, webhook_file='webhook.json',
+                 rate_limited=True, metrics_file: Optional[str] = None, metrics_interval=15.0,
+                 bot: Optional[Bot] = None, drain_backlog=True, inline_debounce=0.25,
+                 file_id_file: Optional[str] = 'cache/file_ids.json') -> None:
         path.change_path()
 
-        with open(token_file, 'r') as fobj:
-            self.token = fobj.read().strip()
+        if bot is None:
+            with open(token_file, 'r') as fobj:
+                # the same connection pool size ptb's Updater would use
+                bot = Bot(fobj.read().strip(), request=Request(con_pool_size=workers + 4))
+        self.token = bot.token
+
+        if exists(admin_file):
+            with open(admin_file, 'r') as fobj:
+                admins.update(int(line) for line in fobj if line.strip())
+
+        self.scheduled = scheduled
+        scheduler.async_lane.enabled = use_asyncio
+        use_send_queue(send_queue if rate_limited else None)
+        inline_debouncer.delay = inline_debounce
+        file_ids.load(file_id_file)
+
+        # reply contexts are per invocation, so the handlers
+        # may safely run on ptb's worker threads
+        self.run_async = run_async
+        self.updater = Updater(bot=bot, workers=workers)
+        # ptb leaves these to be inferred, which mypy can not do through Updater
+        self.bot: Bot = bot
+        self.dispatcher: Dispatcher = self.updater.dispatcher
+        self.router = HerbotCommandRouter(run_async=run_async)
+        self.dispatcher.add_handler(self.router)
 
-        self.updater = Updater(self.token)
+        if webhook is None and exists(webhook_file):
+            webhook = WebhookConfig.from_file(webhook_file)
+
+        self.webhook = webhook
+        self.webhook_server: Optional[WebhookServer] = None
+
+        self.metrics_writer = PrometheusWriter(metrics_file, metrics_interval) if metrics_file else None
+
+        self.drain_backlog = drain_backlog
+        self.backlog_report: Optional[BacklogReport] = None
 
     def register_bert(self, cls: type) -> None:
         """Adds a Bert to Herbert"""
         bot = cls()
         berts.append(bot)
+        bert_docs.append(describe(cls))
+        prerendered.invalidate()
 
         for method in bot.enumerate_members():
             if is_cmd_decorated(method):
                 inf = method.cmdinfo
-                for handler in inf.handlers(method):
-                    self.updater.dispatcher.add_handler(handler)
+                if inf.ptb_forward:
+                    for handler in inf.handlers(method):
+                        handler.callback = self.schedule(inf.properties.cost, handler.callback)
+                        self.dispatcher.add_handler(handler)
+                else:
+                    for name, callback in inf.routes(method):
+                        self.router.add(name, self.schedule(inf.properties.cost, callback))
 
                 if inf.properties.allow_inline:
                     inline_methods[method.__name__] = inf.invoke(method)
+                    inline_costs[method.__name__] = inf.properties.cost
                     for command in inf.properties.aliases:
                         inline_aliases[command] = method.__name__
 
             elif hasattr(method, 'callback_query_handler'):
-                self.updater.dispatcher.add_handler(
-                    method.callback_query_handler(method)
-                )
+                handler = method.callback_query_handler(method)
+                handler.run_async = self.run_async
+                handler.callback = self.schedule(scheduler.COST_IO, handler.callback)
+                self.dispatcher.add_handler(handler)
 
         cmds = ", ".join((m.__name__ for m in bot.enumerate_cmds()))
         logging.getLogger('herbert.SETUP').debug("Registered Bert %s of type %s (%s)", bot, cls.__name__, cmds)
 
+    def register_lazy_bert(self, entry: BertEntry) -> None:
+        """
+        Adds a Bert from its manifest entry, the bert
+        itself is imported on its first invocation
+        """
+        lazy = LazyBert(entry, on_load=berts.append)
+        lazy_berts.append(lazy)
+        bert_docs.append(entry)
+        prerendered.invalidate()
+
+        for cmd in entry.commands:
+            callback = lazy.callback(cmd.method, cmd.coroutine)
+            for name in cmd.aliases:
+                self.router.add(name, self.schedule(cmd.cost, callback))
+
+            if cmd.allow_inline:
+                inline_methods[cmd.method] = callback
+                inline_costs[cmd.method] = cmd.cost
+                for command in cmd.aliases:
+                    inline_aliases[command] = cmd.method
+
+        for cb_entry in entry.callbacks:
+            callback = self.schedule(scheduler.COST_IO, lazy.callback(cb_entry.method, cb_entry.coroutine))
+            self.dispatcher.add_handler(
+                CallbackQueryHandler(callback, pattern=cb_entry.pattern, run_async=self.run_async))
+
+        logging.getLogger('herbert.SETUP').debug("Registered lazy Bert %s (%s)", entry.cls,
+                                                 ", ".join(cmd.method for cmd in entry.commands))
+
     def register_inline_handler(self) -> None:
-        self.updater.dispatcher.add_handler(InlineQueryHandler(handle_inline_query))
+        def schedule_inline_query(update: Update, context: CallbackContext):
+            command, *args = update.inline_query.query.split(" ")
+            name = inline_aliases.get(command)
+            if name is None:
+                cost, callback = scheduler.COST_CHEAP, handle_inline_query
+            else:
+                cost = inline_costs[name]
+                callback = partial(inline_methods[name], inline=True, inline_query=update.inline_query, inline_args=args)
+
+            user = update.inline_query.from_user.id
+            inline_debouncer.submit(
+                user, lambda ticket: self.schedule(cost, inline_debouncer.guard(user, ticket, callback))(update, context))
+
+        self.dispatcher.add_handler(InlineQueryHandler(schedule_inline_query, run_async=self.run_async))
+
+    def schedule(self, cost: str, callback):
+        """
+        Wrap a ptb callback, such that it is run on the scheduler
+        lane for the given cost class instead of the calling thread
+        """
+        if not self.scheduled:
+            return run_to_completion(callback)
+
+        def submit(update: Update, context: CallbackContext) -> bool:
+            """ whether the update was admitted """
+            if not scheduler.submit(cost, callback, update, context):
+                logging.getLogger('herbert.RUNTIME').info('Rejected update %s, lane %s is full', update.update_id, cost)
+                scheduler.submit(scheduler.COST_CHEAP, reject_busy, update, context)
+                return False
+            return True
+
+        return submit
 
     def start(self) -> None:
-        self.updater.start_polling()
+        if self.scheduled:
+            scheduler.start()
+
+        if self.metrics_writer is not None:
+            self.metrics_writer.start()
+
+        if self.webhook is None:
+            if self.drain_backlog:
+                self.catch_up()
+            self.updater.start_polling()
+        else:
+            self.start_webhook(self.webhook)
+
+    def catch_up(self) -> None:
+        """ queue the pending updates that are still worth answering for dispatch """
+        try:
+            updates, self.backlog_report = drain(self.bot)
+        except TelegramError as err:
+            # e.g. a webhook is still registered, start_polling removes it
+            logging.getLogger('herbert.SETUP').warning('Could not drain the backlog: %s', err)
+            return
+
+        for update in updates:
+            self.dispatcher.update_queue.put(update)
+
+    def start_webhook(self, config: WebhookConfig) -> None:
+        """
+        run the dispatcher and feed it from the webhook listener,
+        registering the webhook with telegram if public_url is set
+        """
+        dispatcher = self.dispatcher
+        ready = Event()
+        Thread(target=dispatcher.start, kwargs={'ready': ready}, name='herbert-dispatcher', daemon=True).start()
+        ready.wait()
+
+        self.webhook_server = WebhookServer(config, self.bot, dispatcher.update_queue)
+        self.webhook_server.start()
+        logging.getLogger('herbert.SETUP').info('Listening for updates on %s:%d%s',
+                                                config.listen, self.webhook_server.server_port, config.path)
+
+        if config.public_url is not None:
+            self.bot.set_webhook(config.public_url, max_connections=config.listeners,
+                                 secret_token=config.secret_token)
+
+    def stop(self) -> None:
+        """ stop receiving and dispatching updates """
+        if self.webhook_server is not None:
+            self.webhook_server.stop()
+            self.webhook_server = None
+            self.dispatcher.stop()
+        else:
+            self.updater.stop()
+
+        if self.metrics_writer is not None:
+            self.metrics_writer.stop()
 
     def idle(self) -> None:
         """ start the updater event loop """
         self.start()
-        self.updater.idle()
+        if self.webhook is None:
+            self.updater.idle()
+            return
+
+        stopped = Event()
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+            signal.signal(signum, lambda *_: stopped.set())
+
+        stopped.wait()
+        self.stop()
+
+
+def reject_busy(update: Update, context: CallbackContext):
+    """ tell the user that their command could not be admitted """
+    if update.message is not None:
+        # through the send queue like every other reply, the chat may be flooding us
+        send_message(prerendered.text(ERROR_BUSY, parse_mode=None), ChatContext(context.bot, update.message))
+
+
+def run_to_completion(callback):
+    """
+    Make coroutine callbacks callable from a plain thread,
+    by running each call on its own event loop
+    """
+    if not inspect.iscoroutinefunction(callback):
+        return callback
+
+    @wraps(callback)
+    def run(*args, **kwargs):
+        return asyncio.run(callback(*args, **kwargs))
+
+    return run
 
 
 def handle_inline_query(update: Update, context: CallbackContext, line=None):
@@ -101,17 +355,17 @@ def handle_inline_query(update: Update, context: CallbackContext, line=None):
 
     command, *args = query.split(" ")
 
-    for alias, name in inline_aliases.items():
-        if command == alias:
-            inline_methods[name](
-                update,
-                context,
-                inline=True,
-                inline_query=update.inline_query,
-                inline_args=args
-            )
+    name = inline_aliases.get(command)
+    if name is not None:
+        run_to_completion(inline_methods[name])(
+            update,
+            context,
+            inline=True,
+            inline_query=update.inline_query,
+            inline_args=args
+        )
 
-            return True
+        return True
 
     if update.inline_query:
         update.inline_query.answer([
@@ -1,34 +1,48 @@
 """
 Define all the decorators!
 """
+import asyncio
+import inspect
 import logging
 from datetime import datetime, timedelta
 from functools import wraps
-from typing import Callable, TypeVar, List
-from dataclasses import dataclass
+from types import MethodType
+from typing import Any, Awaitable, Callable, TypeVar, List, Optional, overload
+from dataclasses import dataclass, field
 import re
+from concurrent.futures import TimeoutError as FutureTimeout
 
 import telegram.error
 from telegram.ext import CallbackQueryHandler, CallbackContext
 from telegram import Update
 
-from basebert import BaseBert
+from basebert import BaseBert, collect_replies, invocation_context
 from common.basic_decorators import argdecorator
 from common.herbert_utils import is_cmd_decorated
 from common.constants import ERROR_FAILED, ERROR_TEMPLATE, \
-    BAD_ERROR_TEMPLATE, EMOJI_EXPLOSION, EMOJI_WARN, ONLY_BASIC_HELP
+    BAD_ERROR_SUFFIX, EMOJI_EXPLOSION, EMOJI_WARN, ONLY_BASIC_HELP
 from common.chatformat import render_style_para, STYLE_BACKEND
 from common.prefixhandler import HerbotPrefixHandler
-from common import reply_data
+from common import metrics, profiling, reply_data
+from common.deadline import DeadlineExceeded, deadline_scope, exceeded, remaining
+from common.singleflight import flights, flight_key
+from common.inline_cache import inline_results, PAGE_TTL
+from common.reply import answer_inline
+from common.prerendered import prerendered, prerender, join_texts
+import executors
+import scheduler
+import core
 
 from herberror import Herberror, BadHerberror
 
 __all__ = [
     'pull_string', 'handle_herberrors', 'pull_bot_and_update',
-    'command', 'aliases', 'callback', 'doc'
+    'command', 'aliases', 'callback', 'doc', 'admin_only'
 ]
 
 reply_timeout = timedelta(seconds=120)
+# telegram's default, if an inline command does not declare its own
+INLINE_CACHE_TIME = 300
 Ret = TypeVar('Ret')
 
 
@@ -41,46 +55,114 @@ def pull_string(text: str) -> str:
     return splits[1] if len(splits) >= 2 else ""
 
 
-def handle_herberrors(method: Callable[[BaseBert, ...], Ret]) -> Callable[[BaseBert, ...], Ret]:
+def _error_reply(error: Exception) -> Optional[reply_data.Text]:
+    """
+    Log and count an error raised by a command handler,
+    and return what to tell the user about it, if anything
+    """
+    log = logging.getLogger('herbert.RUNTIME')
+
+    metrics.record_error(expected=isinstance(error, Herberror),
+                         deadline_exceeded=isinstance(error, DeadlineExceeded))
+
+    if isinstance(error, Herberror):
+        emoji = EMOJI_EXPLOSION if isinstance(error, BadHerberror) else EMOJI_WARN
+        res_text = prerender(ERROR_TEMPLATE.format(emoji, " ".join(error.args)), disable_web_page_preview=True)
+        if isinstance(error, BadHerberror):
+            res_text = join_texts(res_text, prerendered.text(BAD_ERROR_SUFFIX))
+        msg, = error.args
+        log.debug('Herberror: "%s"', msg, exc_info=error)
+        return res_text
+
+    if isinstance(error, telegram.error.RetryAfter):
+        log.info('Flood control exceeded, retry after %.1fs', error.retry_after)
+
+    elif isinstance(error, telegram.error.TimedOut):
+        log.info('Timed out')
+
+    elif isinstance(error, telegram.error.NetworkError):
+        log.info('Connection Failed or message rejected by telegram API')
+
+    else:
+        return prerendered.text(ERROR_FAILED)
+
+    return None
+
+
+def _unexpected(error: Exception) -> bool:
+    return not isinstance(error, (Herberror, telegram.error.NetworkError))
+
+
+def _report_error(bert: BaseBert, error: Exception) -> None:
+    """
+    Tell the user about an error raised by a command handler.
+    Has to be called from an except block, exceptions that are
+    not expected are re-raised after a generic message was sent
+    """
+    reply = _error_reply(error)
+    if reply is not None:
+        bert.send(reply)
+    if _unexpected(error):
+        raise error
+
+
+async def _areport_error(bert: BaseBert, error: Exception) -> None:
+    """
+    coroutine version of _report_error, which does not
+    block the event loop while the reply is sent
+    """
+    reply = _error_reply(error)
+    if reply is not None:
+        await bert.asend(reply)
+    if _unexpected(error):
+        raise error
+
+
+@overload
+def handle_herberrors(method: Callable[..., Awaitable[Ret]]) -> Callable[..., Awaitable[Optional[Ret]]]:
+    ...
+
+
+@overload
+def handle_herberrors(method: Callable[..., Ret]) -> Callable[..., Optional[Ret]]:
+    ...
+
+
+def handle_herberrors(method: Callable[..., Any]) -> Callable[..., Any]:
     """
     Returns a wrapper around `method`, which in turn
     Catches `Herberror` and sends the argument of the exception as a message
-    to the user. When an exception of any other type is caught, it will send
-    a default error message to the user and raise it again.
+    to the user. Telegram's network errors (flood control, time outs) are
+    only logged, as there is no point in sending a message about them.
+    When an exception of any other type is caught, it will send a default
+    error message to the user and raise it again. The wrapper returns
+    None when an error was caught.
+
+    Coroutine functions get a coroutine function wrapper.
     """
 
+    if inspect.iscoroutinefunction(method):
+        @wraps(method)
+        async def wrapped_async(self: BaseBert, *args, **kwargs):
+            try:
+                return await method(self, *args, **kwargs)
+            except Exception as error:  # pylint: disable = broad-except
+                await _areport_error(self, error)
+
+            return None
+
+        return wrapped_async
+
     @wraps(method)
     def wrapped(self: BaseBert, *args, **kwargs):
         """
         Functional wrapper to handle errors a command_handler
         might throw as well as errors that are entirely unexpected
         """
-        log = logging.getLogger('herbert.RUNTIME')
-
         try:
             return method(self, *args, **kwargs)
-
-        except Herberror as error:
-            template = ERROR_TEMPLATE
-            emoji = EMOJI_WARN
-            if isinstance(error, BadHerberror):
-                template = BAD_ERROR_TEMPLATE
-                emoji = EMOJI_EXPLOSION
-
-            res_text = template.format(emoji, " ".join(error.args))
-            self.reply_text(res_text, disable_web_page_preview=True)
-            msg, = error.args
-            log.debug('Herberror: "%s"', msg, exc_info=error)
-
-        except telegram.error.TimedOut:
-            log.info('Timed out')
-
-        except telegram.error.NetworkError:
-            log.info('Connection Failed or message rejected by telegram API')
-
-        except Exception:
-            self.reply_text(ERROR_FAILED)
-            raise
+        except Exception as error:  # pylint: disable = broad-except
+            _report_error(self, error)
 
         return None
 
@@ -92,8 +174,8 @@ def pull_bot_and_update(bound_method, pass_update=False, pass_query=True,
     """
     Returns a wrapper around bound_method, configured as per
     the **kwargs to this function. The wrapper will
-    update `bot` and `update` of the bot instance of the
-    bound method before calling it. It will also provide
+    install the reply context for this invocation
+    before calling it. It will also provide
     - an argument string, iff pass_string is true
     - an update-object, iff pass_update is true
     - a callback-query object, if such object exists and
@@ -102,22 +184,15 @@ def pull_bot_and_update(bound_method, pass_update=False, pass_query=True,
     When the wrapper is called with inline=True, it will additionally
     provide access to the objects required to reply to an inline
     query.
-    """
 
-    @wraps(bound_method)
-    def wrapped(update: Update, context: CallbackContext, inline=False, inline_query=None,
-                inline_args=None, **kwargs):
+    If bound_method is a coroutine function, so is the wrapper.
 
-        if inline_args is None:
-            inline_args = []
-
-        args = (context.args,) if pass_args else tuple()
-
-        bound_method.__self__.context = (
-            reply_data.InlineContext(context.bot, inline_query) if inline else
-            reply_data.ChatContext(context.bot, update.message)
-        )
+    Invocations of plain functions are profiled on request (see common.profiling)
+    """
 
+    def prepare(update: Update, context: CallbackContext, inline, inline_query, inline_args):
+        """ return the reply context and the arguments, or None if the update is too old """
+        # before anything is built for a message nobody waits for anymore
         if update.message is not None:
             delta = datetime.now().astimezone() - update.message.date.replace()
             if delta > reply_timeout:
@@ -127,6 +202,16 @@ def pull_bot_and_update(bound_method, pass_update=False, pass_query=True,
                              reply_timeout.seconds)
                 return None
 
+        if inline_args is None:
+            inline_args = []
+
+        args = (context.args,) if pass_args else tuple()
+
+        reply_context = (
+            reply_data.InlineContext(context.bot, inline_query) if inline else
+            reply_data.ChatContext(context.bot, update.message)
+        )
+
         if pass_args and inline:
             args = (inline_args,)
 
@@ -137,15 +222,276 @@ def pull_bot_and_update(bound_method, pass_update=False, pass_query=True,
             args = (update,) + args
 
         if pass_string:
-            string = pull_string(bound_method.__self__.message_text)
+            with invocation_context(reply_context):
+                string = pull_string(bound_method.__self__.message_text)
 
             args = (string,) + args
 
-        return bound_method(*args, **kwargs)
+        return reply_context, args
+
+    if inspect.iscoroutinefunction(bound_method):
+        @wraps(bound_method)
+        async def wrapped_async(update: Update, context: CallbackContext, inline=False, inline_query=None,
+                                inline_args=None, **kwargs):
+            prepared = prepare(update, context, inline, inline_query, inline_args)
+            if prepared is None:
+                return None
+
+            reply_context, args = prepared
+            with invocation_context(reply_context):
+                return await bound_method(*args, **kwargs)
+
+        return wrapped_async
+
+    @wraps(bound_method)
+    def wrapped(update: Update, context: CallbackContext, inline=False, inline_query=None,
+                inline_args=None, **kwargs):
+        prepared = prepare(update, context, inline, inline_query, inline_args)
+        if prepared is None:
+            return None
+
+        reply_context, args = prepared
+        with invocation_context(reply_context), profiling.profiled(bound_method.__name__):
+            return bound_method(*args, **kwargs)
 
     return wrapped
 
 
+def inline_cached(callback, name: str, cache_time: int, personal: bool):
+    """
+    Wrap the ptb callback of an inline command, such that inline
+    invocations are answered from (and stored in) the inline result
+    cache (see common.inline_cache), one page at a time. The replies
+    of the handler are collected and answered all at once.
+
+    cache_time and personal are passed on to telegram as well, commands
+    with a cache_time of 0 always run for a new query (not for its later pages).
+    Answers of failed invocations are neither cached here nor by telegram
+    """
+
+    def lookup(inline_query, inline_args):
+        key = (name, ' '.join(' '.join(inline_args or []).split()),
+               inline_query.from_user.id if personal else None)
+        if cache_time == 0 and not inline_query.offset:
+            return key, None
+        return key, inline_results.get(key)
+
+    def answer(inline_query, key, replies, failed: bool):
+        if failed:
+            answer_inline(inline_query, replies, 0, personal)
+            return
+        inline_results.put(key, replies, max(cache_time, PAGE_TTL))
+        answer_inline(inline_query, replies, cache_time, personal)
+
+    if inspect.iscoroutinefunction(callback):
+        @wraps(callback)
+        async def cached_async(update: Update, context: CallbackContext, inline=False, inline_query=None,
+                               inline_args=None, **kwargs):
+            if not inline:
+                return await callback(update, context, **kwargs)
+
+            key, replies = lookup(inline_query, inline_args)
+            if replies is not None:
+                answer_inline(inline_query, replies, cache_time, personal)
+                return None
+
+            # handle_herberrors turns errors into replies, which must not be cached
+            with collect_replies() as replies, metrics.collect_errors() as errors:
+                try:
+                    await callback(update, context, inline=True, inline_query=inline_query,
+                                   inline_args=inline_args, **kwargs)
+                except Exception:
+                    answer(inline_query, key, replies, failed=True)
+                    raise
+            answer(inline_query, key, replies, failed=bool(errors))
+            return None
+
+        return cached_async
+
+    @wraps(callback)
+    def cached(update: Update, context: CallbackContext, inline=False, inline_query=None,
+               inline_args=None, **kwargs):
+        if not inline:
+            return callback(update, context, **kwargs)
+
+        key, replies = lookup(inline_query, inline_args)
+        if replies is not None:
+            answer_inline(inline_query, replies, cache_time, personal)
+            return None
+
+        # handle_herberrors turns errors into replies, which must not be cached
+        with collect_replies() as replies, metrics.collect_errors() as errors:
+            try:
+                callback(update, context, inline=True, inline_query=inline_query, inline_args=inline_args, **kwargs)
+            except Exception:
+                answer(inline_query, key, replies, failed=True)
+                raise
+        answer(inline_query, key, replies, failed=bool(errors))
+        return None
+
+    return cached
+
+
+def detached(bound_method, pool: str):
+    """
+    Returns a replacement for bound_method, which runs the
+    actual handler in a worker process of the given pool
+    and delivers its replies from the calling process.
+
+    The handler reported its own errors in the worker already,
+    only the failures of the pool itself are reported here
+    """
+    @wraps(bound_method)
+    def run_detached(self: BaseBert, *args, **kwargs):
+        try:
+            replies, error, errors = executors.run_bert_method(pool, bound_method, args, kwargs)
+        except Exception as err:  # pylint: disable = broad-except
+            # out of time, or the worker died
+            return _report_error(self, err)
+
+        for reply in replies:
+            self.send(reply)
+        for expected, deadline_exceeded in errors:
+            metrics.record_error(expected, deadline_exceeded)
+
+        if error is not None:
+            # already reported, but it still needs to be logged
+            raise error
+        return None
+
+    return MethodType(run_detached, bound_method.__self__)
+
+
+def coalesced(bound_method, name: str):
+    """
+    Returns a replacement for bound_method, which shares a single
+    execution between identical concurrent invocations of command
+    `name` (see common.singleflight). The replies of that execution
+    are sent into the reply context of every invocation
+    """
+    if inspect.iscoroutinefunction(bound_method):
+        @wraps(bound_method)
+        async def run_coalesced_async(self: BaseBert, *args, **kwargs):
+            key = flight_key(name, self.context, args, kwargs)
+            if key is None:
+                return await bound_method(*args, **kwargs)
+
+            outcome = None
+            while outcome is None:
+                future, leader = flights.join(key)
+                if leader:
+                    error = None
+                    with collect_replies() as replies:
+                        try:
+                            await bound_method(*args, **kwargs)
+                        except Exception as err:  # pylint: disable = broad-except
+                            error = err
+                        except BaseException:
+                            # cancelled (deadline, superseded inline query),
+                            # one of the waiters has to run it instead
+                            flights.finish(key, future, None)
+                            raise
+                    flights.finish(key, future, (replies, error))
+
+                outcome = await asyncio.wrap_future(future)
+
+            replies, error = outcome
+            for reply in replies:
+                await self.asend(reply)
+
+            if error is not None:
+                raise error
+            return None
+
+        return MethodType(run_coalesced_async, bound_method.__self__)
+
+    @wraps(bound_method)
+    def run_coalesced(self: BaseBert, *args, **kwargs):
+        key = flight_key(name, self.context, args, kwargs)
+        if key is None:
+            return bound_method(*args, **kwargs)
+
+        outcome = None
+        while outcome is None:
+            future, leader = flights.join(key)
+            if leader:
+                error = None
+                with collect_replies() as replies:
+                    try:
+                        bound_method(*args, **kwargs)
+                    except Exception as err:  # pylint: disable = broad-except
+                        error = err
+                    except BaseException:
+                        # interrupted (worker deadline, shutdown),
+                        # one of the waiters has to run it instead
+                        flights.finish(key, future, None)
+                        raise
+                flights.finish(key, future, (replies, error))
+
+            try:
+                outcome = future.result(remaining())
+            except FutureTimeout as err:
+                raise exceeded() from err
+
+        replies, error = outcome
+
+        for reply in replies:
+            self.send(reply)
+
+        if error is not None:
+            raise error
+        return None
+
+    return MethodType(run_coalesced, bound_method.__self__)
+
+
+def bounded(bound_method, seconds: float):
+    """
+    Returns a replacement for bound_method, which runs it
+    within a deadline of `seconds` (see common.deadline).
+    Coroutines are cancelled once the deadline passed
+    """
+    if inspect.iscoroutinefunction(bound_method):
+        @wraps(bound_method)
+        async def run_bounded_async(self: BaseBert, *args, **kwargs):
+            with deadline_scope(seconds):
+                try:
+                    return await asyncio.wait_for(bound_method(*args, **kwargs), seconds)
+                except asyncio.TimeoutError:
+                    return await _areport_error(self, exceeded())
+
+        return MethodType(run_bounded_async, bound_method.__self__)
+
+    # the handler reports its own errors, DeadlineExceeded included
+    @wraps(bound_method)
+    def run_bounded(_self: BaseBert, *args, **kwargs):
+        with deadline_scope(seconds):
+            return bound_method(*args, **kwargs)
+
+    return MethodType(run_bounded, bound_method.__self__)
+
+
+def instrumented(bound_method, name: str):
+    """
+    Returns a replacement for bound_method, which records
+    each invocation in the metrics of command `name`
+    """
+    if inspect.iscoroutinefunction(bound_method):
+        @wraps(bound_method)
+        async def measured_async(_self: BaseBert, *args, **kwargs):
+            with metrics.measure_invocation(name):
+                return await bound_method(*args, **kwargs)
+
+        return MethodType(measured_async, bound_method.__self__)
+
+    @wraps(bound_method)
+    def measured(_self: BaseBert, *args, **kwargs):
+        with metrics.measure_invocation(name):
+            return bound_method(*args, **kwargs)
+
+    return MethodType(measured, bound_method.__self__)
+
+
 @dataclass
 class PassedInfoType:
     """
@@ -173,8 +519,14 @@ class CmdHandlerProperties:
     register_help: bool
     help_summary: str
     help_detailed: str
-    pass_info: PassedInfoType = PassedInfoType(pass_string=True)
+    pass_info: PassedInfoType = field(default_factory=lambda: PassedInfoType(pass_string=True))
     allow_inline: bool = False
+    executor: Optional[str] = None
+    cost: str = scheduler.COST_IO
+    deadline: Optional[float] = None
+    coalesce: bool = False
+    inline_cache_time: int = INLINE_CACHE_TIME
+    inline_personal: bool = False
 
 
 class HerbertCmdHandlerInfo:
@@ -193,7 +545,9 @@ class HerbertCmdHandlerInfo:
         self.cache_err_handled_method = None
 
     @staticmethod
-    def generatefor(method, pass_info, allow_inline=False, register_help=True, **kwargs):
+    def generatefor(method, pass_info, allow_inline=False, register_help=True, executor=None,
+                    cost=scheduler.COST_IO, deadline=None, coalesce=False,
+                    inline_cache_time=INLINE_CACHE_TIME, inline_personal=False, **kwargs):
         """
         Create an instance of this class for a given method, by supplying the
         method name as the default command name and substituting default values
@@ -209,7 +563,13 @@ class HerbertCmdHandlerInfo:
                 aliases=[method.__name__],
                 register_help=register_help,
                 help_summary=summary,
-                help_detailed=fulltext
+                help_detailed=fulltext,
+                executor=executor,
+                cost=cost,
+                deadline=deadline,
+                coalesce=coalesce,
+                inline_cache_time=inline_cache_time,
+                inline_personal=inline_personal
             ),
             **kwargs
         )
@@ -244,20 +604,41 @@ class HerbertCmdHandlerInfo:
 
     def handlers(self, member_method):
         """
-        Generate the handlers ptb needs to call the function this is attached to
+        Generate the handlers ptb needs to call the function this is attached to.
+        Only needed for commands with additional ptb arguments (filters etc.),
+        everything else is dispatched via `routes` and the HerbotCommandRouter
         """
         def handlerfor(name):
             return HerbotPrefixHandler(name, self.invoke(member_method), **self.ptb_forward)
 
         return (handlerfor(name) for name in self.properties.aliases)
 
+    def routes(self, member_method):
+        """
+        Generate (command name, callback) pairs for the HerbotCommandRouter
+        """
+        callback = self.invoke(member_method)
+        return ((name, callback) for name in self.properties.aliases)
+
     def invoke(self, member_method):
         """
-        Function that gets invoked by the HerbotPrefixHandler
+        Function that gets invoked by the HerbotCommandRouter
         Propagates call to the actual command handler
         """
         pass_info = self.properties.pass_info
-        return pull_bot_and_update(
+        if self.properties.executor is not None:
+            member_method = detached(member_method, self.properties.executor)
+
+        if self.properties.coalesce:
+            member_method = coalesced(member_method, member_method.__name__)
+
+        if self.properties.deadline is not None:
+            member_method = bounded(member_method, self.properties.deadline)
+
+        name = member_method.__name__
+        member_method = instrumented(member_method, name)
+
+        callback = pull_bot_and_update(
             member_method,
             pass_update=pass_info.pass_update,
             pass_query=pass_info.pass_query,
@@ -265,14 +646,39 @@ class HerbertCmdHandlerInfo:
             pass_args=pass_info.pass_args
         )
 
+        if self.properties.allow_inline:
+            callback = inline_cached(callback, name, self.properties.inline_cache_time,
+                                     self.properties.inline_personal)
+        return callback
+
 
 @argdecorator
 def command(*args, pass_args=None, pass_update=False, pass_string=False,
-            register_help=True, allow_inline=False, **kwargs):
+            register_help=True, allow_inline=False, executor=None, cost=scheduler.COST_IO,
+            deadline=None, coalesce=False, inline_cache_time=INLINE_CACHE_TIME, inline_personal=False, **kwargs):
     """
     Attach this decorator to a method to generate a HerbertCmdHandlerInfo,
     which is in turn used in `core.py` to identify command handlers.
     The wrapped function will be called with the appropriate arguments.
+
+    executor='process' runs the handler in a worker process (see executors.py),
+    which is only useful for cpu-bound handlers that do not need the bot
+
+    cost selects the scheduler lane the command is run on (see scheduler.py)
+
+    deadline bounds an invocation to that many seconds (see common.deadline),
+    the user is told that it took too long once it passed
+
+    coalesce lets identical concurrent invocations share a single
+    execution (see common.singleflight), for handlers whose replies
+    only depend on their arguments
+
+    inline_cache_time (seconds) and inline_personal tell telegram and the
+    inline result cache (see common.inline_cache) how long the answer to an
+    inline query may be reused, and whether only for the same user
+
+    Handlers may be coroutine functions (async def), which are run on the
+    event loop of the async lane and should answer via `await self.asend...`
     """
 
     method, *args = args
@@ -281,6 +687,15 @@ def command(*args, pass_args=None, pass_update=False, pass_string=False,
         logging.getLogger('herbert.SETUP') \
                .warning('Ignoring arguments to @command (%s) on %s', args, method.__name__)
 
+    if executor is not None and executor not in executors.pools:
+        raise ValueError(f'Unknown executor {executor} for {method.__name__}')
+
+    if executor is not None and inspect.iscoroutinefunction(method):
+        raise ValueError(f'Coroutine handler {method.__name__} can not run in an executor')
+
+    if cost not in scheduler.COSTS:
+        raise ValueError(f'Unknown cost class {cost} for {method.__name__}')
+
     pass_args = pass_args if pass_args is not None else not pass_string
     pass_info = PassedInfoType(pass_string, pass_args, pass_update, False)
 
@@ -289,6 +704,12 @@ def command(*args, pass_args=None, pass_update=False, pass_string=False,
         pass_info=pass_info,
         allow_inline=allow_inline,
         register_help=register_help,
+        executor=executor,
+        cost=cost,
+        deadline=deadline,
+        coalesce=coalesce,
+        inline_cache_time=inline_cache_time,
+        inline_personal=inline_personal,
         **kwargs
     )
 
@@ -321,6 +742,7 @@ def callback(method=None, *, pass_update=False, pass_query=True, **kwargs):
         return CallbackQueryHandler(inner_callback, **kwargs)
 
     method.callback_query_handler = handler
+    method.callback_kwargs = kwargs  # for the manifest, see manifest.py
     return handle_herberrors(method)
 
 
@@ -339,3 +761,18 @@ def doc(method: Callable, docstring: str):
 
     method.__doc__ = render_style_para(docstring, target_style=STYLE_BACKEND)
     return method
+
+
+def admin_only(method: Callable):
+    """
+    Only allow the users listed in the admin file (see core.Herbert)
+    to invoke the decorated command. Has to be applied before @command
+    """
+    @wraps(method)
+    def wrapped(self: BaseBert, *args, **kwargs):
+        user = self.message.from_user if self.message else None
+        if user is None or user.id not in core.admins:
+            raise Herberror('You are not allowed to do that.')
+        return method(self, *args, **kwargs)
+
+    return wrapped
@@ -0,0 +1,290 @@
+"""
+Run work outside of the thread that handles an update
+
+CPU-heavy command handlers (@command(executor='process'))
+and helper functions (run_in_process) are executed in a
+bounded pool of worker processes, so a single large render
+does not stall every other chat.
+
+Command handlers running in a worker process do not
+have access to the bot; everything they send is collected
+in the worker and delivered by the parent process.
+"""
+import importlib
+import logging
+import multiprocessing
+import pickle
+import resource
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from basebert import BaseBert, collect_replies
+from common import deadline, metrics
+from common.metrics import Histogram
+from common.reply_data import ReplyData
+from herberror import Herberror
+
+__all__ = ['ProcessPool', 'ResourceLimitExceeded', 'pools', 'run_in_process', 'run_bert_method']
+
+DEFAULT_CPU_SECONDS = 30
+DEFAULT_MEMORY_BYTES = 1 << 30
+TEX_WORKERS = 2
+
+
+class ResourceLimitExceeded(Herberror):
+    """ a job used more cpu time or memory than it was allowed to """
+
+
+class _WorkerDeadline(BaseException):
+    """ interrupts a job at its deadline, not an Exception so handle_herberrors lets it pass """
+
+
+# state of the worker processes
+_in_worker = False
+_bert_instances: Dict[Tuple[str, str], BaseBert] = dict()
+
+
+def _on_cpu_limit(_signum, _frame):
+    raise ResourceLimitExceeded('That took way too much CPU time.')
+
+
+def _on_deadline(_signum, _frame):
+    raise _WorkerDeadline()
+
+
+def _init_worker() -> None:
+    # pylint: disable = global-statement
+    global _in_worker
+    _in_worker = True
+
+    # shutdown is handled by the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    signal.signal(signal.SIGALRM, _on_deadline)
+
+
+def _set_cpu_limit(seconds: Optional[float]) -> None:
+    """
+    RLIMIT_CPU counts the cpu time of the entire process,
+    so the limit for this job is relative to what
+    the worker already used
+    """
+    _soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = hard
+
+    if seconds is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _set_memory_limit(memory_bytes: Optional[int]) -> int:
+    """
+    limit the address space of the worker (and the processes it
+    starts) to memory_bytes, returns the previous soft limit
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if memory_bytes is not None:
+        limit = memory_bytes if hard == resource.RLIM_INFINITY else min(memory_bytes, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    return soft
+
+
+def _run_job(cpu_seconds: Optional[float], memory_bytes: Optional[int], wall_seconds: Optional[float],
+             func: Callable, args: tuple, kwargs: dict) -> Tuple[float, Any]:
+    started = time.time()
+    _set_cpu_limit(cpu_seconds)
+    memory_soft = _set_memory_limit(memory_bytes)
+    if wall_seconds is not None:
+        signal.setitimer(signal.ITIMER_REAL, max(wall_seconds, 1e-3))
+    try:
+        with deadline.deadline_scope(wall_seconds):
+            return started, func(*args, **kwargs)
+    except _WorkerDeadline as err:
+        raise deadline.exceeded() from err
+    except MemoryError as err:
+        raise ResourceLimitExceeded('That took way too much memory.') from err
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        _set_cpu_limit(None)
+        if memory_bytes is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_soft, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+
+def _picklable(error: Exception) -> Exception:
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:  # pylint: disable = broad-except
+        return RuntimeError(repr(error))
+
+
+def _call_bert_method(module: str, cls_name: str, method_name: str, args: tuple,
+                      kwargs: dict) -> Tuple[List[ReplyData], Optional[Exception], List[Tuple[bool, bool]]]:
+    key = (module, cls_name)
+    bert = _bert_instances.get(key)
+    if bert is None:
+        bert = getattr(importlib.import_module(module), cls_name)()
+        _bert_instances[key] = bert
+
+    # the invocation is measured by the parent, it needs to know about the errors
+    with collect_replies() as replies, metrics.collect_errors() as errors:
+        try:
+            getattr(bert, method_name)(*args, **kwargs)
+        except Exception as err:  # pylint: disable = broad-except
+            # handle_herberrors already queued a reply, the
+            # parent needs to deliver it before re-raising
+            return replies, _picklable(err), errors
+
+    return replies, None, errors
+
+
+class ProcessPool:
+    """
+    A bounded pool of worker processes with per-job
+    cpu time and memory limits, and some bookkeeping
+    about how long jobs have to wait for a free worker
+    """
+
+    def __init__(self, name: str, max_workers: int = 2, cpu_seconds: Optional[float] = DEFAULT_CPU_SECONDS,
+                 memory_bytes: Optional[int] = DEFAULT_MEMORY_BYTES):
+        self.name = name
+        self.max_workers = max_workers
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.failed = 0
+        self.wait_time = Histogram()
+        self.run_time = Histogram()
+
+    @property
+    def queue_depth(self) -> int:
+        """ number of jobs waiting for a free worker """
+        return max(0, self.in_flight - self.max_workers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        run func(*args, **kwargs) in a worker process and
+        return its result. func and all arguments need to
+        be picklable.
+
+        Within a deadline (see common.deadline), the job is
+        dropped or interrupted once the deadline passed
+        """
+        deadline.check()
+        wall_seconds = deadline.remaining()
+        submitted = time.time()
+        executor = self._get_executor()
+        with self._lock:
+            self.in_flight += 1
+            self.submitted += 1
+
+        try:
+            future = executor.submit(_run_job, self.cpu_seconds, self.memory_bytes, wall_seconds, func, args, kwargs)
+            try:
+                started, result = future.result(wall_seconds)
+            except FutureTimeout as err:
+                # a running job is interrupted by its own timer in the worker
+                future.cancel()
+                raise deadline.exceeded() from err
+
+        except BrokenProcessPool as err:
+            logging.getLogger('herbert.RUNTIME').warning('Worker of pool %s died, restarting pool', self.name)
+            self._discard(executor)
+            with self._lock:
+                self.failed += 1
+            raise ResourceLimitExceeded('The worker died. Probably out of resources.') from err
+
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        self.wait_time.observe(max(0.0, started - submitted))
+        self.run_time.observe(max(0.0, time.time() - started))
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """ current state of the pool """
+        return {
+            'workers': self.max_workers,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'submitted': self.submitted,
+            'failed': self.failed,
+            'wait': self.wait_time.summary(),
+            'run': self.run_time.summary(),
+        }
+
+    def shutdown(self) -> None:
+        """ stop all worker processes """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+pools: Dict[str, ProcessPool] = {
+    'process': ProcessPool('process'),
+    # each tex render runs pdflatex and pdftoppm, this bounds how many do at once.
+    # RLIMIT_AS would be inherited by them, and they bring their own memory limits
+    'tex': ProcessPool('tex', max_workers=TEX_WORKERS, memory_bytes=None),
+}
+
+
+def run_in_process(func: Callable, *args, pool: str = 'process', **kwargs) -> Any:
+    """
+    run func in the given process pool, or directly
+    if this already is a worker process
+    """
+    if _in_worker:
+        return func(*args, **kwargs)
+    return pools[pool].run(func, *args, **kwargs)
+
+
+def run_bert_method(pool: str, member_method: Callable, args: tuple, kwargs: dict
+                    ) -> Tuple[List[ReplyData], Optional[Exception], List[Tuple[bool, bool]]]:
+    """
+    run a command handler on a worker-local instance of its bert,
+    returns the collected replies, the unexpected exception
+    raised by the handler, if any, and the errors it reported
+    as (expected, deadline_exceeded), see metrics.record_error
+    """
+    bert = member_method.__self__  # type: ignore
+    return run_in_process(
+        _call_bert_method,
+        type(bert).__module__, type(bert).__qualname__, member_method.__name__, args, kwargs,
+        pool=pool
+    )
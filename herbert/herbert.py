@@ -3,32 +3,37 @@
 Beep boop ich bin eigentlich bloß die liste aller berts die was am doen sind
 """
 
+import importlib
 import sys
 import logging
-from inspect import getmembers, isclass
+import time
+from typing import List
 
+import core
 from core import Herbert
-import basebert
-
-# pylint: disable = unused-import
-from berts.asciimath import AsciiBert
-from berts.diamaltbert import DiaMaltBert
-from berts.gamebert import GameBert
-from berts.hashbert import HashBert
-from berts.helpbert import HelpBert
-from berts.hercurles import Hercurles
-from berts.interprert import InterpRert
-from berts.kalcbert import KalcBert
-from berts.ping import PingBert
-from berts.texbert import TexBert
-from berts.todobert import TodoBert
-from berts.xkcdert import XKCDert
-from berts.unicodert import UniCoDert
-from berts.stackbert import StackBert
-from berts.dudert import Dudert
-from berts.wikibert import WikiBert
-
-from berts.testbert import TestBert
+from manifest import MANIFEST_FILE, BertEntry, describe, read_manifest, write_manifest
+
+# (module, class) of all the berts, imported lazily if the manifest allows
+BERTS = [
+    ('berts.adminbert', 'AdminBert'),
+    ('berts.asciimath', 'AsciiBert'),
+    ('berts.diamaltbert', 'DiaMaltBert'),
+    ('berts.dudert', 'Dudert'),
+    ('berts.gamebert', 'GameBert'),
+    ('berts.hashbert', 'HashBert'),
+    ('berts.helpbert', 'HelpBert'),
+    ('berts.hercurles', 'Hercurles'),
+    ('berts.interprert', 'InterpRert'),
+    ('berts.kalcbert', 'KalcBert'),
+    ('berts.ping', 'PingBert'),
+    ('berts.stackbert', 'StackBert'),
+    ('berts.testbert', 'TestBert'),
+    ('berts.texbert', 'TexBert'),
+    ('berts.todobert', 'TodoBert'),
+    ('berts.unicodert', 'UniCoDert'),
+    ('berts.wikibert', 'WikiBert'),
+    ('berts.xkcdert', 'XKCDert'),
+]
 
 __all__ = ['main']
 
@@ -40,24 +45,56 @@ def configure_logs(log_lvl: int) -> None:
     logging.getLogger('herbert.RUNTIME').setLevel(log_lvl)
 
 
-def create_bot() -> Herbert:
-    """ perform some setup """
-    bot = Herbert()
+def import_bert(module: str, cls: str) -> type:
+    """ import a bert class, recording the time it took """
+    started = time.perf_counter()
+    bert_cls = getattr(importlib.import_module(module), cls)
+    core.import_costs[cls] = time.perf_counter() - started
+    return bert_cls
 
-    # Autoregister the included Berts
-    for _, c in getmembers(sys.modules[__name__], isclass):
-        if issubclass(c, basebert.BaseBert) and c is not basebert.BaseBert:
-            bot.register_bert(c)
+
+def create_bot(lazy=True, **herbert_args) -> Herbert:
+    """ perform some setup, herbert_args are passed on to Herbert """
+    bot = Herbert(**herbert_args)
+    manifest = read_manifest() if lazy else dict()
+    log = logging.getLogger('herbert.SETUP')
+
+    started = time.perf_counter()
+    for module, cls in BERTS:
+        entry = manifest.get((module, cls))
+        if entry is not None and entry.lazy and entry.current:
+            bot.register_lazy_bert(entry)
+        else:
+            if entry is not None:
+                log.warning('Manifest entry of %s is outdated, run `herbert.py --manifest`', cls)
+            bot.register_bert(import_bert(module, cls))
 
     bot.register_inline_handler()
 
+    log.info('Registered %d berts in %.0fms (%d deferred)', len(BERTS),
+             (time.perf_counter() - started) * 1000, len(core.lazy_berts))
+    for cls, seconds in sorted(core.import_costs.items(), key=lambda item: -item[1]):
+        log.info('  import %-12s %6.0fms', cls, seconds * 1000)
+
     return bot
 
 
+def generate_manifest() -> List[BertEntry]:
+    """ import all berts and write the manifest used for lazy loading """
+    entries = [describe(import_bert(module, cls)) for module, cls in BERTS]
+    write_manifest(entries)
+    print(f'Wrote {len(entries)} entries to {MANIFEST_FILE}')
+    return entries
+
+
 def main() -> None:
     """ main entrypoint, runs bot """
+    if '--manifest' in sys.argv:
+        generate_manifest()
+        return
+
     configure_logs(logging.DEBUG)
-    create_bot().idle()
+    create_bot(lazy='--eager' not in sys.argv).idle()
 
 
 if __name__ == '__main__':
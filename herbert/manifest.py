@@ -0,0 +1,223 @@
+"""
+Describe berts without importing them
+
+Importing every bert at startup pulls in PIL, lxml, the
+math parser tables, ... before the first update is handled.
+The manifest (berts/manifest.json) records what core needs
+to register a bert: its command names, aliases, costs and
+help texts, and the patterns of its callback handlers.
+A LazyBert registered from such an entry imports the actual
+module on the first invocation of one of its commands.
+
+The manifest is generated from the berts themselves,
+run `python3 herbert.py --manifest` after changing a bert.
+Entries are ignored if the module of the bert, one of its
+base classes or the decorators changed since, the bert is
+imported at startup as before then.
+"""
+import hashlib
+import importlib
+import importlib.util
+import inspect
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from os import path
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+from common.herbert_utils import is_cmd_decorated
+
+__all__ = ['CommandEntry', 'CallbackEntry', 'BertEntry', 'LazyBert', 'MANIFEST_FILE',
+           'describe', 'source_hash', 'sources', 'read_manifest', 'write_manifest', 'bert_callbacks']
+
+MANIFEST_FILE = path.join(path.dirname(path.abspath(__file__)), 'berts', 'manifest.json')
+
+
+@dataclass
+class CommandEntry:
+    """ a single command handler of a bert """
+    method: str
+    aliases: List[str]
+    cost: str
+    allow_inline: bool
+    coroutine: bool
+    register_help: bool
+    help_summary: str
+    help_detailed: str
+
+
+@dataclass
+class CallbackEntry:
+    """ a CallbackQueryHandler of a bert """
+    method: str
+    pattern: str
+    coroutine: bool
+
+
+@dataclass
+class BertEntry:
+    """
+    everything needed to register a bert without importing it.
+    lazy is False if the bert needs ptb handlers that can not
+    be described here (filters, ...)
+    """
+    module: str
+    cls: str
+    source_hash: str
+    lazy: bool
+    commands: List[CommandEntry] = field(default_factory=list)
+    callbacks: List[CallbackEntry] = field(default_factory=list)
+    # the modules source_hash covers
+    sources: List[str] = field(default_factory=list)
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        """ (module, class name) """
+        return self.module, self.cls
+
+    @property
+    def current(self) -> bool:
+        """ whether none of the sources changed since the entry was generated """
+        return self.source_hash == source_hash(*self.sources)
+
+
+def source_hash(*modules: str) -> str:
+    """ hash of the source files of modules, without importing them """
+    digest = hashlib.sha1()
+    for module in modules:
+        spec = importlib.util.find_spec(module)
+        if spec is None or spec.origin is None:
+            return ''
+
+        with open(spec.origin, 'rb') as fobj:
+            digest.update(fobj.read())
+    return digest.hexdigest()
+
+
+def sources(cls: type) -> List[str]:
+    """
+    the modules the manifest entry of cls depends on: the ones
+    of the classes it inherits from, and the decorators with their
+    defaults. The module of cls itself comes first
+    """
+    modules = [base.__module__ for base in cls.__mro__ if base.__module__ != 'builtins'] + ['decorators']
+    return list(dict.fromkeys(modules))
+
+
+def _own_members(cls: type):
+    """ functions of cls, except for the ones it just inherited """
+    for name, member in inspect.getmembers(cls, inspect.isfunction):
+        if not any(hasattr(base, name) for base in cls.__bases__):
+            yield name, member
+
+
+def describe(cls: type) -> BertEntry:
+    """ generate the manifest entry of a bert class """
+    modules = sources(cls)
+    entry = BertEntry(cls.__module__, cls.__qualname__, source_hash(*modules), lazy=True, sources=modules)
+
+    for name, member in _own_members(cls):
+        coroutine = inspect.iscoroutinefunction(member)
+
+        if is_cmd_decorated(member):
+            inf = member.cmdinfo
+            props = inf.properties
+            entry.lazy &= not inf.ptb_forward
+            entry.commands.append(CommandEntry(
+                name, list(props.aliases), props.cost, props.allow_inline, coroutine,
+                bool(props.register_help), props.help_summary, props.help_detailed
+            ))
+
+        elif hasattr(member, 'callback_query_handler'):
+            kwargs = dict(getattr(member, 'callback_kwargs', {}))
+            pattern = kwargs.pop('pattern', None)
+            # compiled patterns, callables, ... need the bert
+            entry.lazy &= not kwargs and isinstance(pattern, str)
+            entry.callbacks.append(CallbackEntry(name, pattern if isinstance(pattern, str) else '', coroutine))
+
+    return entry
+
+
+def read_manifest(fname: str = MANIFEST_FILE) -> Dict[Tuple[str, str], BertEntry]:
+    """ read all entries of a manifest file, by (module, class name) """
+    if not path.exists(fname):
+        return dict()
+
+    with open(fname, 'r') as fobj:
+        raw = json.load(fobj)
+
+    entries = dict()
+    for bert in raw:
+        entry = BertEntry(**{**bert, 'commands': [], 'callbacks': []})
+        entry.commands = [CommandEntry(**cmd) for cmd in bert['commands']]
+        entry.callbacks = [CallbackEntry(**cb) for cb in bert['callbacks']]
+        entries[entry.key] = entry
+
+    return entries
+
+
+def write_manifest(entries: List[BertEntry], fname: str = MANIFEST_FILE) -> None:
+    """ write the given entries to a manifest file """
+    with open(fname, 'w') as fobj:
+        json.dump([asdict(entry) for entry in entries], fobj, indent=1, ensure_ascii=False)
+        fobj.write('\n')
+
+
+def bert_callbacks(bert) -> Dict[str, Callable]:
+    """ the ptb callbacks of all command and callback query handlers of bert, by method name """
+    callbacks = dict()
+    for method in bert.enumerate_members():
+        if is_cmd_decorated(method):
+            callbacks[method.__name__] = method.cmdinfo.invoke(method)
+        elif hasattr(method, 'callback_query_handler'):
+            callbacks[method.__name__] = method.callback_query_handler(method).callback
+
+    return callbacks
+
+
+class LazyBert:
+    """
+    Stands in for a bert described by a manifest entry.
+    The bert module is imported, and the bert instantiated,
+    when one of its callbacks is called for the first time
+    """
+
+    def __init__(self, entry: BertEntry, on_load: Callable = lambda bert: None):
+        self.entry = entry
+        self.bert = None
+        self.import_seconds: Optional[float] = None
+        self._on_load = on_load
+        self._callbacks: Dict[str, Callable] = dict()
+        self._lock = Lock()
+
+    def load(self) -> Dict[str, Callable]:
+        """ import and instantiate the bert, if that did not happen yet """
+        with self._lock:
+            if self.bert is None:
+                started = time.perf_counter()
+                cls = getattr(importlib.import_module(self.entry.module), self.entry.cls)
+                bert = cls()
+                self.import_seconds = time.perf_counter() - started
+
+                self._callbacks = bert_callbacks(bert)
+                self.bert = bert
+                self._on_load(bert)
+                logging.getLogger('herbert.RUNTIME').info('Loaded %s on first use (%.0fms)',
+                                                          self.entry.cls, self.import_seconds * 1000)
+
+            return self._callbacks
+
+    def callback(self, method: str, coroutine: bool) -> Callable:
+        """ a ptb callback that loads the bert and then calls the callback of method """
+        if coroutine:
+            async def call_async(*args, **kwargs):
+                return await self.load()[method](*args, **kwargs)
+
+            return call_async
+
+        def call(*args, **kwargs):
+            return self.load()[method](*args, **kwargs)
+
+        return call
@@ -0,0 +1,221 @@
+"""
+Schedule command invocations by their cost
+
+Every command declares a cost class (@command(cost=...)).
+Each cost class is served by its own lane, a set of worker
+threads with a bounded number of admitted invocations, so a
+burst of slow renders can not delay a /ping.
+
+Handlers that are coroutine functions are run on the async
+lane, a single event loop thread, so thousands of pending
+lookups do not need thousands of threads. If the async lane
+is disabled, they are run to completion on their cost lane.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Condition, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional
+
+from common.metrics import Histogram
+
+__all__ = ['COST_CHEAP', 'COST_IO', 'COST_CPU', 'COSTS', 'Lane', 'AsyncLane',
+           'lanes', 'async_lane', 'submit', 'start', 'join']
+
+COST_CHEAP = 'cheap'  # answered from memory, e.g. /ping or /md5
+COST_IO = 'io'  # waiting on some remote server
+COST_CPU = 'cpu'  # rendering, calculating, ...
+
+COSTS = (COST_CHEAP, COST_IO, COST_CPU)
+
+
+class Lane:
+    """
+    Worker threads serving a single cost class.
+    At most max_admitted invocations are queued or running
+    at any time, everything beyond that is rejected.
+    """
+
+    def __init__(self, name: str, workers: int, max_admitted: int):
+        self.name = name
+        self.workers = workers
+        self.max_admitted = max_admitted
+
+        self._queue: Queue = Queue()
+        self._threads: List[Thread] = []
+        self._lock = Lock()
+
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_latency = Histogram()
+        self.run_time = Histogram()
+
+    def start(self) -> None:
+        """ start the worker threads, if they are not running yet """
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = Thread(target=self._work, name=f'herbert-{self.name}-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def submit(self, func: Callable, *args) -> bool:
+        """ queue func(*args), return False if the lane is full """
+        with self._lock:
+            if self.admitted >= self.max_admitted:
+                self.rejected += 1
+                return False
+            self.admitted += 1
+
+        self._queue.put((time.monotonic(), func, args))
+        return True
+
+    def join(self) -> None:
+        """ block until every admitted invocation is done """
+        self._queue.join()
+
+    def _work(self) -> None:
+        while True:
+            enqueued, func, args = self._queue.get()
+            started = time.monotonic()
+            self.queue_latency.observe(started - enqueued)
+
+            try:
+                if inspect.iscoroutinefunction(func):
+                    asyncio.run(func(*args))
+                else:
+                    func(*args)
+            except Exception:  # pylint: disable = broad-except
+                logging.getLogger('herbert.RUNTIME').exception('Unhandled exception in lane %s', self.name)
+            finally:
+                self.run_time.observe(time.monotonic() - started)
+                with self._lock:
+                    self.admitted -= 1
+                    self.completed += 1
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """ current state of the lane """
+        return {
+            'workers': self.workers,
+            'admitted': self.admitted,
+            'limit': self.max_admitted,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'queued': self.queue_latency.summary(),
+            'run': self.run_time.summary(),
+        }
+
+
+class AsyncLane:
+    """
+    Runs coroutine functions on an event loop in a
+    dedicated thread. Blocking work started from these
+    coroutines (loop.run_in_executor) is run on a small
+    thread pool.
+    """
+
+    def __init__(self, name: str, max_admitted: int, blocking_workers: int = 16):
+        self.name = name
+        self.max_admitted = max_admitted
+        self.blocking_workers = blocking_workers
+        self.enabled = True
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._idle = Condition()
+
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_latency = Histogram()
+        self.run_time = Histogram()
+
+    def start(self) -> None:
+        """ start the event loop thread, if it is not running yet """
+        with self._idle:
+            if self.loop is not None:
+                return
+
+            self.loop = asyncio.new_event_loop()
+            self.loop.set_default_executor(
+                ThreadPoolExecutor(self.blocking_workers, thread_name_prefix=f'herbert-{self.name}-blocking'))
+            Thread(target=self.loop.run_forever, name=f'herbert-{self.name}', daemon=True).start()
+
+    def submit(self, func: Callable, *args) -> bool:
+        """ schedule the coroutine func(*args), return False if the lane is full """
+        with self._idle:
+            if self.admitted >= self.max_admitted:
+                self.rejected += 1
+                return False
+            self.admitted += 1
+
+        assert self.loop is not None, 'AsyncLane has to be started first'
+        asyncio.run_coroutine_threadsafe(self._run(time.monotonic(), func, args), self.loop)
+        return True
+
+    def join(self) -> None:
+        """ block until every admitted coroutine is done """
+        with self._idle:
+            self._idle.wait_for(lambda: self.admitted == 0)
+
+    async def _run(self, enqueued: float, func: Callable, args: tuple) -> None:
+        started = time.monotonic()
+        self.queue_latency.observe(started - enqueued)
+
+        try:
+            await func(*args)
+        except Exception:  # pylint: disable = broad-except
+            logging.getLogger('herbert.RUNTIME').exception('Unhandled exception in lane %s', self.name)
+        finally:
+            self.run_time.observe(time.monotonic() - started)
+            with self._idle:
+                self.admitted -= 1
+                self.completed += 1
+                self._idle.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """ current state of the lane """
+        return {
+            'admitted': self.admitted,
+            'limit': self.max_admitted,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'queued': self.queue_latency.summary(),
+            'run': self.run_time.summary(),
+        }
+
+
+lanes: Dict[str, Lane] = {
+    COST_CHEAP: Lane(COST_CHEAP, workers=2, max_admitted=200),
+    COST_IO: Lane(COST_IO, workers=16, max_admitted=200),
+    COST_CPU: Lane(COST_CPU, workers=2, max_admitted=16),
+}
+
+
+async_lane = AsyncLane('async', max_admitted=4096)
+
+
+def submit(cost: str, func: Callable, *args) -> bool:
+    """ run func(*args) on the lane for cost, return False if it was rejected """
+    if async_lane.enabled and inspect.iscoroutinefunction(func):
+        return async_lane.submit(func, *args)
+    return lanes[cost].submit(func, *args)
+
+
+def start() -> None:
+    """ start all lanes """
+    for lane in lanes.values():
+        lane.start()
+
+    if async_lane.enabled:
+        async_lane.start()
+
+
+def join() -> None:
+    """ wait until all lanes are idle """
+    async_lane.join()
+    for lane in lanes.values():
+        lane.join()
@@ -0,0 +1,73 @@
+"""
+Backlog drain tests
+"""
+# pylint: disable = invalid-name
+import time
+from unittest import TestCase
+
+from telegram import Bot
+
+from backlog import BATCH_SIZE, drain
+
+
+class _Request:
+    """ hands out the pending updates like getUpdates would """
+
+    def __init__(self, pending):
+        self.pending = pending
+        self.calls = []
+
+    def post(self, url, data, timeout):
+        self.calls.append(dict(data))
+        offset = data.get('offset', 0)
+        self.pending = [raw for raw in self.pending if raw['update_id'] >= offset]
+        return self.pending[:data['limit']]
+
+
+def _message(update_id, date, text='/ping'):
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': date, 'text': text,
+        'chat': {'id': 42, 'type': 'private'}}}
+
+
+def _inline(update_id, user, query):
+    return {'update_id': update_id, 'inline_query': {
+        'id': str(update_id), 'query': query, 'offset': '',
+        'from': {'id': user, 'is_bot': False, 'first_name': 'user'}}}
+
+
+def _callback(update_id, user, data):
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'chat_instance': '1', 'data': data,
+        'from': {'id': user, 'is_bot': False, 'first_name': 'user'},
+        'message': {'message_id': 7, 'date': 0, 'chat': {'id': 42, 'type': 'private'}}}}
+
+
+class DrainTest(TestCase):
+    """ drain a mixed backlog and check which updates survive """
+
+    def runTest(self):
+        """ test """
+        now = int(time.time())
+        pending = [_message(i, now - 3600) for i in range(1, 2 * BATCH_SIZE + 1)]
+        pending += [
+            _message(1001, now),
+            _inline(1002, 1, 'md5 h'), _inline(1003, 1, 'md5 ha'), _inline(1004, 2, 'echo'),
+            _callback(1005, 1, 'a'), _callback(1006, 1, 'a'), _callback(1007, 1, 'b'),
+        ]
+
+        bot = Bot('123:test')
+        bot._request = _Request(pending)  # pylint: disable = protected-access
+        updates, report = drain(bot)
+
+        self.assertEqual([update.update_id for update in updates], [1001, 1003, 1004, 1006, 1007])
+        self.assertEqual(report.fetched, len(pending))
+        self.assertEqual(report.batches, 3)
+        self.assertEqual(report.dispatched, 5)
+        self.assertEqual(report.skipped['stale message'], 2 * BATCH_SIZE)
+        self.assertEqual(report.skipped['superseded inline'], 1)
+        self.assertEqual(report.skipped['superseded callback'], 1)
+
+        # the last fetch confirmed everything
+        self.assertEqual(bot.request.calls[-1]['offset'], 1008)
+        self.assertEqual(bot.request.pending, [])
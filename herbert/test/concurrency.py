@@ -0,0 +1,215 @@
+"""
+Concurrent invocation tests
+"""
+# pylint: disable = invalid-name
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+from unittest import TestCase
+
+from basebert import BaseBert
+from common import metrics
+from decorators import command
+from herberror import Herberror
+from scheduler import AsyncLane
+
+
+class RecordingBot:
+    """
+    Simulate telegram.Bot, remembering which text
+    was sent to which chat
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = []
+
+    def send_message(self, chat_id, text, *_args, **_kwargs):
+        """ simulate telegram.Bot.send_message """
+        with self.lock:
+            self.sent.append((chat_id, text))
+
+
+class FakeMessage:
+    """ Simulate telegram.Message """
+    def __init__(self, chat_id: int, text: str):
+        self.date = datetime.now().astimezone()
+        self.chat_id = chat_id
+        self.text = text
+
+
+class FakeUpdate:
+    """ Simulate telegram.Update """
+    def __init__(self, chat_id: int, text: str):
+        self.message = FakeMessage(chat_id, text)
+        self.callback_query = None
+
+
+@dataclass
+class FakeContext:
+    """ Simulate telegram.ext.CallbackContext """
+    bot: RecordingBot
+    args: List[str]
+
+
+class SlowEchoBert(BaseBert):
+    """ answers with its argument after yielding to other threads """
+
+    @command(pass_string=True)
+    def slowecho(self, string):
+        """ echo, but slowly """
+        time.sleep(random.random() / 500)
+        self.send_message(string, parse_mode=None)
+        time.sleep(random.random() / 500)
+        self.send_message(string, parse_mode=None)
+
+
+class AsyncEchoBert(BaseBert):
+    """ answers with its argument after waiting on the event loop """
+
+    @command(pass_string=True)
+    async def asyncecho(self, string):
+        """ echo, but asynchronously """
+        await asyncio.sleep(random.random() / 20)
+        await self.asend_message(string, parse_mode=None)
+
+
+class LoopCheckingBot(RecordingBot):
+    """ Simulate telegram.Bot, remembering whether it was called on a running event loop """
+    def __init__(self):
+        super().__init__()
+        self.on_loop = []
+
+    def send_message(self, chat_id, text, *args, **kwargs):
+        """ simulate telegram.Bot.send_message """
+        try:
+            asyncio.get_running_loop()
+            self.on_loop.append(True)
+        except RuntimeError:
+            self.on_loop.append(False)
+        super().send_message(chat_id, text, *args, **kwargs)
+
+
+class AsyncFailingBert(BaseBert):
+    """ fails on the event loop """
+
+    @command(pass_string=True, deadline=0.05)
+    async def asyncfail(self, string):
+        """ fail as expected, or take too long """
+        if string == 'slow':
+            await asyncio.sleep(1)
+        raise Herberror('no')
+
+
+class FailingBert(BaseBert):
+    """ fails in a worker process """
+
+    @command(executor='process')
+    def processfail(self, _args):
+        """ fail unexpectedly """
+        raise ValueError('broken')
+
+    @command(executor='process')
+    def processherb(self, _args):
+        """ fail as expected """
+        raise Herberror('no')
+
+
+class ConcurrentInvocationTest(TestCase):
+    """
+    Fire a lot of overlapping invocations at a single
+    bert instance and check that the replies never
+    leak into another chat
+    """
+
+    def runTest(self):
+        """ test """
+        bert = SlowEchoBert()
+        handler = bert.slowecho.cmdinfo.invoke(bert.slowecho)
+        bot = RecordingBot()
+        invocations = 400
+
+        def fire(chat_id):
+            handler(FakeUpdate(chat_id, f'/slowecho {chat_id}'), FakeContext(bot, [str(chat_id)]))
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            list(pool.map(fire, range(invocations)))
+
+        self.assertEqual(len(bot.sent), 2 * invocations)
+        for chat_id, text in bot.sent:
+            self.assertEqual(str(chat_id), text)
+
+        self.assertIsNone(bert.context)
+
+
+class AsyncInvocationTest(TestCase):
+    """
+    Keep a lot of coroutine handlers in flight at
+    once on a single event loop and a small thread pool
+    """
+
+    def runTest(self):
+        """ test """
+        bert = AsyncEchoBert()
+        handler = bert.asyncecho.cmdinfo.invoke(bert.asyncecho)
+        bot = RecordingBot()
+        invocations = 1000
+
+        lane = AsyncLane('test', max_admitted=invocations, blocking_workers=4)
+        lane.start()
+        threads_before = threading.active_count()
+
+        for chat_id in range(invocations):
+            self.assertTrue(lane.submit(handler, FakeUpdate(chat_id, f'/asyncecho {chat_id}'),
+                                        FakeContext(bot, [str(chat_id)])))
+
+        self.assertLessEqual(threading.active_count(), threads_before + lane.blocking_workers)
+        lane.join()
+
+        self.assertEqual(lane.completed, invocations)
+        self.assertEqual(len(bot.sent), invocations)
+        for chat_id, text in bot.sent:
+            self.assertEqual(str(chat_id), text)
+
+
+class DetachedErrorTest(TestCase):
+    """ errors of handlers in worker processes are reported once and counted by the parent """
+
+    def runTest(self):
+        """ test """
+        bert = FailingBert()
+        bot = RecordingBot()
+
+        fail = bert.processfail.cmdinfo.invoke(bert.processfail)
+        with self.assertRaises(ValueError):
+            fail(FakeUpdate(1, '/processfail'), FakeContext(bot, []))
+        self.assertEqual(len(bot.sent), 1)
+
+        herb = bert.processherb.cmdinfo.invoke(bert.processherb)
+        herb(FakeUpdate(1, '/processherb'), FakeContext(bot, []))
+        self.assertEqual(len(bot.sent), 2)
+        self.assertEqual(metrics.commands['processherb'].herberrors, 1)
+        self.assertEqual(metrics.commands['processfail'].failures, 1)
+
+
+class AsyncErrorTest(TestCase):
+    """ errors of coroutine handlers are reported without blocking the event loop """
+
+    def runTest(self):
+        """ test """
+        bert = AsyncFailingBert()
+        handler = bert.asyncfail.cmdinfo.invoke(bert.asyncfail)
+        bot = LoopCheckingBot()
+
+        lane = AsyncLane('test', max_admitted=2, blocking_workers=2)
+        lane.start()
+        for string in ('fast', 'slow'):
+            self.assertTrue(lane.submit(handler, FakeUpdate(1, f'/asyncfail {string}'), FakeContext(bot, [string])))
+        lane.join()
+
+        self.assertEqual(bot.on_loop, [False, False])
+        self.assertEqual(len([text for _, text in bot.sent if 'took too long' in text.lower()]), 1)
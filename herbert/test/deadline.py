@@ -0,0 +1,92 @@
+"""
+Deadline tests
+"""
+# pylint: disable = invalid-name, protected-access
+import asyncio
+import resource
+import time
+from unittest import TestCase
+
+from basebert import BaseBert
+from common import metrics
+from common.constants import ERROR_DEADLINE
+from common.deadline import DeadlineExceeded, deadline_scope, run_process
+from decorators import command
+import executors
+from executors import ProcessPool
+from test.concurrency import FakeContext, FakeUpdate, RecordingBot
+
+
+class DawdlingBert(BaseBert):
+    """ takes its time """
+
+    @command(pass_string=True, deadline=0.2)
+    async def dawdle(self, string):
+        """ sleep for the given number of seconds, then answer """
+        await asyncio.sleep(float(string))
+        await self.asend_message('done', parse_mode=None)
+
+
+class RunProcessTest(TestCase):
+    """ the process and everything it spawned are killed at the deadline """
+
+    def runTest(self):
+        """ test """
+        started = time.monotonic()
+        with deadline_scope(0.3), self.assertRaises(DeadlineExceeded):
+            run_process(('sh', '-c', 'sleep 10 & sleep 10; wait'))
+        self.assertLess(time.monotonic() - started, 2)
+
+        with deadline_scope(5):
+            self.assertEqual(run_process(('echo', 'hi'), encoding='utf8').stdout, 'hi\n')
+
+
+class ProcessPoolDeadlineTest(TestCase):
+    """ a job running past the deadline is interrupted and the worker reused """
+
+    def runTest(self):
+        """ test """
+        pool = ProcessPool('deadline-test', max_workers=1)
+        try:
+            pool.run(time.sleep, 0)
+
+            started = time.monotonic()
+            with deadline_scope(0.5), self.assertRaises(DeadlineExceeded):
+                pool.run(time.sleep, 30)
+            self.assertLess(time.monotonic() - started, 2)
+
+            with deadline_scope(10):
+                self.assertEqual(pool.run(abs, -3), 3)
+        finally:
+            pool.shutdown()
+
+
+class MemoryLimitTest(TestCase):
+    """ the address space is only limited while a job runs """
+
+    def runTest(self):
+        """ test """
+        before = resource.getrlimit(resource.RLIMIT_AS)
+        limit = 1 << 40 if before[1] == resource.RLIM_INFINITY else before[1]
+        _started, during = executors._run_job(None, limit, None, resource.getrlimit, (resource.RLIMIT_AS,), {})
+        self.assertEqual(during, (limit, before[1]))
+        self.assertEqual(resource.getrlimit(resource.RLIMIT_AS), before)
+
+
+class CommandDeadlineTest(TestCase):
+    """ a coroutine handler is cancelled and the user told so """
+
+    def runTest(self):
+        """ test """
+        bert = DawdlingBert()
+        handler = bert.dawdle.cmdinfo.invoke(bert.dawdle)
+        bot = RecordingBot()
+
+        asyncio.run(handler(FakeUpdate(1, '/dawdle 0'), FakeContext(bot, ['0'])))
+        asyncio.run(handler(FakeUpdate(2, '/dawdle 5'), FakeContext(bot, ['5'])))
+
+        self.assertEqual(bot.sent[0], (1, 'done'))
+        self.assertEqual(bot.sent[1][0], 2)
+        self.assertIn(ERROR_DEADLINE.format(0.2), bot.sent[1][1])
+        self.assertEqual(len(bot.sent), 2)
+        self.assertEqual(metrics.commands['dawdle'].deadline_exceeded, 1)
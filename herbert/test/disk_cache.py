@@ -0,0 +1,117 @@
+"""
+Disk cache tests
+"""
+# pylint: disable = invalid-name
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from berts import texbert
+from berts.texbert import TexBert, COMPILE_FAILED
+from common.disk_cache import DiskCache
+from test.concurrency import FakeContext, FakeUpdate, RecordingBot
+
+
+class PhotoBot(RecordingBot):
+    """ Simulate telegram.Bot, remembering the photos as well """
+    def __init__(self):
+        super().__init__()
+        self.photos = []
+
+    def send_photo(self, _chat_id, photo, **_kwargs):
+        """ simulate telegram.Bot.send_photo """
+        self.photos.append(photo.getvalue())
+
+
+class EvictionTest(TestCase):
+    """ expired and least recently used entries are removed """
+
+    def runTest(self):
+        """ test """
+        with tempfile.TemporaryDirectory() as directory:
+            cache = DiskCache(directory, max_bytes=3000, ttl=60)
+            for i in range(3):
+                cache.put(i, bytes(1000))
+            self.assertEqual(cache.get(1), bytes(1000))
+
+            # 0 was used least recently, 2 expired
+            now = time.time()
+            os.utime(cache._path(0), (now - 20, now - 20))  # pylint: disable=protected-access
+            os.utime(cache._path(2), (now, now - 120))  # pylint: disable=protected-access
+            self.assertIsNone(cache.get(2))
+
+            cache.put(3, bytes(1500))
+            cache.evict()
+            self.assertEqual([cache.get(i) is not None for i in range(4)], [False, True, False, True])
+
+
+class ConcurrentWritersTest(TestCase):
+    """ readers see a complete entry or none, while others rewrite it """
+
+    def runTest(self):
+        """ test """
+        with tempfile.TemporaryDirectory() as directory:
+            cache = DiskCache(directory, max_bytes=1 << 24, ttl=60)
+            values = [bytes([i]) * 100000 for i in range(4)]
+            seen = []
+
+            def write(value):
+                for _ in range(20):
+                    cache.put('formula', value)
+
+            def read():
+                for _ in range(200):
+                    data = cache.get('formula')
+                    if data is not None:
+                        seen.append(data in values)
+
+            threads = [threading.Thread(target=write, args=(value,)) for value in values]
+            threads += [threading.Thread(target=read) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertTrue(seen)
+            self.assertTrue(all(seen))
+            self.assertEqual(os.listdir(os.path.dirname(cache._path('formula'))),  # pylint: disable=protected-access
+                             [os.path.basename(cache._path('formula'))])  # pylint: disable=protected-access
+
+
+class TexCacheTest(TestCase):
+    """ equal sources are rendered once, failures are remembered for validation """
+
+    def runTest(self):
+        """ test """
+        renders = []
+
+        def render(_pre_level, source, _width, _invert, compile_key):
+            renders.append(source)
+            if 'undefined' in source:
+                texbert.tex_cache.put(compile_key, COMPILE_FAILED + b'Undefined control sequence.')
+                return texbert._raise_compile_error(COMPILE_FAILED + b'Undefined control sequence.')  # pylint: disable=protected-access
+            texbert.tex_cache.put(compile_key, b'')
+            return b'png'
+
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.object(texbert, 'tex_cache', DiskCache(directory, 1 << 20, 60)), \
+                patch.object(TexBert, '_render', staticmethod(render)):
+            bert = TexBert()
+            handler = bert.displaytex.cmdinfo.invoke(bert.displaytex)
+            texraw = bert.texraw.cmdinfo.invoke(bert.texraw)
+            bot = PhotoBot()
+
+            for source in ('\\sum', '  \\sum  ', '\\sum\r\n'):
+                handler(FakeUpdate(1, f'/dtex {source}'), FakeContext(bot, [source]))
+            self.assertEqual(bot.photos, [b'png'] * 3)
+            self.assertEqual(len(renders), 1)
+
+            texraw(FakeUpdate(1, '/texraw [pre=4, send=validate] \\sum'), FakeContext(bot, []))
+            for _ in range(2):
+                texraw(FakeUpdate(1, '/texraw [send=validate] \\undefined'), FakeContext(bot, []))
+            self.assertEqual(len(renders), 2)
+            self.assertEqual(len(bot.photos), 3)
+            self.assertEqual(len([text for _, text in bot.sent if 'Undefined control sequence' in text]), 2)
@@ -0,0 +1,97 @@
+"""
+Upload cache tests
+"""
+# pylint: disable = invalid-name
+import os
+import tempfile
+from datetime import datetime
+from io import BytesIO
+from unittest import TestCase
+
+from telegram import Chat, Document, Message, PhotoSize
+from telegram.error import BadRequest
+
+from common.file_ids import FileIdCache, content_key, file_ids
+from common.reply import SendReply
+from common.reply_data import ChatContext, File, Photo
+from test.concurrency import FakeMessage
+
+
+class UploadingBot:
+    """ Simulate telegram.Bot, answering uploads with a new file_id """
+    def __init__(self):
+        self.sent = []
+        self.expired = set()
+
+    def _message(self, **media):
+        return Message(len(self.sent), datetime.now(), Chat(1, Chat.PRIVATE), **media)
+
+    def send_photo(self, _chat_id, photo, **_kwargs):
+        """ simulate telegram.Bot.send_photo """
+        if photo in self.expired:
+            raise BadRequest('Wrong file identifier/http url specified')
+        self.sent.append(photo)
+        return self._message(photo=[PhotoSize(f'photo{len(self.sent)}', 'u', 1, 1)])
+
+    def send_document(self, _chat_id, document, **_kwargs):
+        """ simulate telegram.Bot.send_document """
+        self.sent.append(document)
+        return self._message(document=Document(f'document{len(self.sent)}', 'u'))
+
+
+class ContentKeyTest(TestCase):
+    """ the key depends on the content and kind of upload, not on the container """
+
+    def runTest(self):
+        """ test """
+        stream = BytesIO(b'\x89PNG data')
+        stream.seek(3)
+        self.assertEqual(content_key('photo', b'\x89PNG data'), content_key('photo', stream))
+        self.assertEqual(stream.tell(), 3)
+        self.assertNotEqual(content_key('photo', b'\x89PNG data'), content_key('document', b'\x89PNG data'))
+        self.assertEqual(content_key('photo', b'\x89PNG data')[1], 9)
+        self.assertIsNone(content_key('photo', 'https://example.org/image.png'))
+
+
+class PersistenceTest(TestCase):
+    """ the least recently used file_ids are evicted, the rest is saved in one go """
+
+    def runTest(self):
+        """ test """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache', 'file_ids.json')
+            cache = FileIdCache(path, max_entries=2)
+            cache.put('a', 'A')
+            cache.put('b', 'B')
+            cache.get('a')
+            cache.put('c', 'C')
+            self.assertFalse(os.path.exists(path))
+            cache.save()
+
+            loaded = FileIdCache()
+            loaded.load(path)
+            self.assertEqual((loaded.get('a'), loaded.get('b'), loaded.get('c')), ('A', None, 'C'))
+
+
+class ReuploadTest(TestCase):
+    """ content sent before is sent by file_id, unless telegram rejects it """
+
+    def runTest(self):
+        """ test """
+        bot = UploadingBot()
+        ctx = ChatContext(bot, FakeMessage(1, '/tex x'))
+        saved = file_ids.bytes_saved
+
+        for _ in range(3):
+            SendReply()(Photo(None, BytesIO(b'formula')), ctx)
+        SendReply()(File(None, BytesIO(b'formula'), 'formula.png'), ctx)
+
+        self.assertEqual(bot.sent[1:3], ['photo1', 'photo1'])
+        self.assertEqual(bot.sent[3].getvalue(), b'formula')
+        self.assertEqual(file_ids.bytes_saved - saved, 14)
+
+        bot.expired.add('photo1')
+        SendReply()(Photo(None, BytesIO(b'formula')), ctx)
+        SendReply()(Photo(None, BytesIO(b'formula')), ctx)
+        self.assertEqual(bot.sent[4].getvalue(), b'formula')
+        self.assertEqual(bot.sent[5], 'photo5')
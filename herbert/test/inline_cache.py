@@ -0,0 +1,141 @@
+"""
+Inline result cache tests
+"""
+# pylint: disable = invalid-name
+import time
+from unittest import TestCase
+
+from basebert import BaseBert
+from common.inline_cache import InlineResultCache
+from common.reply_data import Text
+from decorators import command
+from herberror import Herberror
+from test.concurrency import FakeContext, RecordingBot
+
+
+class FakeUser:
+    """ Simulate telegram.User """
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeInlineQuery:
+    """ Simulate telegram.InlineQuery, remembering the answers """
+    def __init__(self, query: str, offset: str = '', user_id: int = 1):
+        self.query = query
+        self.offset = offset
+        self.from_user = FakeUser(user_id)
+        self.answers = []
+
+    def answer(self, results, **hints):
+        """ simulate telegram.InlineQuery.answer """
+        self.answers.append((results, hints))
+
+
+class FakeInlineUpdate:
+    """ Simulate the telegram.Update of an inline query """
+    def __init__(self, inline_query: FakeInlineQuery):
+        self.inline_query = inline_query
+        self.message = None
+        self.callback_query = None
+
+
+class ManyResultsBert(BaseBert):
+    """ answers with a long list """
+
+    def __init__(self):
+        super().__init__()
+        self.executions = 0
+
+    @command(allow_inline=True, inline_cache_time=60)
+    def many(self, args):
+        """ one result per number """
+        self.executions += 1
+        for i in range(int(args[0])):
+            self.send(Text(f'result {i}'))
+
+
+class FlakyInlineBert(BaseBert):
+    """ fails the first time """
+
+    def __init__(self):
+        super().__init__()
+        self.executions = 0
+
+    @command(allow_inline=True, inline_cache_time=3600)
+    def flaky(self, _args):
+        """ a Herberror, then a result """
+        self.executions += 1
+        if self.executions == 1:
+            raise Herberror('not yet')
+        self.send(Text('now'))
+
+
+class InlineResultCacheTest(TestCase):
+    """ least recently used entries and expired ones are gone """
+
+    def runTest(self):
+        """ test """
+        cache = InlineResultCache(max_entries=2)
+        cache.put('a', [Text('a')], 60)
+        cache.put('b', [Text('b')], 60)
+        self.assertIsNotNone(cache.get('a'))
+        cache.put('c', [Text('c')], 60)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), [Text('a')])
+
+        cache.put('d', [Text('d')], 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('d'))
+
+
+class InlinePagingTest(TestCase):
+    """ a long result list is run once and paged via next_offset """
+
+    def runTest(self):
+        """ test """
+        bert = ManyResultsBert()
+        callback = bert.many.cmdinfo.invoke(bert.many)
+        context = FakeContext(RecordingBot(), [])
+
+        offset, pages = '', []
+        while True:
+            query = FakeInlineQuery('many 45', offset)
+            callback(FakeInlineUpdate(query), context, inline=True, inline_query=query, inline_args=['45'])
+            (results, hints), = query.answers
+            pages.append([result.input_message_content.message_text for result in results])
+            self.assertEqual(hints['cache_time'], 60)
+            offset = hints['next_offset']
+            if not offset:
+                break
+
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        self.assertEqual(sum(pages, []), [f'result {i}' for i in range(45)])
+        self.assertEqual(len({result.id for result in results}), 5)
+
+        # a different user typing the same query gets the cached answer
+        query = FakeInlineQuery('many  45', user_id=2)
+        callback(FakeInlineUpdate(query), context, inline=True, inline_query=query, inline_args=['', '45'])
+        self.assertEqual(len(query.answers[0][0]), 20)
+        self.assertEqual(bert.executions, 1)
+
+
+class InlineErrorTest(TestCase):
+    """ an error reply is neither cached nor cacheable by telegram """
+
+    def runTest(self):
+        """ test """
+        bert = FlakyInlineBert()
+        callback = bert.flaky.cmdinfo.invoke(bert.flaky)
+        context = FakeContext(RecordingBot(), [])
+
+        hints = []
+        for _ in range(2):
+            query = FakeInlineQuery('flaky')
+            callback(FakeInlineUpdate(query), context, inline=True, inline_query=query, inline_args=[])
+            hints.append(query.answers[0][1]['cache_time'])
+
+        self.assertEqual(bert.executions, 2)
+        self.assertEqual(hints, [0, 3600])
+        self.assertEqual(query.answers[0][0][0].input_message_content.message_text, 'now')
@@ -0,0 +1,76 @@
+"""
+Inline debouncing tests
+"""
+# pylint: disable = invalid-name
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from common.inline_debounce import InlineDebouncer
+
+
+class HoldBackTest(TestCase):
+    """ only the newest query of each user is run """
+
+    def runTest(self):
+        """ test """
+        debouncer = InlineDebouncer(delay=0.05)
+        ran = []
+
+        def start(user, query):
+            return lambda ticket: debouncer.guard(user, ticket, lambda: ran.append(query))()
+
+        for query in ('m', 'ma', 'mat', 'math', 'math 1'):
+            debouncer.submit(1, start(1, query))
+        debouncer.submit(2, start(2, 'md5'))
+
+        time.sleep(0.3)
+        self.assertEqual(sorted(ran), ['math 1', 'md5'])
+        self.assertEqual((debouncer.received, debouncer.executed, debouncer.dropped), (6, 2, 4))
+        self.assertEqual(debouncer.stats()['held'], 0)
+
+
+class CancelRunningTest(TestCase):
+    """ a running coroutine is cancelled by a newer query of the same user """
+
+    def runTest(self):
+        """ test """
+        debouncer = InlineDebouncer(delay=0)
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        finished = []
+        futures = []
+
+        async def answer(query, seconds):
+            await asyncio.sleep(seconds)
+            finished.append(query)
+
+        def start(query, seconds):
+            def run(ticket):
+                guarded = debouncer.guard(1, ticket, answer)
+                futures.append(asyncio.run_coroutine_threadsafe(guarded(query, seconds), loop))
+            return run
+
+        debouncer.submit(1, start('xkcd', 5))
+        time.sleep(0.1)
+        debouncer.submit(1, start('xkcd 927', 0.01))
+
+        for future in futures:
+            future.result(timeout=2)
+        loop.call_soon_threadsafe(loop.stop)
+
+        self.assertEqual(finished, ['xkcd 927'])
+        self.assertEqual((debouncer.executed, debouncer.cancelled), (2, 1))
+
+
+class RejectedTest(TestCase):
+    """ a query that was not admitted is forgotten """
+
+    def runTest(self):
+        """ test """
+        for delay in (0, 0.01):
+            debouncer = InlineDebouncer(delay=delay)
+            debouncer.submit(1, lambda _ticket: False)
+            time.sleep(0.1)
+            self.assertEqual(debouncer._latest, {})  # pylint: disable = protected-access
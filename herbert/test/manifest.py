@@ -0,0 +1,57 @@
+"""
+Lazy loading tests
+"""
+# pylint: disable = invalid-name
+import os
+import tempfile
+from unittest import TestCase
+
+from herbert import BERTS
+from manifest import LazyBert, describe, read_manifest, sources, write_manifest
+from test.concurrency import FakeContext, FakeUpdate, RecordingBot, SlowEchoBert
+
+
+class ManifestTest(TestCase):
+    """
+    The manifest has to describe the berts exactly as
+    they are, otherwise they are not loaded lazily
+    """
+
+    def test_manifest_is_current(self):
+        """ test """
+        manifest = read_manifest()
+        for module, cls in BERTS:
+            entry = manifest.get((module, cls))
+            self.assertIsNotNone(entry, f'{cls} is missing, run `herbert.py --manifest`')
+            self.assertTrue(entry.current, f'{cls} is outdated, run `herbert.py --manifest`')
+
+    def test_roundtrip(self):
+        """ test """
+        entry = describe(SlowEchoBert)
+        self.assertEqual([cmd.method for cmd in entry.commands], ['slowecho'])
+
+        fname = os.path.join(tempfile.mkdtemp(), 'manifest.json')
+        write_manifest([entry], fname)
+        self.assertEqual(read_manifest(fname), {entry.key: entry})
+
+    def test_lazy_invocation(self):
+        """ test """
+        loaded = []
+        lazy = LazyBert(describe(SlowEchoBert), on_load=loaded.append)
+        callback = lazy.callback('slowecho', coroutine=False)
+        self.assertIsNone(lazy.bert)
+
+        bot = RecordingBot()
+        for chat_id in range(2):
+            callback(FakeUpdate(chat_id, '/slowecho hi'), FakeContext(bot, ['hi']))
+
+        self.assertEqual(loaded, [lazy.bert])
+        self.assertIsNotNone(lazy.import_seconds)
+        self.assertEqual(bot.sent, [(0, 'hi'), (0, 'hi'), (1, 'hi'), (1, 'hi')])
+
+    def test_inherited_sources(self):
+        """ test """
+        entry = read_manifest()[('berts.asciimath', 'AsciiBert')]
+        self.assertEqual(entry.sources[:2], ['berts.asciimath', 'berts.texbert'])
+        self.assertIn('decorators', entry.sources)
+        self.assertEqual(sources(SlowEchoBert), ['test.concurrency', 'basebert', 'decorators'])
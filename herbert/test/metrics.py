@@ -0,0 +1,85 @@
+"""
+Metrics tests
+"""
+# pylint: disable = invalid-name
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from basebert import BaseBert
+from common import metrics
+from common.metrics import Histogram, PrometheusWriter
+from decorators import command
+from herberror import Herberror
+from test.concurrency import FakeContext, FakeUpdate, RecordingBot
+
+
+class SlowBot(RecordingBot):
+    """ takes a while to send """
+
+    def send_message(self, chat_id, text, *args, **kwargs):
+        time.sleep(0.02)
+        super().send_message(chat_id, text, *args, **kwargs)
+
+
+class MeasuredBert(BaseBert):
+    """ fails on request """
+
+    @command(pass_string=True)
+    def measured(self, string):
+        """ sleep, send and fail as requested """
+        if string == 'herberror':
+            raise Herberror('as requested')
+        if string == 'exception':
+            raise ValueError('as requested')
+
+        time.sleep(0.01)
+        self.send_message(string, parse_mode=None)
+
+
+class HistogramTest(TestCase):
+    """ check the approximation of percentiles """
+
+    def runTest(self):
+        """ test """
+        hist = Histogram()
+        for i in range(1, 1001):
+            hist.observe(i / 1000)
+
+        for fraction in (.5, .95, .99):
+            self.assertLessEqual(fraction, hist.percentile(fraction))
+            self.assertLessEqual(hist.percentile(fraction), fraction * 2 ** .25)
+
+        self.assertEqual(hist.count, 1000)
+        self.assertEqual(hist.cumulative()[-1][1], 1000)
+
+
+class CommandMetricsTest(TestCase):
+    """ check the counters and the split into handler and send time """
+
+    def runTest(self):
+        """ test """
+        bert = MeasuredBert()
+        handler = bert.measured.cmdinfo.invoke(bert.measured)
+        bot = SlowBot()
+
+        for arg in ('ok', 'ok', 'herberror', 'exception'):
+            try:
+                handler(FakeUpdate(1, f'/measured {arg}'), FakeContext(bot, [arg]))
+            except ValueError:
+                pass
+
+        cmd = metrics.commands['measured']
+        self.assertEqual((cmd.invocations, cmd.herberrors, cmd.failures), (4, 1, 1))
+        self.assertGreaterEqual(cmd.send_time.maximum, 0.02)
+        self.assertGreaterEqual(cmd.handler_time.maximum, 0.01)
+        self.assertLess(cmd.handler_time.maximum, 0.025)
+
+        fname = os.path.join(tempfile.mkdtemp(), 'metrics.prom')
+        PrometheusWriter(fname).write()
+        with open(fname) as fobj:
+            text = fobj.read()
+
+        self.assertIn('herbert_command_invocations_total{command="measured"} 4\n', text)
+        self.assertIn('herbert_command_send_seconds_count{command="measured"} 4\n', text)
@@ -0,0 +1,51 @@
+"""
+Prerendered text tests
+"""
+# pylint: disable = invalid-name
+from unittest import TestCase
+
+from common.chatformat import bold, italic
+from common.prerendered import Prerendered, join_texts, prerender
+
+
+class JoinTextsTest(TestCase):
+    """ the entities of later parts are shifted by the utf-16 length before them """
+
+    def runTest(self):
+        """ test """
+        joined = join_texts(prerender(f'💬 {bold("a")} '), prerender(italic('b')))
+        text, entities = joined.msg, joined.entities
+
+        self.assertEqual(text, '💬 a b')
+        self.assertEqual([(e.type, e.offset, e.length) for e in entities], [('bold', 3, 1), ('italic', 5, 1)])
+        self.assertEqual([e.to_dict() for e in prerender(f'💬 {bold("a")} {italic("b")}').entities],
+                         [e.to_dict() for e in entities])
+
+
+class InvalidationTest(TestCase):
+    """ values are built once, until invalidated """
+
+    def runTest(self):
+        """ test """
+        registry = Prerendered()
+        builds = []
+
+        def build():
+            builds.append(1)
+            return prerender(bold('help'))
+
+        first = registry.get('help', build)
+        self.assertIs(registry.get('help', build), first)
+        self.assertIs(registry.text('constant'), registry.text('constant'))
+        self.assertEqual(len(builds), 1)
+
+        registry.invalidate()
+        self.assertIsNot(registry.get('help', build), first)
+        self.assertEqual(len(builds), 2)
+
+        def build_while_invalidated():
+            registry.invalidate()
+            return 'stale'
+
+        registry.get('stale', build_while_invalidated)
+        self.assertEqual(len(registry), 0)
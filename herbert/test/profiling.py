@@ -0,0 +1,54 @@
+"""
+On-demand profiling tests
+"""
+# pylint: disable = invalid-name
+import marshal
+from unittest import TestCase
+
+from basebert import BaseBert
+from common import profiling
+from decorators import command
+from test.concurrency import FakeContext, FakeUpdate, RecordingBot
+
+
+def busy_work(n):
+    """ something to show up in the profile """
+    return sum(i * i for i in range(n))
+
+
+class ProfiledBert(BaseBert):
+    """ does some work """
+
+    @command(pass_args=False)
+    def work(self):
+        """ work """
+        self.send_message(str(busy_work(1000)), parse_mode=None)
+
+
+class ProfileTest(TestCase):
+    """
+    Request a profile of the next invocations and
+    check that exactly those are aggregated
+    """
+
+    def runTest(self):
+        """ test """
+        bert = ProfiledBert()
+        handler = bert.work.cmdinfo.invoke(bert.work)
+        bot = RecordingBot()
+        done = []
+
+        profiling.request_profile('work', 3, done.append)
+        for chat_id in range(5):
+            handler(FakeUpdate(chat_id, '/work'), FakeContext(bot, []))
+
+        self.assertEqual(len(done), 1)
+        request, = done
+        self.assertEqual(request.recorded, 3)
+        self.assertEqual(profiling.active_profiles(), [])
+        self.assertEqual(len(bot.sent), 5)
+
+        self.assertIn('busy_work', request.top_functions())
+        stats = marshal.loads(request.pstats_data())
+        calls = [value[1] for (_file, _line, name), value in stats.items() if name == 'busy_work']
+        self.assertEqual(calls, [3])
@@ -0,0 +1,92 @@
+"""
+Send queue tests
+"""
+# pylint: disable = invalid-name
+import threading
+import time
+from unittest import TestCase
+
+from telegram.error import RetryAfter
+
+from common.send_queue import SendQueue, TokenBucket
+
+
+class TokenBucketTest(TestCase):
+    """ check the refill arithmetic """
+
+    def runTest(self):
+        """ test """
+        bucket = TokenBucket(rate=10, burst=2)
+        now = bucket.updated
+
+        for _ in range(2):
+            self.assertEqual(bucket.delay(now), 0)
+            bucket.take()
+
+        self.assertAlmostEqual(bucket.delay(now), 0.1)
+        self.assertEqual(bucket.delay(now + 0.11), 0)
+        self.assertTrue(bucket.full(now + 0.25))
+
+
+class SendQueueTest(TestCase):
+    """
+    Deliver bursts into several chats and check ordering,
+    per-chat spacing and the RetryAfter handling
+    """
+
+    def setUp(self):
+        self.queue = SendQueue(workers=4, global_rate=1000, global_burst=1000, chat_rate=100, chat_burst=1)
+        self.lock = threading.Lock()
+        self.delivered = []
+
+    def _sender(self, chat_id, num):
+        def send():
+            with self.lock:
+                self.delivered.append((chat_id, num, time.monotonic()))
+            return num
+        return send
+
+    def test_order_and_rate(self):
+        """ test """
+        futures = [self.queue.submit(chat_id, self._sender(chat_id, num))
+                   for num in range(20) for chat_id in range(3)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [n for n in range(20) for _ in range(3)])
+
+        for chat_id in range(3):
+            sent = [(num, at) for chat, num, at in self.delivered if chat == chat_id]
+            self.assertEqual([num for num, _ in sent], list(range(20)))
+            # 20 messages at 100/s without burst need at least 190ms
+            self.assertGreaterEqual(sent[-1][1] - sent[0][1], 0.18)
+
+        self.assertEqual(self.queue.sent, 60)
+        self.assertEqual(self.queue.depth, 0)
+
+    def test_retry_after(self):
+        """ test """
+        attempts = []
+
+        def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise RetryAfter(0.1)
+            return 'ok'
+
+        first = self.queue.submit(1, flaky)
+        second = self.queue.submit(1, self._sender(1, 'after'))
+
+        self.assertEqual(first.result(timeout=5), 'ok')
+        self.assertEqual(second.result(timeout=5), 'after')
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.1)
+        self.assertLess(attempts[1], self.delivered[0][2])
+        self.assertEqual(self.queue.retried, 1)
+
+    def test_retries_are_limited(self):
+        """ test """
+        self.queue.max_retries = 1
+
+        def flood():
+            raise RetryAfter(0.01)
+
+        with self.assertRaises(RetryAfter):
+            self.queue.submit(1, flood).result(timeout=5)
+        self.assertEqual(self.queue.failed, 1)
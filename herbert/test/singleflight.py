@@ -0,0 +1,117 @@
+"""
+Coalescing tests
+"""
+# pylint: disable = invalid-name
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from basebert import BaseBert
+from common.singleflight import flights
+from decorators import command
+from test.concurrency import FakeContext, FakeUpdate, RecordingBot
+
+
+class Interrupted(BaseException):
+    """ like the deadline timer of a worker process """
+
+
+class PopularBert(BaseBert):
+    """ counts how often it actually ran """
+
+    def __init__(self):
+        super().__init__()
+        self.executions = 0
+
+    @command(pass_string=True, coalesce=True)
+    def popular(self, string):
+        """ slowly answer with the argument """
+        self.executions += 1
+        time.sleep(0.2)
+        if string == 'interrupted' and self.executions == 1:
+            raise Interrupted()
+        self.send_message(string.upper(), parse_mode=None)
+
+    @command(pass_string=True, coalesce=True)
+    async def apopular(self, string):
+        """ slowly answer with the argument """
+        self.executions += 1
+        await asyncio.sleep(0.2)
+        await self.asend_message(string.upper(), parse_mode=None)
+
+
+class CoalesceTest(TestCase):
+    """ identical concurrent invocations run once, every chat gets the reply """
+
+    def runTest(self):
+        """ test """
+        bert = PopularBert()
+        handler = bert.popular.cmdinfo.invoke(bert.popular)
+        bot = RecordingBot()
+        before = flights.coalesced
+
+        threads = [threading.Thread(target=handler, args=(FakeUpdate(chat_id, f'/popular {text}'),
+                                                          FakeContext(bot, [text])))
+                   for chat_id, text in enumerate(['927'] * 10 + [' 927 ', 'berlin'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(bert.executions, 2)
+        self.assertEqual(flights.coalesced - before, 10)
+        self.assertEqual(sorted(bot.sent), [(chat_id, '927') for chat_id in range(11)] + [(11, 'BERLIN')])
+
+        # not in flight anymore, so it runs again
+        handler(FakeUpdate(12, '/popular 927'), FakeContext(bot, ['927']))
+        self.assertEqual(bert.executions, 3)
+
+
+class InterruptedLeaderTest(TestCase):
+    """ a waiter runs it instead, if the leader was interrupted """
+
+    def runTest(self):
+        """ test """
+        bert = PopularBert()
+        handler = bert.popular.cmdinfo.invoke(bert.popular)
+        bot = RecordingBot()
+        interrupted = []
+
+        def leader():
+            try:
+                handler(FakeUpdate(0, '/popular interrupted'), FakeContext(bot, ['interrupted']))
+            except Interrupted:
+                interrupted.append(True)
+
+        threads = [threading.Thread(target=leader),
+                   threading.Thread(target=handler, args=(FakeUpdate(1, '/popular interrupted'),
+                                                          FakeContext(bot, ['interrupted'])))]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(interrupted, [True])
+        self.assertEqual(bert.executions, 2)
+        self.assertEqual(bot.sent, [(1, 'INTERRUPTED')])
+        self.assertEqual(flights.stats()['in_flight'], 0)
+
+
+class AsyncCoalesceTest(TestCase):
+    """ the same for coroutine handlers on one event loop """
+
+    def runTest(self):
+        """ test """
+        bert = PopularBert()
+        handler = bert.apopular.cmdinfo.invoke(bert.apopular)
+        bot = RecordingBot()
+
+        async def fire():
+            await asyncio.gather(*(handler(FakeUpdate(chat_id, '/apopular xkcd'), FakeContext(bot, ['xkcd']))
+                                   for chat_id in range(20)))
+
+        asyncio.run(fire())
+        self.assertEqual(bert.executions, 1)
+        self.assertEqual(sorted(bot.sent), [(chat_id, 'XKCD') for chat_id in range(20)])
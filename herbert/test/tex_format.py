@@ -0,0 +1,87 @@
+"""
+Precompiled tex preamble tests
+"""
+# pylint: disable = invalid-name
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import TestCase
+from unittest.mock import patch
+
+from PIL import Image
+
+from basebert import ImageBaseBert
+from berts import texbert
+from berts.texbert import COMPILE_FAILED, pre_levels, render, split_template, template_key, texit_command
+from herberror import Herberror
+
+
+class SplitTemplateTest(TestCase):
+    """ the preamble and the rest of a template make up the whole document """
+
+    def runTest(self):
+        """ test """
+        with tempfile.TemporaryDirectory() as directory, patch.object(texbert, 'TEX_FORMAT_DIR', directory):
+            formats = set()
+            for level, template in enumerate(pre_levels):
+                preamble, head, tail = split_template(level)
+                self.assertEqual(preamble + head + '\\sum' + tail, template.format('\\sum'))
+
+                args, document = texit_command(level, '\\sum', 1000)
+                self.assertEqual(texit_command(level, '\\sum', 1000, use_format=False),
+                                 (args[:2], template.format('\\sum')))
+                if len(args) > 2:
+                    self.assertNotIn('\\documentclass', document)
+                    formats.add(args[3])
+                    with open(os.path.join(args[2], f'{args[3]}.tex')) as fobj:
+                        self.assertTrue(fobj.read().endswith('\\dump\n'))
+
+            # nothing to precompile without a documentclass, 2-5 share their packages
+            self.assertEqual(len(texit_command(0, '\\sum', 1000)[0]), 2)
+            self.assertEqual(len(formats), 3)
+
+            # cache entries follow the templates, inserting one keeps the keys of the others
+            self.assertEqual(len({template_key(level) for level in range(len(pre_levels))}), len(pre_levels))
+            with patch.object(texbert, 'pre_levels', [pre_levels[1]] + pre_levels):
+                self.assertEqual(template_key.__wrapped__(1), template_key(0))
+
+
+def _png(width: int, height: int, color: int) -> bytes:
+    return ImageBaseBert.pil_image_to_fp(Image.new('RGB', (width, height), (color, color, color)), 'PNG').getvalue()
+
+
+def _fake_texit(stdout: bytes, exit_val: int = 0):
+    """ texit_command running a script that prints stdout and exits with exit_val """
+    script = f'import sys; sys.stdout.buffer.write({stdout!r}); sys.exit({exit_val})'
+    return lambda *_args: ((sys.executable, '-c', script), '')
+
+
+class RenderTest(TestCase):
+    """ the png is read from stdout, concurrent renders get their own image """
+
+    def runTest(self):
+        """ test """
+        small, wide = _png(20, 10, 0), _png(400, 10, 0)
+        with patch.object(texbert, 'texit_command', _fake_texit(small)):
+            self.assertEqual(render(3, 'x', 1000, False), (b'', small))
+            _, inverted = render(3, 'x', 1000, True)
+            self.assertEqual(Image.open(BytesIO(inverted)).getpixel((0, 0)), (255, 255, 255))
+
+        with patch.object(texbert, 'texit_command', _fake_texit(wide)):
+            _, padded = render(3, 'x', 1000, False)
+            self.assertGreater(Image.open(BytesIO(padded)).height, 10)
+
+        with patch.object(texbert, 'texit_command', _fake_texit(b'Undefined control sequence.', 4)):
+            self.assertEqual(render(3, 'x', 1000, False), (COMPILE_FAILED + b'Undefined control sequence.', None))
+
+        # killed without a complaint, nothing to remember as a failure
+        with patch.object(texbert, 'texit_command', _fake_texit(b'', 4)), self.assertRaises(Herberror):
+            render(3, 'x', 1000, False)
+
+        images = [_png(20, 10, color) for color in range(0, 256, 16)]
+        with patch.object(texbert, 'texit_command', lambda _level, source, _width: _fake_texit(images[int(source)])()), \
+                ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda i: render(3, str(i), 1000, False), range(len(images))))
+        self.assertEqual([png for _, png in results], images)
@@ -5,7 +5,8 @@ Text processing tests
 from unittest import TestCase
 from common.reply_data import Text
 from common.reply import processed_message_parts
-from common.chatformat import parse_entities, italic, STYLE_HTML, STYLE_MD, STYLE_PARA, STYLE_BACKEND, render
+from common.telegram_limits import MSG_CHUNK
+from common.chatformat import parse_entities, italic, bold, mono, link_to, STYLE_HTML, STYLE_MD, STYLE_PARA, STYLE_BACKEND, render
 
 
 class EntityParsingTest(TestCase):
@@ -84,3 +85,54 @@ class EntityTransformationTest(TestCase):
                 text, style = render(input_text, input_style, target_style)
                 self.assertEqual(target_style, style)
                 self.assertEqual(target_text, text, msg=f'Transforming from {input_style} to {style}')
+
+
+class ChunkingTest(TestCase):
+    """
+    Long texts are split at line breaks or spaces, never
+    inside a surrogate pair, and entities are split along
+    """
+
+    def runTest(self):
+        """ test """
+        line = 'x' * 3000 + '\n'
+        text, entities = parse_entities(f'{line}{italic("a" * 2000)}{"💬" * 3000}')
+        parts = list(processed_message_parts(Text(msg=text, entities=entities)))
+
+        self.assertEqual(''.join(part.msg for part in parts), text)
+        self.assertEqual(parts[0].msg, line)
+        for part in parts:
+            self.assertLessEqual(len(part.msg.encode('utf-16le')) // 2, MSG_CHUNK)
+            self.assertNotIn('�', part.msg)
+
+        # the italic run lies entirely inside the second chunk, at its start
+        self.assertEqual([(e.offset, e.length) for part in parts for e in part.entities], [(0, 2000)])
+
+        text = 'y' * 4000 + italic('b' * 200)
+        text, entities = parse_entities(text)
+        first, second = processed_message_parts(Text(msg=text, entities=entities))
+        self.assertEqual(len(first.msg), MSG_CHUNK)
+        self.assertEqual([(e.offset, e.length) for e in first.entities], [(4000, 96)])
+        self.assertEqual([(e.offset, e.length) for e in second.entities], [(0, 104)])
+
+
+class DirectEntityParsingTest(TestCase):
+    """
+    Markup other than html is turned into the same entities
+    as its html rendering, but its text is taken literally
+    """
+
+    def runTest(self):
+        """ test """
+        for style in (STYLE_BACKEND, STYLE_PARA, STYLE_MD):
+            markup = f'{bold("a<b", style=style)} 💬 {mono("c", style=style)}{italic("d", style=style)}'
+            text, entities = parse_entities(markup, style)
+            html_text, html_entities = parse_entities(render(markup, style)[0], STYLE_HTML)
+
+            self.assertEqual(text, 'a<b 💬 cd')
+            self.assertEqual(text, html_text)
+            self.assertEqual([e.to_dict() for e in entities], [e.to_dict() for e in html_entities])
+
+        text, entities = parse_entities(link_to('https://example.org/?a=1&copy=2', 'AT&amp;T'))
+        self.assertEqual(text, 'AT&amp;T')
+        self.assertEqual(entities[0].url, 'https://example.org/?a=1&copy=2')
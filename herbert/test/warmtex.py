@@ -0,0 +1,89 @@
+"""
+Warm tex engine tests
+"""
+# pylint: disable = invalid-name, protected-access
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from berts import warmtex
+from berts.warmtex import TEXIT, WarmTex, compile_error
+
+# stands in for pdflatex: loads its "format", then compiles job.tex
+FAKE_ENGINE = """
+import sys, time
+time.sleep(0.05)
+document = open('job.tex').read()
+if 'undefined' in document:
+    open('main.log', 'w').write('(./job.tex\\n! Undefined control sequence.\\nl.1 \\\\undefined\\n\\nHere is how much\\n')
+    sys.exit(1)
+open('main.pdf', 'w').write(document)
+"""
+FAKE_PDFTOPPM = "import shutil; shutil.copy('main.pdf', 'main.png')"
+
+LOG = """This is pdfTeX
+(./job.tex
+! Undefined control sequence.
+l.1 \\undefined
+
+Here is how much of TeX's memory you used:
+"""
+
+
+class CompileErrorTest(TestCase):
+    """ the complaint is extracted like texit.zsh does """
+
+    def runTest(self):
+        """ test """
+        self.assertEqual(compile_error(LOG), 'Undefined control sequence.\nl.1 \\undefined\n')
+        self.assertEqual(compile_error('all fine\n\nno errors\n'), '')
+
+
+class WarmTexTest(TestCase):
+    """ documents are compiled by engines started ahead of time, dead engines are replaced """
+
+    def runTest(self):
+        """ test """
+        with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as root, \
+                patch.object(warmtex, 'ENGINE_ROOT', root), \
+                patch.object(warmtex, 'engine_command', lambda _name: (sys.executable, '-c', FAKE_ENGINE)), \
+                patch.object(warmtex, 'pdftoppm_command', lambda _width: (sys.executable, '-c', FAKE_PDFTOPPM)):
+            # left behind by a worker that was killed
+            with subprocess.Popen(('true',)) as gone:
+                pass
+            stale = os.path.join(root, f'{warmtex.ENGINE_PREFIX}{gone.pid}')
+            os.makedirs(os.path.join(stale, 'tmpjob'))
+
+            warm = WarmTex()
+            args = (TEXIT, '1000', directory, 'herbert-test')
+
+            # texit.zsh builds the format first
+            self.assertIsNone(warm.run(args[:2], b'x'))
+            self.assertIsNone(warm.run(args, b'x'))
+            with open(os.path.join(directory, 'herbert-test.fmt'), 'w'):
+                pass
+
+            for document in (b'first', b'second'):
+                result = warm.run(args, document)
+                self.assertEqual((result.returncode, result.stdout), (0, document))
+            engine = warm._engines[(directory, 'herbert-test')]
+            self.assertTrue(engine.healthy())
+
+            os.killpg(engine.proc.pid, signal.SIGKILL)
+            engine.proc.wait()
+            result = warm.run(args, b'third')
+            self.assertEqual((result.returncode, result.stdout), (0, b'third'))
+            self.assertEqual(warm.restarts, 1)
+
+            result = warm.run(args, b'\\undefined')
+            self.assertEqual((result.returncode, result.stdout), (4, b'Undefined control sequence.\nl.1 \\undefined\n'))
+            self.assertEqual(warm.renders, 4)
+
+            self.assertFalse(os.path.exists(stale))
+            self.assertEqual(os.listdir(root), [f'{warmtex.ENGINE_PREFIX}{os.getpid()}'])
+            warm.close()
+            self.assertEqual(os.listdir(root), [])
@@ -0,0 +1,70 @@
+"""
+Webhook ingestion tests
+"""
+# pylint: disable = invalid-name
+import http.client
+import json
+from unittest import TestCase
+
+from bench.webhook_latency import UpdateStub, make_updates, start_pipeline
+from webhook import WebhookConfig
+
+
+class WebhookTest(TestCase):
+    """
+    POST updates to a local webhook listener and check
+    that every valid one reaches the dispatcher, and that
+    invalid requests are rejected
+    """
+
+    def setUp(self):
+        config = WebhookConfig(port=0, listeners=2, max_body_bytes=4096, secret_token='s3cret')
+        self.server, self.dispatcher, self.recorder = start_pipeline(config)
+        self.stub = UpdateStub(self.server.server_port, config.path, secret_token='s3cret')
+
+    def tearDown(self):
+        self.server.stop()
+        self.dispatcher.stop()
+
+    def _post(self, body: bytes, path=None, headers=None) -> int:
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port, timeout=10)
+        try:
+            connection.request('POST', path or self.stub.path, body, headers or self.stub.headers)
+            return connection.getresponse().status
+        finally:
+            connection.close()
+
+    def test_updates_are_dispatched(self):
+        """ test """
+        updates = make_updates(200)
+        self.stub.send(updates, connections=4)
+
+        self.assertTrue(self.recorder.wait_for(len(updates), timeout=10))
+        self.assertEqual(set(self.recorder.handled), {update['update_id'] for update in updates})
+        self.assertEqual(self.server.accepted, len(updates))
+
+    def test_invalid_requests_are_rejected(self):
+        """ test """
+        update = json.dumps(make_updates(1)[0]).encode('utf-8')
+
+        self.assertEqual(self._post(b'x' * 5000), 413)
+        self.assertEqual(self._post(b'{not json'), 400)
+        self.assertEqual(self._post(update, path='/elsewhere'), 404)
+        self.assertEqual(self._post(update, headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong'}), 403)
+
+        self.assertEqual(self.server.rejected, 4)
+        self.assertEqual(self.server.accepted, 0)
+
+    def test_unread_bodies_close_the_connection(self):
+        """ test """
+        update = json.dumps(make_updates(1)[0]).encode('utf-8')
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port, timeout=10)
+        try:
+            for path, headers in (('/elsewhere', self.stub.headers), (self.stub.path, {})):
+                connection.request('POST', path, update, headers)
+                response = connection.getresponse()
+                response.read()
+                self.assertIn(response.status, (403, 404))
+                self.assertTrue(response.will_close)
+        finally:
+            connection.close()
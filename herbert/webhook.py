@@ -0,0 +1,181 @@
+"""
+Receive updates via a webhook instead of long polling
+
+telegram POSTs every update as a JSON document to the
+configured url. The WebhookServer decodes those requests
+and puts the updates into the dispatcher's update queue,
+exactly like the polling updater would.
+
+Requests are handled by a fixed number of listener threads,
+so a flood of requests can not spawn unbounded threads, and
+bodies larger than max_body_bytes are rejected unread.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from queue import Queue
+from threading import Lock, Thread
+from typing import Any, Dict, Optional
+
+from telegram import Bot, Update
+
+from common.metrics import Histogram
+
+__all__ = ['WebhookConfig', 'WebhookServer']
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+@dataclass
+class WebhookConfig:
+    """
+    listen, port: the local address the listener binds to
+    path: the url path telegram POSTs updates to
+    public_url: if set, registered with telegram on startup
+        (usually a reverse proxy forwarding to listen:port/path)
+    listeners: number of threads handling requests
+    max_body_bytes: larger requests are rejected with 413
+    secret_token: if set, requests have to carry it in the
+        X-Telegram-Bot-Api-Secret-Token header
+    """
+    listen: str = '127.0.0.1'
+    port: int = 8443
+    path: str = '/webhook'
+    public_url: Optional[str] = None
+    listeners: int = 4
+    max_body_bytes: int = 1 << 20
+    secret_token: Optional[str] = None
+
+    @staticmethod
+    def from_file(fname: str) -> 'WebhookConfig':
+        """ read the config from a json object with the same keys """
+        with open(fname, 'r') as fobj:
+            return WebhookConfig(**json.load(fobj))
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server: 'WebhookServer'
+    protocol_version = 'HTTP/1.1'
+    # idle keep-alive connections must not block a listener forever
+    timeout = 30
+
+    def _respond(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+    def do_POST(self):  # pylint: disable = invalid-name
+        """ decode a single update and queue it """
+        config = self.server.config
+
+        if self.path.split('?', 1)[0] != config.path:
+            self.server.count(accepted=False)
+            # the body is not read, so the connection can not be reused
+            self.close_connection = True
+            self._respond(404)
+            return
+
+        if config.secret_token is not None and self.headers.get(SECRET_HEADER) != config.secret_token:
+            self.server.count(accepted=False)
+            self.close_connection = True
+            self._respond(403)
+            return
+
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self.server.count(accepted=False)
+            self.close_connection = True
+            self._respond(411)
+            return
+
+        if int(length) > config.max_body_bytes:
+            self.server.count(accepted=False)
+            self.close_connection = True
+            self._respond(413)
+            return
+
+        started = time.monotonic()
+        try:
+            update = Update.de_json(json.loads(self.rfile.read(int(length))), self.server.bot)
+        except (ValueError, TypeError, KeyError):
+            self.server.count(accepted=False)
+            self._respond(400)
+            return
+
+        if update is None:
+            self.server.count(accepted=False)
+            self._respond(400)
+            return
+
+        self.server.update_queue.put(update)
+        self.server.count(accepted=True)
+        self.server.decode_time.observe(time.monotonic() - started)
+        self._respond(200)
+
+    def log_message(self, format, *args):  # pylint: disable = redefined-builtin
+        logging.getLogger('herbert.RUNTIME').debug('webhook: ' + format, *args)
+
+
+class WebhookServer(HTTPServer):
+    """
+    HTTP listener feeding updates into update_queue,
+    with connections served by a bounded thread pool
+    """
+
+    def __init__(self, config: WebhookConfig, bot: Bot, update_queue: Queue):
+        self.config = config
+        self.bot = bot
+        self.update_queue = update_queue
+
+        self._lock = Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.decode_time = Histogram()
+
+        self._pool = ThreadPoolExecutor(config.listeners, thread_name_prefix='herbert-webhook')
+        self._thread: Optional[Thread] = None
+        super().__init__((config.listen, config.port), _WebhookHandler)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # pylint: disable = broad-except
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def count(self, accepted: bool) -> None:
+        """ record the outcome of a single request """
+        with self._lock:
+            if accepted:
+                self.accepted += 1
+            else:
+                self.rejected += 1
+
+    def start(self) -> None:
+        """ serve requests on a background thread """
+        self._thread = Thread(target=self.serve_forever, name='herbert-webhook-accept', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ stop accepting requests and wait for the listeners """
+        self.shutdown()
+        self._pool.shutdown()
+        self.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        """ current state of the listener """
+        return {
+            'listeners': self.config.listeners,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'decode': self.decode_time.summary(),
+        }